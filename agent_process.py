@@ -0,0 +1,288 @@
+import multiprocessing
+import resource
+import struct
+import traceback
+from collections import Counter
+from time import perf_counter
+
+import numpy as np
+
+from agents.agent import Agent
+from helpers import decode_move, encode_move
+from utils import rss_mb
+
+"""
+Agent_process.py runs an agent in its own long-lived process, so that a memory-hungry or leaking agent can only
+hurt itself, never the other agent or the World/autoplay process.
+
+An AgentWorker owns one subprocess for a whole game or autoplay series. World talks to it through a RemoteAgent,
+which looks like any other Agent. Messages go over a pipe in a compact binary format, one opcode byte then:
+    G  new agent                                                  -> A autoplay flag (u1), name (utf-8)
+    B  on_game_start    board_size (u1), board (int8 cells)       (no reply)
+    S  step             player (u1), board_size (u1), board,      -> M move code (u4), seconds in step (f8)
+                        history size k (u4), hashes (k u8), counts (k u4)
+    O  on_move          move code (u4), player (u1)               (no reply)
+    P  ping                                                       -> P
+    Q  quit
+Any exception in the agent is sent back as E + traceback and raised in World, which then plays a random move.
+Move codes are helpers.encode_move, PASS_MOVE_CODE for None. The history of a step is World's position_history
+(GameState hashes of the positions since the last irreversible move, and their counts), rebuilt in the worker as
+the agent's position_history so that repetition checks see the same positions as in-process agents.
+
+The worker process caps its own resources with setrlimit: max_memory_mb limits its address space (allocations
+beyond it raise MemoryError in the agent) and max_cpu_seconds its total CPU time (the kernel kills it beyond).
+The parent also checks the worker's RSS after every step. A worker that exceeds a limit, dies or does not answer
+within step_timeout is killed; the failed step raises, and the next game starts a fresh process.
+
+The pipe overhead of every step (round trip time minus the time spent in the agent's step) is kept in overheads,
+to check it stays far below the per-move budget.
+
+Classes:
+    AgentWorker             - the subprocess of one agent, and the parent's end of the pipe
+    RemoteAgent             - Agent proxy forwarding step/on_game_start/on_move to an AgentWorker
+"""
+
+OP_NEW_AGENT = b"G"
+OP_GAME_START = b"B"
+OP_STEP = b"S"
+OP_ON_MOVE = b"O"
+OP_PING = b"P"
+OP_QUIT = b"Q"
+REPLY_AGENT = b"A"
+REPLY_MOVE = b"M"
+REPLY_ERROR = b"E"
+MOVE_REPLY = struct.Struct("<Id")
+ON_MOVE = struct.Struct("<IB")
+HISTORY_SIZE = struct.Struct("<I")
+
+
+def pack_board(chess_board) -> bytes:
+    return bytes((chess_board.shape[0],)) + chess_board.astype(np.int8).tobytes()
+
+
+def unpack_board(payload: bytes) -> np.ndarray:
+    board_size = payload[0]
+    cells = np.frombuffer(payload, dtype=np.int8, count=board_size * board_size, offset=1)
+    # Agents get the same dtype as World's board
+    return cells.reshape(board_size, board_size).astype(int)
+
+
+def pack_history(position_history) -> bytes:
+    hashes = list(position_history or ())
+    counts = [position_history[position_hash] for position_hash in hashes]
+    return (
+        HISTORY_SIZE.pack(len(hashes))
+        + np.array(hashes, dtype="<u8").tobytes()
+        + np.array(counts, dtype="<u4").tobytes()
+    )
+
+
+def unpack_history(payload: bytes) -> Counter:
+    (size,) = HISTORY_SIZE.unpack_from(payload)
+    hashes = np.frombuffer(payload, dtype="<u8", count=size, offset=HISTORY_SIZE.size)
+    counts = np.frombuffer(payload, dtype="<u4", count=size, offset=HISTORY_SIZE.size + 8 * size)
+    return Counter(dict(zip(hashes.tolist(), counts.tolist())))
+
+
+def apply_limits(max_memory_mb=None, max_cpu_seconds=None):
+    if max_memory_mb:
+        limit = int(max_memory_mb * 2**20)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if max_cpu_seconds:
+        # The soft limit sends SIGXCPU, which kills the process
+        resource.setrlimit(resource.RLIMIT_CPU, (int(max_cpu_seconds), int(max_cpu_seconds) + 1))
+
+
+def worker_main(conn, agent_name, max_memory_mb=None, max_cpu_seconds=None):
+    """
+    Body of the worker process: serve requests for one agent until OP_QUIT or the pipe closes.
+    """
+    apply_limits(max_memory_mb, max_cpu_seconds)
+    # Importing agents registers them
+    import agents  # noqa: F401
+    from store import AGENT_REGISTRY
+
+    agent = None
+    # Error of a request without reply (on_game_start, on_move), sent instead of the next reply
+    pending_error = None
+    while True:
+        try:
+            message = conn.recv_bytes()
+        except EOFError:
+            return
+        op, payload = message[:1], message[1:]
+        if pending_error is not None and op in (OP_STEP, OP_PING):
+            conn.send_bytes(REPLY_ERROR + pending_error)
+            pending_error = None
+            continue
+        try:
+            if op == OP_STEP:
+                player = payload[0]
+                chess_board = unpack_board(payload[1:])
+                agent.position_history = unpack_history(payload[2 + chess_board.size:])
+                start = perf_counter()
+                move_coords = agent.step(chess_board, player, 3 - player)
+                conn.send_bytes(REPLY_MOVE + MOVE_REPLY.pack(encode_move(move_coords), perf_counter() - start))
+            elif op == OP_ON_MOVE:
+                code, player = ON_MOVE.unpack(payload)
+                agent.on_move(decode_move(code), player)
+            elif op == OP_NEW_AGENT:
+                agent = AGENT_REGISTRY[agent_name]()
+                conn.send_bytes(REPLY_AGENT + bytes((agent.autoplay,)) + agent.name.encode())
+            elif op == OP_GAME_START:
+                agent.on_game_start(unpack_board(payload))
+            elif op == OP_PING:
+                conn.send_bytes(OP_PING)
+            elif op == OP_QUIT:
+                return
+        except BaseException:
+            if op in (OP_GAME_START, OP_ON_MOVE):
+                pending_error = traceback.format_exc().encode()
+            else:
+                conn.send_bytes(REPLY_ERROR + traceback.format_exc().encode())
+
+
+class AgentWorker:
+    """
+    One agent in its own process, kept alive across games until close().
+
+    Parameters
+    ----------
+    agent_name : str
+        Registered name of the agent
+    max_memory_mb : float
+        Cap on the worker's memory (address space, and RSS checked after every step). None for no cap.
+    max_cpu_seconds : float
+        Cap on the worker's total CPU time. None for no cap.
+    step_timeout : float
+        Seconds to wait for a move before killing the worker
+    """
+    def __init__(self, agent_name, max_memory_mb=None, max_cpu_seconds=None, step_timeout=10.0):
+        self.agent_name = agent_name
+        self.max_memory_mb = max_memory_mb
+        self.max_cpu_seconds = max_cpu_seconds
+        self.step_timeout = step_timeout
+        self.process = None
+        self.conn = None
+        # Per-step pipe overhead (round trip time minus the time spent in the agent's step), in seconds
+        self.overheads = []
+        # RSS of the worker after every step, in MB
+        self.rss = []
+
+    def start(self):
+        # spawn: the worker does not inherit (and account for) the memory of the parent
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=worker_main,
+            args=(child_conn, self.agent_name, self.max_memory_mb, self.max_cpu_seconds),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.conn.close()
+        self.process = None
+
+    def close(self):
+        if self.alive:
+            try:
+                self.conn.send_bytes(OP_QUIT)
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        self.kill()
+
+    def request(self, message: bytes, timeout=None) -> bytes:
+        """
+        Send a request and wait for its reply. Kills the worker and raises RuntimeError if it dies or times out.
+        """
+        try:
+            self.conn.send_bytes(message)
+            if not self.conn.poll(timeout):
+                raise TimeoutError(f"no reply within {timeout}s")
+            reply = self.conn.recv_bytes()
+        except (EOFError, OSError, TimeoutError) as e:
+            exitcode = self.process.exitcode
+            self.kill()
+            raise RuntimeError(f"Agent worker {self.agent_name} failed ({e!r}, exit code {exitcode})") from None
+        if reply[:1] == REPLY_ERROR:
+            raise RuntimeError(f"Agent {self.agent_name} raised in its worker:\n{reply[1:].decode()}")
+        return reply
+
+    def new_agent(self):
+        """
+        Create a fresh agent in the worker for a new game, starting the process if needed.
+
+        Returns
+        -------
+        (autoplay, name) of the agent
+        """
+        if not self.alive:
+            self.start()
+        reply = self.request(OP_NEW_AGENT)
+        return bool(reply[1]), reply[2:].decode()
+
+    def on_game_start(self, chess_board):
+        if self.alive:
+            self.conn.send_bytes(OP_GAME_START + pack_board(chess_board))
+
+    def step(self, chess_board, player: int, position_history=None):
+        start = perf_counter()
+        reply = self.request(
+            OP_STEP + bytes((player,)) + pack_board(chess_board) + pack_history(position_history),
+            timeout=self.step_timeout,
+        )
+        code, step_time = MOVE_REPLY.unpack(reply[1:])
+        self.overheads.append(perf_counter() - start - step_time)
+
+        rss = rss_mb(self.process.pid)
+        self.rss.append(rss)
+        if self.max_memory_mb and rss > self.max_memory_mb:
+            self.kill()
+            raise RuntimeError(f"Agent worker {self.agent_name} exceeded its memory cap ({rss:.0f} MB)")
+        return decode_move(code)
+
+    def on_move(self, move_coords, player: int):
+        if self.alive:
+            self.conn.send_bytes(OP_ON_MOVE + ON_MOVE.pack(encode_move(move_coords), player))
+
+    def ping(self) -> float:
+        """
+        Round trip time of an empty request, in seconds.
+        """
+        start = perf_counter()
+        self.request(OP_PING, timeout=self.step_timeout)
+        return perf_counter() - start
+
+
+class RemoteAgent(Agent):
+    """
+    Agent whose calls are forwarded to an AgentWorker. World creates one per seat when given agent workers.
+    The position_history World sets on it is sent with every step.
+    """
+    def __init__(self, worker: AgentWorker):
+        super(RemoteAgent, self).__init__()
+        self.worker = worker
+        self.autoplay, self.name = worker.new_agent()
+
+    def on_game_start(self, chess_board):
+        self.worker.on_game_start(chess_board)
+
+    def step(self, chess_board, player, opponent):
+        if not self.worker.alive:
+            # The worker was killed earlier in the game: restart it on the current position
+            self.worker.new_agent()
+            self.worker.on_game_start(chess_board)
+        return self.worker.step(chess_board, player, self.position_history)
+
+    def on_move(self, move_coords, player):
+        self.worker.on_move(move_coords, player)
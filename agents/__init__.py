@@ -2,3 +2,4 @@ from .random_agent import RandomAgent
 from .human_agent import HumanAgent
 from .student_agent import StudentAgent
 from .greedy_corners_agent import StudentAgent
+from .learned_agent import LearnedAgent
@@ -1,3 +1,6 @@
+from telemetry import TELEMETRY
+
+
 class Agent:
     def __init__(self):
         """
@@ -6,6 +9,11 @@ class Agent:
         self.name = "DummyAgent"
         # Flag to indicate whether the agent can be used to autoplay
         self.autoplay = True
+        # Instrumentation sink; guard every report with `if self.telemetry.enabled:`
+        self.telemetry = TELEMETRY
+        # Set by World: occurrences of every position (GameState.hash, side to move included) since the
+        # last irreversible move, shared by both agents and read only. Lets a search detect repetitions.
+        self.position_history = None
 
     def __str__(self) -> str:
         return self.name
@@ -31,3 +39,33 @@ class Agent:
             The position (x, y) where the player places the disc.
         """
         pass
+
+    def on_game_start(self, chess_board):
+        """
+        Called by World once before the first move, with a copy of the initial board.
+        Override to set up state kept across turns. Does nothing by default.
+
+        Parameters
+        ----------
+        chess_board : numpy.ndarray of shape (board_size, board_size)
+            The initial board. Blue (player 1) moves first.
+        """
+        pass
+
+    def on_move(self, move_coords, player):
+        """
+        Called by World on both agents after every move, the agent's own included: passes (move_coords is None)
+        and the random moves played when an agent fails. Lets a stateful agent advance its own board, hashes or
+        search tree instead of rebuilding them from the board passed to step. Does nothing by default.
+
+        The call does not count towards the agent's turn time, so keep it cheap: World logs a warning when it
+        takes longer than ON_MOVE_WARN_TIME seconds, and prints and ignores any exception it raises.
+
+        Parameters
+        ----------
+        move_coords : MoveCoordinates
+            The executed move, None for a pass
+        player : int
+            The player who moved (1 for Blue, 2 for Brown)
+        """
+        pass
@@ -0,0 +1,42 @@
+# Student agent search with the learned evaluation function of learned_eval.py at the leaves
+import numpy as np
+
+from agents.student_agent import StudentAgent
+from store import register_agent
+from evaluation import count_discs
+from learned_eval import DEFAULT_MODEL_PATH, ValueModel
+
+
+@register_agent("learned_agent")
+class LearnedAgent(StudentAgent):
+  """
+  Same search as StudentAgent, but leaves are scored by a ValueModel loaded from DEFAULT_MODEL_PATH
+  (train one with train_eval.py). Falls back to StudentAgent's heuristic if no model file exists.
+  """
+
+  def __init__(self):
+    super(LearnedAgent, self).__init__()
+    self.name = "LearnedAgent"
+    self.model = ValueModel.load(DEFAULT_MODEL_PATH) if DEFAULT_MODEL_PATH.exists() else None
+    if self.model is not None:
+      # predictions are in [-1, 1], much smaller than the heuristic's scores
+      self.params["aspiration_window"] = 0.25
+
+  def evaluate(self, board, player, opponent, state=None):
+    if self.model is None:
+      return super().evaluate(board, player, opponent, state)
+    to_move = None if state is None else state.to_move
+    return self.evaluate_batch(board[None], player, opponent, to_move)[0].item()
+
+  def evaluate_batch(self, boards, player, opponent, to_move=None):
+    """
+    Predicted result of every board for player, in [-1, 1], with to_move to move (default: player).
+    Eliminations are scored beyond that range.
+    """
+    if self.model is None:
+      return super().evaluate_batch(boards, player, opponent, to_move)
+
+    scores = self.model.predict(boards, player, to_move)
+    scores = np.where(count_discs(boards, opponent) == 0, 2.0, scores)
+    scores = np.where(count_discs(boards, player) == 0, -2.0, scores)
+    return scores
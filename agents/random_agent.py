@@ -1,7 +1,8 @@
 import numpy as np
 
+import rollout
 from agents.agent import Agent
-from helpers import random_move
+from helpers import decode_move
 from store import register_agent
 
 
@@ -9,13 +10,18 @@ from store import register_agent
 @register_agent("random_agent")
 class RandomAgent(Agent):
     """
-    Example of an agent which takes random decisions
+    Example of an agent which takes random decisions.
+    Moves are drawn by the uniform rollout policy (see rollout.py), seeded from np.random so that seeded
+    autoplay games are reproducible.
     """
 
-    def __init__(self):
+    def __init__(self, policy="uniform"):
         super(RandomAgent, self).__init__()
         self.name = "RandomAgent"
         self.autoplay = True
+        self.policy = policy
+        self.rng = np.random.default_rng(np.random.randint(2**31))
+        rollout.warm_up()
 
     def step(self, chess_board, player, opponent):
         """
@@ -37,4 +43,4 @@ class RandomAgent(Agent):
             The position (x, y) where the player places the disc.
         """
 
-        return random_move(chess_board, player)
+        return decode_move(rollout.sample_move(chess_board, player, self.policy, self.rng))
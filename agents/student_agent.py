@@ -1,22 +1,83 @@
 # Student agent: Add your own agent here
 from agents.agent import Agent
 from store import register_agent
+import json
 import sys
 import numpy as np
 import time
-from helpers import execute_move, check_endgame, get_valid_moves, count_disc_count_change
+from helpers import decode_move, PASS_MOVE_CODE
+from game_state import GameState
+import kernels
+from evaluation import apply_moves, central_control, disc_gains, student_scores, STUDENT_EVAL_PARAMS, EvalCache
+
+class SearchTimeout(Exception):
+  """
+  Raised inside the search when the time limit of the turn is reached.
+  """
+
 
 @register_agent("student_agent")
 class StudentAgent(Agent):
   """
   A class for your implementation. Feel free to use this class to
   add any helper functionalities needed for your agent.
+
+  The search is an iteratively deepened negamax principal variation search (PVS):
+  - every iteration searches the best move of the previous one first, in an aspiration window
+    around its score, and widens the window only if the result falls outside of it
+  - after the first move of a node, the others are only tested with a null window,
+    and fully searched again if they turn out better
+  - late quiet moves (no capture) are searched one ply shallower first (late move reduction)
+  - positions already played in the game (position_history) or on the current search path are scored
+    as leaves, so jump cycles are not searched again
+  Scores are always evaluated from the point of view of the agent and negated for the opponent's nodes.
   """
 
+  # Search and evaluation parameters. tuner.py optimizes them, and the league/tuner workers
+  # override them per game through self.params.
+  DEFAULT_PARAMS = {
+    "max_depth": 8,
+    "move_cutoff": 5,
+    "time_limit": 1.90,
+    "eval_cache_mb": 32,
+    # half width of the aspiration window, in evaluation units
+    "aspiration_window": 200,
+    # late move reductions: from this move index on, at nodes with at least this depth left
+    "lmr_move_index": 2,
+    "lmr_min_depth": 3,
+    **STUDENT_EVAL_PARAMS,
+  }
+  # Width of the null window, small enough for non-integer evaluations
+  NULL_WINDOW = 1e-6
+
   def __init__(self):
     super(StudentAgent, self).__init__()
     self.name = "StudentAgent"
-    self.max_depth = 4
+    self.params = dict(self.DEFAULT_PARAMS)
+    # Leaf scores, kept across turns. Created on the first step so that params overrides apply.
+    self.eval_cache = None
+    # Score of the last move played (deepest completed iteration, from the agent's point of view),
+    # None if it passed or no iteration completed. dataset.py records it.
+    self.last_score = None
+    # Compile the accelerated kernels now rather than during the first timed turn
+    kernels.warm_up()
+
+  @classmethod
+  def load_params(cls, path):
+    """
+    Params overrides read from a JSON object of name -> value, such as the tuned params written by tuner.py.
+    Raises ValueError on a name that is not in DEFAULT_PARAMS.
+    """
+    with open(path) as fo:
+      params = json.load(fo)
+    unknown = set(params) - set(cls.DEFAULT_PARAMS)
+    if unknown:
+      raise ValueError(f"Unknown params in {path}: {', '.join(sorted(unknown))}")
+    return params
+
+  @property
+  def max_depth(self):
+    return self.params["max_depth"]
     
   def step(self, chess_board, player, opponent):
     """
@@ -39,152 +100,312 @@ class StudentAgent(Agent):
     # time_taken during your search and breaking with the best answer
     # so far when it nears 2 seconds.
     start_time = time.time()
-    time_limit = 1.90
+    time_limit = self.params["time_limit"]
+    self.deadline = start_time + time_limit
+    self.last_score = None
+
+    if self.eval_cache is None:
+      self.eval_cache = EvalCache(self.params["eval_cache_mb"] * 2**20)
+
+    # The search plays and takes back moves on a single copy of the board, through a GameState that keeps
+    # disc counts and the position hash up to date (O(1) terminal checks and repetition lookups), and on
+    # boards beyond MAX_BOARD_SIZE a bitboard that generates moves from the frontier only
+    state = GameState(self.copy_board(chess_board), to_move=player)
+    self.player, self.opponent = player, opponent
 
-    valid_moves = self.get_moves(chess_board, player)
+    # Moves are move codes (helpers.encode_move) during the search, decoded only for the returned move
+    valid_moves = self.get_moves(state, player)
 
-    if not valid_moves:
+    if len(valid_moves) == 0:
       return None
 
-    best_move = None
-    best_score = float('-inf')
-    alpha = float('-inf')
-    beta = float('inf')
-    
-    self.best_move_so_far = None
-    self.best_score_so_far = float('-inf')
+    # ran out of time before the first iteration completed (short time limits): the best ordered move
+    best_move = valid_moves[0]
+    # score of every completed depth. The heuristic swings between odd and even depths (the side that moved
+    # last is ahead), so each iteration's aspiration window is centered on the score of depth - 2.
+    scores = {}
+    previous_duration = None
 
-    for move in valid_moves:
-      
-      if time.time() - start_time > time_limit:
+    for depth in range(1, self.max_depth + 1):
+      iteration_start = time.time()
+      try:
+        scores[depth], best_move = self.aspiration_search(state, valid_moves, depth, scores.get(depth - 2))
+      except SearchTimeout:
+        break
+      if self.telemetry.enabled:
+        self.telemetry.set_max("completed_depth", depth)
+
+      # Search the best move first in the next iteration
+      valid_moves = np.concatenate(([best_move], valid_moves[valid_moves != best_move]))
+
+      # Stop if the next iteration is not expected to finish: it takes about branching times as long as this one
+      duration = time.time() - iteration_start
+      branching = 4 if not previous_duration else min(max(duration / previous_duration, 2), 8)
+      previous_duration = duration
+      if time.time() + duration * branching > self.deadline:
         break
       
-      board_copy = np.copy(chess_board)
-      execute_move(board_copy, move, player)
-      
-      score = self.minimax(board_copy, False, alpha, beta, player, opponent, 1, start_time, time_limit, move)
-      
-      if score > best_score:
-        best_score = score
-        best_move = move
-      
-      if score > self.best_score_so_far:
-        self.best_score_so_far = score
-        self.best_move_so_far = move
-      
-      alpha = max(alpha, best_score)
-      
+    if scores:
+      self.last_score = scores[max(scores)]
     time_taken = time.time() - start_time
     
     if time_taken > 2.0:
       print("WARNING: Move took too long. Time taken: {:.4f} seconds".format(time_taken))
 
-    if self.best_move_so_far is not None:
-      return self.best_move_so_far
-    
-    return best_move
+    return decode_move(best_move)
 
-  def get_moves(self, board, player):
+  def aspiration_search(self, state, root_moves, depth, previous_score):
     """
-    Returns an ordered list of moves from most promising to least.
-    Most promising being the moves that can get the most discs.
+    Search the root at the given depth in a window around previous_score (a full window if None).
+    A fail low (high) re-searches with the lower (upper) bound moved past the returned score by twice the window.
+
+    Returns (score, best move).
+    """
+    alpha, beta = float('-inf'), float('inf')
+    window = self.params["aspiration_window"]
+    if previous_score is not None:
+      alpha, beta = previous_score - window, previous_score + window
+
+    while True:
+      score, best_move = self.search_root(state, root_moves, depth, alpha, beta)
+      if score <= alpha:
+        window *= 2
+        alpha = score - window
+      elif score >= beta:
+        window *= 2
+        beta = score + window
+      else:
+        return score, best_move
+      if self.telemetry.enabled:
+        self.telemetry.count("aspiration_researches")
+
+  def search_root(self, state, root_moves, depth, alpha, beta):
+    """
+    PVS over the root moves. Returns (score, best move).
+    """
+    best_score = float('-inf')
+    best_move = root_moves[0]
+    # hashes of the nodes being expanded, reset in case the previous search timed out
+    self.search_path = {state.hash}
+    for i, move in enumerate(root_moves):
+      captured = state.discs[self.opponent]
+      undo = state.apply(move)
+      score = self.search_child(state, i, state.discs[self.opponent] == captured, depth, alpha, beta, 1)
+      state.undo(undo)
+
+      if score > best_score:
+        best_score, best_move = score, move
+      alpha = max(alpha, score)
+      if alpha >= beta:
+        break
+    return best_score, best_move
+
+  def search_child(self, state, index, quiet, depth, alpha, beta, ply):
+    """
+    Score (for the parent) of the child at `index` in the parent's move order, with `depth` left at the parent.
+
+    The first child is searched with the full window. The others get a null window first, reduced by one ply
+    for late quiet moves, and are searched again with the full window only if they beat alpha.
+    """
+    if index == 0:
+      return -self.negamax(state, depth - 1, -beta, -alpha, ply)
+
+    reduction = 1 if quiet and index >= self.params["lmr_move_index"] and depth >= self.params["lmr_min_depth"] else 0
+    score = -self.negamax(state, depth - 1 - reduction, -alpha - self.NULL_WINDOW, -alpha, ply)
+    if reduction and score > alpha:
+      score = -self.negamax(state, depth - 1, -alpha - self.NULL_WINDOW, -alpha, ply)
+    if alpha < score < beta:
+      if self.telemetry.enabled:
+        self.telemetry.count("pvs_researches")
+      score = -self.negamax(state, depth - 1, -beta, -alpha, ply)
+    return score
+
+  def get_moves(self, state, player):
+    """
+    Returns an ordered array of move codes of player in the position of state (a GameState),
+    from most promising to least. Most promising being the moves that can get the most discs.
     """
     
-    moves = get_valid_moves(board, player)
-    result = {}
-    
-    for move in moves:
-      num_discs_gained = count_disc_count_change(board, move, player)
-      result[move] = num_discs_gained
-    
-    result = sorted(result.items(), key=lambda x: x[1], reverse=True)[:5]
-    
-    moves = []
-    for move, _ in result:
-      moves.append(move)
+    if self.telemetry.enabled:
+      start = time.perf_counter()
+
+    codes = state.move_codes(player)
+    # stable sort, so that ties keep the get_valid_moves order
+    order = np.argsort(-disc_gains(state.board, codes, player), kind="stable")
+    moves = codes[order[:self.params["move_cutoff"]]]
     
+    if self.telemetry.enabled:
+      self.telemetry.add_time("get_moves", time.perf_counter() - start)
+
     return moves
   
-  def minimax(self, board, is_maximizing, alpha, beta, player, opponent, depth, start_time, time_limit, root_move=None):
+  def negamax(self, state, depth, alpha, beta, ply):
     """
-    Alpha Beta Pruning algorithm implementation.
+    Fail-soft alpha-beta (PVS) in negamax form: the score of the position for the player to move,
+    searched `depth` plies deep. Raises SearchTimeout when the turn's time is up.
     """
 
-    if time.time() - start_time > time_limit:
-      if root_move is not None:
-        score = self.get_scores(board, player, opponent)
-        
-        if score > self.best_score_so_far:
-          self.best_score_so_far = score
-          self.best_move_so_far = root_move
-          
-      return self.get_scores(board, player, opponent)
+    if self.telemetry.enabled:
+      self.telemetry.count("nodes")
+      self.telemetry.set_max("depth", ply)
 
-    is_endgame, _, _ = check_endgame(board)
+    if time.time() > self.deadline:
+      raise SearchTimeout()
 
-    if is_endgame or depth == self.max_depth:
-      return self.get_scores(board, player, opponent)
+    # evaluations are from the agent's point of view
+    sign = 1 if state.to_move == self.player else -1
 
-    cur_player = player if is_maximizing else opponent
+    is_endgame, _, _ = state.check_endgame()
 
-    valid_moves = self.get_moves(board, cur_player)
+    if is_endgame or depth <= 0:
+      return sign * self.get_scores(state.board, self.player, self.opponent, state)
 
-    if not valid_moves:
-      opponent_moves = self.get_moves(board, opponent if is_maximizing else player)
-      
-      if not opponent_moves:
+    if state.hash in self.search_path or (self.position_history and state.hash in self.position_history):
+      # repetition: the cycle gains nothing, score the position instead of searching it again
+      if self.telemetry.enabled:
+        self.telemetry.count("repetitions")
+      return sign * self.get_scores(state.board, self.player, self.opponent, state)
+
+    self.search_path.add(state.hash)
+    score = self.expand(state, depth, alpha, beta, ply, sign)
+    self.search_path.discard(state.hash)
+    return score
+
+  def expand(self, state, depth, alpha, beta, ply, sign):
+    """
+    Search the children of a non-terminal node of negamax. sign is 1 if the agent is to move, -1 otherwise.
+    """
+    board, to_move = state.board, state.to_move
+    other = 3 - to_move
+    valid_moves = self.get_moves(state, to_move)
+
+    if len(valid_moves) == 0:
+      if not state.has_move(other):
         # both players have no moves, endgame
-        return self.get_scores(board, player, opponent)
+        return sign * self.get_scores(board, self.player, self.opponent, state)
       
-      # early termination, continue to next depth
-      return self.minimax(board, not is_maximizing, alpha, beta, player, opponent, depth + 1, start_time, time_limit, root_move)
+      # pass, the opponent plays at the next depth
+      undo = state.apply(PASS_MOVE_CODE)
+      score = -self.negamax(state, depth - 1, -beta, -alpha, ply + 1)
+      state.undo(undo)
+      return score
 
-    if is_maximizing: # maximizing player
-      max_score = float('-inf')
-      
+    if depth == 1 and state.bits is not None:
+      # last ply of a large board: play every child on the state, whose counts and bitboard make
+      # evaluate cheaper than building and scanning a stack of n*n children
+      if self.telemetry.enabled:
+        self.telemetry.count("nodes", len(valid_moves))
+      best_score = float('-inf')
       for move in valid_moves:
-        
-        if time.time() - start_time > time_limit:
-          break
-        
-        board_copy = np.copy(board)
-        execute_move(board_copy, move, cur_player)
-        
-        score = self.minimax(board_copy, False, alpha, beta, player, opponent, depth+1, start_time, time_limit, root_move)
-        
-        max_score = max(max_score, score)
-        alpha = max(alpha, max_score)
-        
-        if beta <= alpha:
-          break
-        
-      return max_score
-    
-    else: # minimizing player
-      min_score = float('inf')
-      
-      for move in valid_moves:
-        
-        if time.time() - start_time > time_limit:
-          break
-        
-        board_copy = np.copy(board)
-        execute_move(board_copy, move, cur_player)
-        
-        score = self.minimax(board_copy, True, alpha, beta, player, opponent, depth+1, start_time, time_limit, root_move)
-        
-        min_score = min(min_score, score)
-        beta = min(beta, min_score)
-        
-        if beta <= alpha:
-          break
-        
-      return min_score
+        undo = state.apply(move)
+        best_score = max(best_score, sign * self.get_scores(state.board, self.player, self.opponent, state))
+        state.undo(undo)
+      return best_score
+
+    if depth == 1:
+      # last ply: score all children in one vectorized call instead of recursing into each of them
+      scores = self.get_batch_scores(state, valid_moves, self.player, self.opponent)
+      return (sign * scores).max().item()
+
+    best_score = float('-inf')
+    for i, move in enumerate(valid_moves):
+      captured = state.discs[other]
+      undo = state.apply(move)
+      score = self.search_child(state, i, state.discs[other] == captured, depth, alpha, beta, ply + 1)
+      state.undo(undo)
+
+      best_score = max(best_score, score)
+      alpha = max(alpha, score)
+      if alpha >= beta:
+        break
+
+    return best_score
     
-  def get_scores(self, board, player, opponent):
+  def copy_board(self, board):
+    """
+    np.copy of the board, timed when telemetry is enabled.
+    """
+    if not self.telemetry.enabled:
+      return np.copy(board)
+
+    start = time.perf_counter()
+    board_copy = np.copy(board)
+    self.telemetry.add_time("copy", time.perf_counter() - start)
+    return board_copy
+
+  def get_scores(self, board, player, opponent, state=None):
+      """
+      Returns a score for the given board state, looked up in the evaluation cache first.
+      state is the search's GameState of that board, if any (see evaluate); without it the score is not cached.
+      Timed when telemetry is enabled.
+      """
+      if self.telemetry.enabled:
+        start = time.perf_counter()
+
+      if self.eval_cache is None or state is None:
+        score = self.evaluate(board, player, opponent, state)
+      else:
+        key = EvalCache.key(state.hash, player)
+        score = self.eval_cache.get(key)
+        if score is None:
+          score = self.evaluate(board, player, opponent, state)
+          self.eval_cache.put(key, score)
+          if self.telemetry.enabled:
+            self.telemetry.count("eval_cache_misses")
+        elif self.telemetry.enabled:
+          self.telemetry.count("eval_cache_hits")
+
+      if self.telemetry.enabled:
+        self.telemetry.count("evaluations")
+        self.telemetry.add_time("get_scores", time.perf_counter() - start)
+      return score
+
+  def get_batch_scores(self, state, codes, player, opponent):
+      """
+      Scores of the positions after each of the move codes of the side to move of state (a GameState), same
+      values as get_scores. The children are looked up in the evaluation cache by their hashes first, and only
+      the missing ones are built and scored together in one vectorized pass.
+      """
+      if self.telemetry.enabled:
+        start = time.perf_counter()
+
+      to_move = 3 - state.to_move
+      if self.eval_cache is None:
+        scores = self.evaluate_batch(apply_moves(state.board, codes, state.to_move), player, opponent, to_move)
+      else:
+        keys = [EvalCache.key(child_hash, player) for child_hash in state.child_hashes(codes).tolist()]
+        cached = [self.eval_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(cached) if score is None]
+        if missing:
+          children = apply_moves(state.board, codes[missing], state.to_move)
+          computed = self.evaluate_batch(children, player, opponent, to_move).tolist()
+          for i, score in zip(missing, computed):
+            cached[i] = score
+            self.eval_cache.put(keys[i], score)
+        scores = np.array(cached)
+        if self.telemetry.enabled:
+          self.telemetry.count("eval_cache_hits", len(codes) - len(missing))
+          self.telemetry.count("eval_cache_misses", len(missing))
+
+      if self.telemetry.enabled:
+        self.telemetry.count("nodes", len(codes))
+        self.telemetry.count("evaluations", len(codes))
+        self.telemetry.add_time("get_scores", time.perf_counter() - start)
+      return scores
+
+  def evaluate_batch(self, boards, player, opponent, to_move=None):
+      """
+      Heuristic of evaluate on a stack of boards in one vectorized pass (see evaluation.student_scores).
+      The heuristic does not depend on the side to move, to_move is ignored.
+      """
+      return student_scores(boards, player, opponent, self.params)
+
+  def evaluate(self, board, player, opponent, state=None):
       """
       Returns a score for the given board state from the perspective of the player.
       A higher score indicates a more favorable position for the player.
+      If state (the GameState of the board) is given, disc counts and game progress come from its
+      incrementally maintained counts, and mobility from its bitboard on boards beyond MAX_BOARD_SIZE.
       
       Encapsulates multiple heuristics to evaluate the board state:
       - Disc Count Difference: The difference in the number of discs between the player and opponent.
@@ -196,16 +417,24 @@ class StudentAgent(Agent):
       so we want to play more aggressively to gain control of the center. Late game, this matters less.
       """
       
-      num_player_discs = np.sum(board == player)
-      num_opponent_discs = np.sum(board == opponent)
+      if state is None:
+        num_player_discs = np.count_nonzero(board == player)
+        num_opponent_discs = np.count_nonzero(board == opponent)
+      else:
+        num_player_discs = state.discs[player]
+        num_opponent_discs = state.discs[opponent]
       
       if num_player_discs == 0:
         return -1000
       if num_opponent_discs == 0:
         return 1000
       
-      num_moves_opponent = len(get_valid_moves(board, opponent))
-      num_moves_player = len(get_valid_moves(board, player))
+      if state is None:
+        num_moves_opponent = kernels.mobility(board, opponent)
+        num_moves_player = kernels.mobility(board, player)
+      else:
+        num_moves_opponent = state.mobility(opponent)
+        num_moves_player = state.mobility(player)
       
       if num_moves_opponent == 0 and num_moves_player > 0:
         # reward for opponent having no moves
@@ -214,19 +443,27 @@ class StudentAgent(Agent):
         # penalty for player having no moves
         return -500
 
-      move_diff = len(get_valid_moves(board, player)) - len(get_valid_moves(board, opponent))
+      move_diff = num_moves_player - num_moves_opponent
       
       discs_diff = num_player_discs - num_opponent_discs
       
-      center_points = self.central_control(board, player, opponent)
-      
-      game_progress = self.get_game_progress(board)
+      if state is None:
+        game_progress = self.get_game_progress(board)
+      else:
+        # the squares that are not obstacles are the discs and the empty squares
+        filled_tiles = state.discs[1] + state.discs[2]
+        game_progress = filled_tiles / (filled_tiles + state.empty) if filled_tiles + state.empty > 0 else 0
       
-      if game_progress <= 0.5:
-        return 2 * discs_diff + 6 * center_points + 4 * move_diff
+      params = self.params
+      if game_progress <= params["phase_switch"]:
+        # central control only counts in the early game
+        center_points = self.central_control(board, player, opponent)
+        return (params["early_disc_weight"] * discs_diff
+                + params["early_center_weight"] * center_points
+                + params["early_mobility_weight"] * move_diff)
       
       else:
-        return 12 * discs_diff + 4 * move_diff
+        return params["late_disc_weight"] * discs_diff + params["late_mobility_weight"] * move_diff
   
   
   def central_control(self, board, player, opponent):
@@ -239,23 +476,8 @@ class StudentAgent(Agent):
     closer to the center.
     """
     
-    board_size = board.shape[0]
-    center = board_size // 2
-    score = 0
-    
-    for row in range(board_size):
-      for col in range(board_size):
-        
-        # manhattan distance from center
-        distance = abs(row - center) +  abs(col - center)
-        
-        if board[row, col] == player:
-          score += (board_size - distance)
-          
-        elif board[row, col] == opponent:
-          score -= (board_size - distance)
-    
-    return score
+    # (board_size - manhattan distance to the center) of every cell, computed once per board size
+    return int(central_control(board[None], player, opponent)[0])
   
   def get_game_progress(self, board):
     """
@@ -264,7 +486,7 @@ class StudentAgent(Agent):
     """
     
     # exclude obstacles
-    total_tiles = board.shape[0] * board.shape[1] - np.sum(board == 3)
-    filled_tiles = np.sum((board == 1) + (board == 2))
+    total_tiles = board.shape[0] * board.shape[1] - np.count_nonzero(board == 3)
+    filled_tiles = np.count_nonzero((board == 1) | (board == 2))
     
     return filled_tiles / total_tiles if total_tiles > 0 else 0
\ No newline at end of file
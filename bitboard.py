@@ -0,0 +1,213 @@
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from helpers import MOVE_CODE_DTYPE, MOVE_FIELD_BITS, MOVE_OFFSETS
+
+"""
+Bitboard.py is the board representation of large boards (beyond MAX_BOARD_SIZE, up to 64x64).
+
+A BitBoard keeps one arbitrary-precision Python int per player and one for the empty squares: a multi-word
+bitboard, with cell (r, c) at bit r * (n + 2) + c. The two padding bits at the end of every row are never set,
+so a shift by a move offset can never wrap a disc onto the next row. Every move direction is then a single
+shift and mask over the whole board.
+
+Move generation works on the frontier, the discs with an empty square one or two tiles away: it is found with
+24 shifts, and only its cells are enumerated. Its cost grows with the number of frontier cells, not with n*n,
+and mobility and has_move need no enumeration at all (popcounts and a single test). GameState keeps a BitBoard
+of large boards up to date move by move, so neither World nor StudentAgent's search rescans the board. Building
+a BitBoard from an array (from_array, as helpers.get_valid_move_codes does for a bare board) reads every cell.
+
+    python bitboard.py                # cross-check against helpers.py, then compare with it on large boards
+
+Classes:
+    BitBoard                - multi-word bitboard of the discs and empty squares of a board
+"""
+
+# Row and column offset of every move direction, in the order of helpers.get_valid_moves
+_OFFSETS = [(int(dr), int(dc)) for dr, dc in MOVE_OFFSETS]
+
+
+def _shift(mask: int, delta: int) -> int:
+    return mask << delta if delta >= 0 else mask >> -delta
+
+
+class BitBoard:
+    """
+    Bitboards of the discs of each player (discs[1], discs[2]) and of the empty squares of a board.
+    Obstacles are the on-board bits set in none of them.
+
+    Parameters
+    ----------
+    board_size : int
+    """
+    def __init__(self, board_size: int):
+        self.n = board_size
+        self.stride = board_size + 2
+        self.discs = [0, 0, 0]
+        self.empty = 0
+        # Bit offset of every move direction
+        self.deltas = [dr * self.stride + dc for dr, dc in _OFFSETS]
+
+    @classmethod
+    def from_array(cls, chess_board):
+        bits = cls(chess_board.shape[0])
+        padded = np.zeros((bits.n, bits.stride), dtype=bool)
+        for value in (0, 1, 2):
+            padded[:, :bits.n] = chess_board == value
+            mask = int.from_bytes(np.packbits(padded, bitorder="little").tobytes(), "little")
+            if value == 0:
+                bits.empty = mask
+            else:
+                bits.discs[value] = mask
+        return bits
+
+    def to_array(self) -> np.ndarray:
+        """
+        The board as an (n, n) int array, with 3 for obstacles.
+        """
+        size = self.n * self.stride
+        board = np.full(size, 3, dtype=int)
+        for value, mask in ((0, self.empty), (1, self.discs[1]), (2, self.discs[2])):
+            cells = np.unpackbits(
+                np.frombuffer(mask.to_bytes((size + 7) // 8, "little"), dtype=np.uint8), count=size, bitorder="little"
+            )
+            board[cells.astype(bool)] = value
+        return board.reshape(self.n, self.stride)[:, :self.n]
+
+    def copy(self):
+        bits = BitBoard.__new__(BitBoard)
+        bits.__dict__.update(self.__dict__)
+        bits.discs = list(self.discs)
+        return bits
+
+    def bit(self, cell: int) -> int:
+        """
+        Bit of a flat cell index r * n + c.
+        """
+        return 1 << (cell + cell // self.n * 2)
+
+    def set_cell(self, cell: int, old: int, new: int):
+        """
+        Change a cell (flat index r * n + c) from old to new (0 empty, 1 or 2).
+        """
+        bit = self.bit(cell)
+        if old == 0:
+            self.empty ^= bit
+        else:
+            self.discs[old] ^= bit
+        if new == 0:
+            self.empty |= bit
+        else:
+            self.discs[new] |= bit
+
+    def sources(self, player: int) -> list:
+        """
+        For every move direction, the discs of player whose destination in that direction is empty.
+        """
+        own, empty = self.discs[player], self.empty
+        return [own & _shift(empty, -delta) for delta in self.deltas]
+
+    def frontier(self, player: int) -> int:
+        """
+        Discs of player with at least one valid move.
+        """
+        frontier = 0
+        for sources in self.sources(player):
+            frontier |= sources
+        return frontier
+
+    def move_codes(self, player: int) -> np.ndarray:
+        """
+        Valid moves of player as move codes, in the same order as helpers.get_valid_moves.
+        """
+        sources = self.sources(player)
+        frontier = 0
+        for mask in sources:
+            frontier |= mask
+        codes = []
+        stride = self.stride
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            r, c = divmod(low.bit_length() - 1, stride)
+            src = (r << MOVE_FIELD_BITS) | c
+            for mask, (dr, dc) in zip(sources, _OFFSETS):
+                if mask & low:
+                    codes.append((((src << MOVE_FIELD_BITS) | (r + dr)) << MOVE_FIELD_BITS) | (c + dc))
+        return np.array(codes, dtype=MOVE_CODE_DTYPE)
+
+    def mobility(self, player: int) -> int:
+        """
+        Number of valid moves of player.
+        """
+        return sum(mask.bit_count() for mask in self.sources(player))
+
+    def has_move(self, player: int) -> bool:
+        own, empty = self.discs[player], self.empty
+        return any(own & _shift(empty, -delta) for delta in self.deltas)
+
+    def count(self, value: int) -> int:
+        return (self.empty if value == 0 else self.discs[value]).bit_count()
+
+
+def cross_check(boards=200, seed=0):
+    """
+    Compare BitBoard with helpers.py on random boards of every size up to 64. Raises AssertionError on a mismatch.
+    """
+    from kernels import random_board
+    from helpers import array_move_codes
+
+    rng = np.random.default_rng(seed)
+    for _ in range(boards):
+        board = random_board(rng, int(rng.integers(6, 65)))
+        bits = BitBoard.from_array(board)
+        assert np.array_equal(bits.to_array(), board)
+        for player in (1, 2):
+            expected = array_move_codes(board, player)
+            assert np.array_equal(bits.move_codes(player), expected)
+            assert bits.mobility(player) == len(expected)
+            assert bits.has_move(player) == (len(expected) > 0)
+
+
+def benchmark(sizes=(12, 20, 32, 48, 64), repeats=50, seed=0):
+    """
+    Microseconds per call of move generation on mid-game-like boards (the top third filled with discs),
+    NumPy (helpers.array_move_codes) against BitBoard.
+    """
+    from helpers import array_move_codes
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    for n in sizes:
+        # Discs fill the top third of the board, the rest is empty: the frontier is a single band of rows
+        board = np.zeros((n, n), dtype=int)
+        board[: n // 3] = rng.choice([1, 2], size=(n // 3, n))
+        bits = BitBoard.from_array(board)
+
+        def timed(function):
+            start = perf_counter()
+            for _ in range(repeats):
+                function()
+            return (perf_counter() - start) / repeats * 1e6
+
+        results[n] = {
+            "helpers.array_move_codes": timed(lambda: array_move_codes(board, 1)),
+            "BitBoard.move_codes": timed(lambda: bits.move_codes(1)),
+            "BitBoard.mobility": timed(lambda: bits.mobility(1)),
+            "BitBoard.has_move": timed(lambda: bits.has_move(1)),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boards", type=int, default=200, help="Random boards to cross-check")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    cross_check(args.boards)
+    print(f"Cross-check passed on {args.boards} random boards")
+    for n, timings in benchmark(repeats=args.repeats).items():
+        print(f"{n}x{n}: " + ", ".join(f"{name} {micros:.1f} us" for name, micros in timings.items()))
@@ -0,0 +1,159 @@
+import argparse
+import os
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from constants import MIN_BOARD_SIZE, MAX_BOARD_SIZE, MAX_SUPPORTED_BOARD_SIZE
+from helpers import MOVE_OFFSETS
+
+"""
+Board_generator.py generates random obstacle boards of any size from MIN_BOARD_SIZE to MAX_SUPPORTED_BOARD_SIZE,
+in the CSV format of boards/ (boards beyond MAX_BOARD_SIZE are played on bitboards, see bitboard.py).
+
+Like the hand-made boards, a generated board starts with Blue (1) in the top-left and bottom-right corners and
+Brown (2) in the other two, and its obstacles (3) are symmetric about both the vertical and the horizontal
+axis, so neither player is favoured. Obstacles are added one symmetry orbit at a time, at random, until the
+target density (fraction of the squares) is reached. A board is kept only if it is valid:
+    - no obstacle on a starting corner, and both players have a move
+    - every empty square can be reached from the corners by moves (one or two tiles), so no region is cut off
+otherwise it is drawn again.
+
+    python board_generator.py --sizes 6,8,10,12 --density 0.1 --count 3 --seed 0 --output boards/generated/
+
+Functions:
+    generate_board          - one valid random symmetric board
+    is_valid_board          - the validity checks above
+    save_board              - write a board as CSV
+"""
+
+
+def symmetry_orbits(board_size: int) -> list:
+    """
+    The sets of cells mapped onto each other by the vertical and horizontal mirrors, corners excluded.
+    """
+    orbits = []
+    half = (board_size + 1) // 2
+    for r in range(half):
+        for c in range(half):
+            orbit = {
+                (r, c),
+                (r, board_size - 1 - c),
+                (board_size - 1 - r, c),
+                (board_size - 1 - r, board_size - 1 - c),
+            }
+            if (0, 0) not in orbit:
+                orbits.append(sorted(orbit))
+    return orbits
+
+
+def starting_board(board_size: int) -> np.ndarray:
+    board = np.zeros((board_size, board_size), dtype=int)
+    board[0, 0] = board[-1, -1] = 1
+    board[0, -1] = board[-1, 0] = 2
+    return board
+
+
+def is_valid_board(chess_board) -> bool:
+    """
+    Whether both players have a move and every non-obstacle square is reachable from the discs by moves.
+    """
+    n = chess_board.shape[0]
+    for player in (1, 2):
+        discs = np.argwhere(chess_board == player)
+        if not any(
+            0 <= r + dr < n and 0 <= c + dc < n and chess_board[r + dr, c + dc] == 0
+            for r, c in discs
+            for dr, dc in MOVE_OFFSETS
+        ):
+            return False
+
+    reached = chess_board == 3
+    queue = deque(map(tuple, np.argwhere((chess_board == 1) | (chess_board == 2))))
+    for cell in queue:
+        reached[cell] = True
+    while queue:
+        r, c = queue.popleft()
+        for dr, dc in MOVE_OFFSETS:
+            r_next, c_next = r + dr, c + dc
+            if 0 <= r_next < n and 0 <= c_next < n and not reached[r_next, c_next]:
+                reached[r_next, c_next] = True
+                queue.append((r_next, c_next))
+    return bool(reached.all())
+
+
+def generate_board(board_size: int, density=0.1, rng=None, max_attempts=1000) -> np.ndarray:
+    """
+    A valid random symmetric board with about density * board_size**2 obstacles (rounded up to whole orbits).
+
+    Parameters
+    ----------
+    board_size : int
+        Between MIN_BOARD_SIZE and MAX_SUPPORTED_BOARD_SIZE
+    density : float
+        Target fraction of the squares covered by obstacles
+    rng : np.random.Generator
+        Source of randomness, a fresh unseeded generator if None
+    max_attempts : int
+        Boards drawn before giving up
+
+    Returns
+    -------
+    np.ndarray of shape (board_size, board_size)
+    """
+    if not MIN_BOARD_SIZE <= board_size <= MAX_SUPPORTED_BOARD_SIZE:
+        raise ValueError(
+            f"Board size must be between {MIN_BOARD_SIZE} and {MAX_SUPPORTED_BOARD_SIZE}, got {board_size}"
+        )
+    if not 0 <= density < 1:
+        raise ValueError(f"Obstacle density must be in [0, 1), got {density}")
+    rng = np.random.default_rng() if rng is None else rng
+    orbits = symmetry_orbits(board_size)
+    target = density * board_size * board_size
+
+    for _ in range(max_attempts):
+        board = starting_board(board_size)
+        obstacles = 0
+        for index in rng.permutation(len(orbits)):
+            if obstacles >= target:
+                break
+            for cell in orbits[index]:
+                board[cell] = 3
+            obstacles += len(orbits[index])
+        if is_valid_board(board):
+            return board
+    raise RuntimeError(f"No valid {board_size}x{board_size} board with density {density} in {max_attempts} attempts")
+
+
+def save_board(chess_board, path):
+    """
+    Write a board in the CSV format of boards/ (comma separated, no trailing newline).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as fo:
+        fo.write("\n".join(",".join(str(cell) for cell in row) for row in chess_board.tolist()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default=",".join(str(size) for size in range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1)),
+        help="Comma separated board sizes",
+    )
+    parser.add_argument("--density", type=float, default=0.1, help="Target fraction of obstacle squares")
+    parser.add_argument("--count", type=int, default=1, help="Boards per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="boards/generated/")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for board_size in (int(size) for size in args.sizes.split(",")):
+        for i in range(args.count):
+            board = generate_board(board_size, args.density, rng)
+            path = os.path.join(args.output, f"gen_{board_size}x{board_size}_d{args.density:g}_s{args.seed}_{i}.csv")
+            save_board(board, path)
+            print(f"{path}: {np.count_nonzero(board == 3)} obstacles")
@@ -2,6 +2,11 @@
 # Constants used throughout the game
 MIN_BOARD_SIZE = 6
 MAX_BOARD_SIZE = 12
+# Largest board the engine accepts (move codes hold 6-bit coordinates). Boards beyond MAX_BOARD_SIZE
+# are played on bitboards (see bitboard.py).
+MAX_SUPPORTED_BOARD_SIZE = 64
+# Agent.on_move calls slower than this (in seconds) are logged as warnings by World
+ON_MOVE_WARN_TIME = 0.1
 AGENT_NOT_FOUND_MSG = (
     "Check if you have used the decorator @register_agent to register your agent!"
 )
@@ -12,3 +17,9 @@ PLAYER_2_NAME = "Brown"
 PLAYER_1_COLOR = "tab:blue"  # Black is traditionally used for Player 1
 PLAYER_2_COLOR = "tab:brown"  # White is traditionally used for Player 2
 OBSTACLE_COLOR = "tab:green" # Green represents obstacles
+# Why a game ended, as reported in World.end_reason and the results records
+END_ELIMINATION = "elimination"  # a player has no discs left
+END_BOARD_FULL = "board_full"  # no empty square left
+END_NO_MOVES = "no_moves"  # neither player can move
+END_MOVE_LIMIT = "move_limit"  # World.MOVE_COUNT_LIMIT reached
+END_REPETITION = "repetition"  # a position occurred World.repetition_limit times
@@ -0,0 +1,349 @@
+import argparse
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import numpy as np
+
+from constants import MAX_BOARD_SIZE
+from helpers import PASS_MOVE_CODE
+from utils import all_logging_disabled
+from world import World
+
+"""
+Dataset.py generates self-play training data and stores it in fixed-size NumPy shards.
+
+Every position where an agent searched a move becomes one record:
+    hash        - GameState Zobrist hash of the position (board and side to move)
+    board       - the board as int8, padded to MAX_BOARD_SIZE x MAX_BOARD_SIZE with -1
+    board_size  - size of the board
+    player      - the side to move
+    score       - the agent's search score from the side to move (Agent.last_score), NaN if it has none
+    result      - final result of the game from the side to move (1 win, 0 tie, -1 loss)
+    game, ply   - where the position comes from
+
+The generator is a pipeline of Python generators with bounded memory. Worker processes play games (a bounded
+number in flight) and return each game's records. Positions already seen are dropped by hash, and the rest
+stream into a ShardWriter, which only holds the shard being filled. Shards are plain .npy files of a structured
+dtype (shard_00000.npy, ...): readers memory-map them and draw random batches without loading a whole shard.
+
+    python dataset.py --agents student_agent,greedy_corners_agent --games 1000 --time_limit 0.1 --output data/selfplay
+
+Classes:
+    ShardWriter             - writes records into fixed-size .npy shards
+    ShardDataset            - memory-mapped shards of a directory, read in random batches
+
+Functions:
+    play_positions          - play one game from a task and return its records, runs inside a worker process
+    generate_positions      - records of many games, played over a pool of workers
+    dedupe                  - drop records whose position was already seen
+"""
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("hash", "<u8"),
+        ("board", "i1", (MAX_BOARD_SIZE, MAX_BOARD_SIZE)),
+        ("board_size", "u1"),
+        ("player", "u1"),
+        ("score", "<f4"),
+        ("result", "i1"),
+        ("game", "<u4"),
+        ("ply", "<u2"),
+    ]
+)
+SHARD_PATTERN = "shard_{:05d}.npy"
+
+
+def play_positions(task: dict) -> np.ndarray:
+    """
+    Play a single game described by task (player_1, player_2, board, seed, game, and optionally
+    player_1_params / player_2_params as in league.play_game) and return the records of its positions.
+    Passes, where no agent searched, are not recorded.
+    """
+    np.random.seed(task["seed"])
+    random.seed(task["seed"])
+    with all_logging_disabled():
+        world = World(
+            player_1=task["player_1"],
+            player_2=task["player_2"],
+            board_fpath=task["board"],
+            autoplay=True,
+            log_events=False,
+        )
+        if task.get("player_1_params"):
+            world.p0.params.update(task["player_1_params"])
+        if task.get("player_2_params"):
+            world.p1.params.update(task["player_2_params"])
+
+        n = world.board_size
+        if n > MAX_BOARD_SIZE:
+            raise ValueError(f"Records hold boards up to {MAX_BOARD_SIZE}x{MAX_BOARD_SIZE}, got {n}x{n}")
+        records = np.zeros(world.MOVE_COUNT_LIMIT, dtype=RECORD_DTYPE)
+        count = 0
+        is_end = False
+        while not is_end:
+            agent = world.get_current_agent()
+            player = world.get_current_player()
+            record = records[count]
+            record["hash"] = world.state.hash
+            record["board"][:] = -1
+            record["board"][:n, :n] = world.chess_board
+            record["board_size"] = n
+            record["player"] = player
+            record["ply"] = world.move_count
+
+            is_end, p0_score, p1_score = world.step()
+            if world.move_history[-1] != PASS_MOVE_CODE:
+                score = getattr(agent, "last_score", None)
+                record["score"] = np.nan if score is None else score
+                count += 1
+
+    records = records[:count]
+    result = int(np.sign(p0_score - p1_score))
+    records["result"] = np.where(records["player"] == 1, result, -result)
+    records["game"] = task["game"]
+    return records
+
+
+def generate_positions(tasks, workers=None, max_in_flight=None):
+    """
+    Play every task with play_positions over a pool of workers and yield each game's records as it finishes.
+    At most max_in_flight games (default: twice the number of workers) are submitted at once, so finished
+    games never pile up in memory.
+    """
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        max_in_flight = max_in_flight or 2 * (workers or os.cpu_count())
+        pending = set()
+        while True:
+            for task in tasks:
+                pending.add(executor.submit(play_positions, task))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def dedupe(batches, seen=None):
+    """
+    Yield every batch of records without the positions already seen (in an earlier batch or earlier in the
+    same batch), by hash. The first occurrence of a position is kept. seen is updated in place.
+    """
+    seen = set() if seen is None else seen
+    for records in batches:
+        keep = np.zeros(len(records), dtype=bool)
+        for i, position_hash in enumerate(records["hash"].tolist()):
+            if position_hash not in seen:
+                seen.add(position_hash)
+                keep[i] = True
+        if keep.any():
+            yield records[keep]
+
+
+def shard_index(path) -> int:
+    """
+    Index of a shard file (shard_00012.npy -> 12).
+    """
+    return int(Path(path).stem.split("_")[1])
+
+
+class ShardWriter:
+    """
+    Writes records into .npy shards of shard_size records each (the last one may be smaller).
+
+    Only the shard being filled is held in memory. A shard is written to a temporary file and renamed, so a
+    directory never holds a partial shard. New shards are numbered after the ones already in the directory.
+
+    Parameters
+    ----------
+    directory : str
+        Output directory, created if needed
+    shard_size : int
+        Records per shard
+    """
+    def __init__(self, directory, shard_size=100_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.buffer = np.zeros(shard_size, dtype=RECORD_DTYPE)
+        self.count = 0
+        # After the highest existing index, so a gap in the numbering never overwrites a shard
+        self.shard_index = max((shard_index(path) for path in self.directory.glob("shard_*.npy")), default=-1) + 1
+        self.written = 0
+        self.shards_written = 0
+
+    def write(self, records):
+        while len(records):
+            taken = min(len(records), self.shard_size - self.count)
+            self.buffer[self.count:self.count + taken] = records[:taken]
+            self.count += taken
+            records = records[taken:]
+            if self.count == self.shard_size:
+                self.flush()
+
+    def flush(self):
+        if self.count == 0:
+            return
+        path = self.directory / SHARD_PATTERN.format(self.shard_index)
+        tmp_path = self.directory / ("tmp_" + path.name)
+        np.save(tmp_path, self.buffer[:self.count])
+        os.replace(tmp_path, path)
+        self.shard_index += 1
+        self.shards_written += 1
+        self.written += self.count
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardDataset:
+    """
+    The shards of a directory, memory-mapped: records are only read from disk when indexed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory written by ShardWriter
+    """
+    def __init__(self, directory):
+        paths = sorted(Path(directory).glob("shard_*.npy"), key=shard_index)
+        self.shards = [np.load(path, mmap_mode="r") for path in paths]
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, indices):
+        """
+        Records at the given global indices, read into memory, in the order given.
+        """
+        indices = np.atleast_1d(np.asarray(indices))
+        out = np.empty(len(indices), dtype=RECORD_DTYPE)
+        shard_ids = np.searchsorted(self.offsets, indices, side="right") - 1
+        for shard_id in np.unique(shard_ids):
+            where = np.nonzero(shard_ids == shard_id)[0]
+            local = indices[where] - self.offsets[shard_id]
+            # Sorted reads are sequential in the file
+            order = np.argsort(local)
+            out[where[order]] = self.shards[shard_id][local[order]]
+        return out
+
+    def batches(self, batch_size=256, rng=None, drop_last=False):
+        """
+        Yield every record once, in random batches of batch_size records.
+
+        Parameters
+        ----------
+        batch_size : int
+        rng : np.random.Generator
+            Source of the shuffle, a fresh unseeded generator if None
+        drop_last : bool
+            Whether to drop the last, smaller batch
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        order = rng.permutation(len(self))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            if drop_last and len(batch) < batch_size:
+                return
+            yield self[batch]
+
+
+def board_size(path) -> int:
+    """
+    Size of a board CSV file, from its first row.
+    """
+    with open(path) as fi:
+        return len(fi.readline().split(","))
+
+
+def make_tasks(agents, boards, games, params=None, base_seed=0, first_game=0):
+    """
+    Tasks of `games` games between random pairs of agents (self-play included) on random boards.
+    params overrides the params of agents that have them (e.g. {"time_limit": 0.1} for student_agent).
+    Boards larger than MAX_BOARD_SIZE, which records cannot hold, are left out.
+
+    Games are numbered from first_game and game i is seeded with base_seed + i, so that adding games to an
+    existing dataset (first_game past its last game) plays new games: the tasks are the ones a single run
+    of first_game + games games would have ended with.
+    """
+    boards = [board for board in boards if board_size(board) <= MAX_BOARD_SIZE]
+    if not boards:
+        raise ValueError(f"No board of at most {MAX_BOARD_SIZE}x{MAX_BOARD_SIZE} to play on")
+    rng = np.random.default_rng(base_seed)
+    for i in range(first_game + games):
+        player_1 = agents[rng.integers(len(agents))]
+        player_2 = agents[rng.integers(len(agents))]
+        board = boards[rng.integers(len(boards))]
+        if i < first_game:
+            continue
+        task = {
+            "player_1": player_1,
+            "player_2": player_2,
+            "board": board,
+            "seed": base_seed + i,
+            "game": i,
+        }
+        for player in ("player_1", "player_2"):
+            if params and task[player] in ("student_agent", "learned_agent"):
+                task[f"{player}_params"] = params
+        yield task
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=str, default="student_agent,greedy_corners_agent")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--board_roster_dir", type=str, default="boards/")
+    parser.add_argument("--output", type=str, default="data/selfplay")
+    parser.add_argument("--shard_size", type=int, default=100_000, help="Records per shard")
+    parser.add_argument("--time_limit", type=float, default=0.1, help="Time limit per move of searching agents")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    boards = sorted(
+        os.path.join(args.board_roster_dir, fname)
+        for fname in os.listdir(args.board_roster_dir)
+        if fname.endswith(".csv")
+    )
+    positions = 0
+    # Positions of the shards already in the output directory are not written again, and new games are
+    # numbered (and seeded) after the games they come from, so that a re-run does not replay them
+    seen = set()
+    first_game = 0
+    if os.path.isdir(args.output):
+        for shard in ShardDataset(args.output).shards:
+            seen.update(shard["hash"].tolist())
+            if len(shard):
+                first_game = max(first_game, int(shard["game"].max()) + 1)
+    if first_game:
+        logger.info(f"{args.output} already holds games up to {first_game - 1}, new games start at {first_game}")
+    tasks = make_tasks(
+        [agent.strip() for agent in args.agents.split(",")],
+        boards,
+        args.games,
+        params={"time_limit": args.time_limit},
+        base_seed=args.seed,
+        first_game=first_game,
+    )
+    with ShardWriter(args.output, args.shard_size) as writer:
+        for records in dedupe(generate_positions(tasks, workers=args.workers), seen):
+            writer.write(records)
+            positions += len(records)
+    logger.info(f"{positions} unique positions written to {args.output} ({writer.shards_written} new shards)")
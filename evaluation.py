@@ -0,0 +1,233 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from helpers import get_directions, decode_move_fields, MOVE_OFFSETS
+
+"""
+Evaluation.py scores a whole stack of positions at once with NumPy instead of one board at a time in Python.
+
+Boards are stacked in an array of shape (K, n, n). Every function returns one value per board, so a search can
+generate all children of a node, stack them and score them in a single call.
+
+Functions:
+    apply_moves             - stack of the children of a board, one per move
+    move_fields             - source and destination arrays of a list of moves or of move codes
+    disc_gains              - discs gained by each move, as count_disc_count_change
+    count_discs             - discs of a player on every board
+    mobility                - number of valid moves of a player on every board, same as len(get_valid_moves)
+    center_weights          - per-cell weight (board_size - manhattan distance to the center)
+    central_control         - center-weighted disc difference, as StudentAgent.central_control
+    corner_count            - corners owned by a player
+    game_progress           - fraction of non-obstacle cells filled, as StudentAgent.get_game_progress
+    student_scores          - StudentAgent's heuristic on every board
+    greedy_scores           - greedy_corners_agent's heuristic on every board
+
+Classes:
+    EvalCache               - bounded LRU cache of evaluations keyed by (position, player)
+"""
+
+# Weights of StudentAgent's heuristic, and the game progress at which it switches from early to late game
+STUDENT_EVAL_PARAMS = {
+    "phase_switch": 0.5,
+    "early_disc_weight": 2,
+    "early_center_weight": 6,
+    "early_mobility_weight": 4,
+    "late_disc_weight": 12,
+    "late_mobility_weight": 4,
+}
+_center_weights_cache = {}
+
+
+def apply_moves(chess_board, moves, player: int) -> np.ndarray:
+    """
+    Apply each move to its own copy of chess_board. The moves must be valid, either a list of MoveCoordinates
+    or an array of move codes (helpers.get_valid_move_codes).
+
+    Returns
+    -------
+    children : np.ndarray of shape (len(moves), n, n)
+    """
+    opponent = 3 - player
+    k = len(moves)
+    n = chess_board.shape[0]
+    children = np.repeat(chess_board[None, :, :], k, axis=0)
+    if k == 0:
+        return children
+
+    index = np.arange(k)
+    r_src, c_src, r_dest, c_dest = move_fields(moves)
+
+    children[index, r_dest, c_dest] = player
+    for dr, dc in get_directions():
+        r, c = r_dest + dr, c_dest + dc
+        on_board = (r >= 0) & (r < n) & (c >= 0) & (c < n)
+        i, r, c = index[on_board], r[on_board], c[on_board]
+        captured = children[i, r, c] == opponent
+        children[i[captured], r[captured], c[captured]] = player
+
+    # Jumps vacate their source
+    jumps = (np.abs(r_dest - r_src) == 2) | (np.abs(c_dest - c_src) == 2)
+    children[index[jumps], r_src[jumps], c_src[jumps]] = 0
+    return children
+
+
+def move_fields(moves):
+    """
+    (row_src, col_src, row_dest, col_dest) arrays of a list of MoveCoordinates or an array of move codes.
+    """
+    if isinstance(moves, np.ndarray):
+        return decode_move_fields(moves)
+    return (
+        np.array([move.row_src for move in moves]),
+        np.array([move.col_src for move in moves]),
+        np.array([move.row_dest for move in moves]),
+        np.array([move.col_dest for move in moves]),
+    )
+
+
+def disc_gains(chess_board, moves, player: int) -> np.ndarray:
+    """
+    Discs gained by each valid move: opponent discs around the destination, plus one for a duplication.
+    Same values as helpers.count_disc_count_change.
+    """
+    r_src, c_src, r_dest, c_dest = move_fields(moves)
+    opponent = np.pad(chess_board == 3 - player, 1)
+    gains = np.zeros(len(r_dest), dtype=np.int32)
+    for dr, dc in get_directions():
+        gains += opponent[r_dest + 1 + dr, c_dest + 1 + dc]
+    duplications = (np.abs(r_dest - r_src) < 2) & (np.abs(c_dest - c_src) < 2)
+    return gains + duplications
+
+
+def count_discs(boards: np.ndarray, player: int) -> np.ndarray:
+    return np.count_nonzero(boards == player, axis=(1, 2))
+
+
+def mobility(boards: np.ndarray, player: int) -> np.ndarray:
+    """
+    Number of valid moves of player on every board: for every empty cell, the number of the player's discs one
+    or two tiles away (in any of the 24 move directions).
+    """
+    n = boards.shape[1]
+    own = np.pad(boards == player, ((0, 0), (2, 2), (2, 2)))
+    sources = np.zeros(boards.shape, dtype=np.int32)
+    for dr, dc in MOVE_OFFSETS:
+        sources += own[:, 2 + dr:2 + dr + n, 2 + dc:2 + dc + n]
+    return np.sum(sources * (boards == 0), axis=(1, 2))
+
+
+def center_weights(board_size: int) -> np.ndarray:
+    """
+    (board_size - manhattan distance to the center cell) for every cell.
+    """
+    if board_size not in _center_weights_cache:
+        center = board_size // 2
+        rows, cols = np.indices((board_size, board_size))
+        _center_weights_cache[board_size] = board_size - (np.abs(rows - center) + np.abs(cols - center))
+    return _center_weights_cache[board_size]
+
+
+def central_control(boards: np.ndarray, player: int, opponent: int) -> np.ndarray:
+    weights = center_weights(boards.shape[1])
+    return np.sum(weights * ((boards == player).astype(np.int32) - (boards == opponent)), axis=(1, 2))
+
+
+def corner_count(boards: np.ndarray, player: int) -> np.ndarray:
+    corners = boards[:, [0, 0, -1, -1], [0, -1, 0, -1]]
+    return np.count_nonzero(corners == player, axis=1)
+
+
+def game_progress(boards: np.ndarray) -> np.ndarray:
+    n = boards.shape[1]
+    total_tiles = n * n - np.count_nonzero(boards == 3, axis=(1, 2))
+    filled_tiles = np.count_nonzero((boards == 1) | (boards == 2), axis=(1, 2))
+    return np.where(total_tiles > 0, filled_tiles / np.maximum(total_tiles, 1), 0)
+
+
+def student_scores(boards: np.ndarray, player: int, opponent: int, params=None) -> np.ndarray:
+    """
+    StudentAgent's heuristic on every board: disc difference, mobility difference and central control,
+    weighted by game progress, with the same terminal-like special cases. See StudentAgent.evaluate.
+    params overrides the weights of STUDENT_EVAL_PARAMS.
+    """
+    params = STUDENT_EVAL_PARAMS if params is None else params
+    player_discs = count_discs(boards, player)
+    opponent_discs = count_discs(boards, opponent)
+    player_moves = mobility(boards, player)
+    opponent_moves = mobility(boards, opponent)
+
+    discs_diff = player_discs - opponent_discs
+    move_diff = player_moves - opponent_moves
+    early = (
+        params["early_disc_weight"] * discs_diff
+        + params["early_center_weight"] * central_control(boards, player, opponent)
+        + params["early_mobility_weight"] * move_diff
+    )
+    late = params["late_disc_weight"] * discs_diff + params["late_mobility_weight"] * move_diff
+    scores = np.where(game_progress(boards) <= params["phase_switch"], early, late)
+
+    # Special cases, in reverse order of precedence
+    scores = np.where((player_moves == 0) & (opponent_moves > 0), -500, scores)
+    scores = np.where((opponent_moves == 0) & (player_moves > 0), 500, scores)
+    scores = np.where(opponent_discs == 0, 1000, scores)
+    scores = np.where(player_discs == 0, -1000, scores)
+    return scores
+
+
+def greedy_scores(boards: np.ndarray, color: int, opponent: int) -> np.ndarray:
+    """
+    greedy_corners_agent's heuristic on every board: disc difference + 5 per owned corner - opponent mobility.
+    """
+    score_diff = count_discs(boards, color) - count_discs(boards, opponent)
+    return score_diff + 5 * corner_count(boards, color) - mobility(boards, opponent)
+
+
+class EvalCache:
+    """
+    Bounded LRU cache of evaluation scores keyed by position and player.
+
+    Keys are ints built from the GameState.hash of the position (which includes the side to move) and the player
+    scored, so they cost the same whatever the board size. The number of entries is max_bytes // ENTRY_BYTES,
+    ENTRY_BYTES being the measured size of an entry (int key, float score and OrderedDict overhead).
+    hits and misses are counted for instrumentation.
+    """
+    ENTRY_BYTES = 170
+
+    def __init__(self, max_bytes=32 * 2**20):
+        self.max_bytes = max_bytes
+        self.capacity = max(1, max_bytes // self.ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(position_hash: int, player: int) -> int:
+        """
+        Key of the score for player of the position of GameState.hash position_hash.
+        """
+        return (position_hash << 2) | player
+
+    def get(self, key):
+        """
+        Cached score of key, or None (a miss).
+        """
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
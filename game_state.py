@@ -0,0 +1,265 @@
+import numpy as np
+
+import kernels
+from bitboard import BitBoard
+from constants import MAX_BOARD_SIZE
+from helpers import MOVE_FIELD_BITS, MOVE_FIELD_MASK, PASS_MOVE_CODE, decode_move_fields, get_directions
+
+"""
+Game_state.py wraps a board with everything World and the agents otherwise re-derive from the raw array.
+
+A GameState keeps, up to date after every apply() / undo():
+    discs           - number of discs of each player (discs[1], discs[2])
+    empty           - number of empty squares
+    to_move         - the player to move (1 or 2)
+    move_number     - number of moves played, passes included
+    passed          - whether the last move was a pass
+    hash            - 64-bit Zobrist hash of the position (board and side to move)
+so that terminal checks, scores and repetition lookups are O(1) instead of full-board scans.
+Boards larger than MAX_BOARD_SIZE also keep a BitBoard (bits) up to date, so move generation and the
+"can this player move" test only look at the frontier (see bitboard.py) instead of the n*n cells.
+
+Moves are the packed ints of helpers.encode_move (PASS_MOVE_CODE for a pass) and must be valid: apply() does not
+check them. The board array is changed in place (with kernels.apply_move) and shared with the caller.
+
+Classes:
+    GameState               - board plus incrementally maintained counts, side to move and hash
+
+Functions:
+    zobrist_table           - random 64-bit keys of every (cell, value) of a board size, fixed per size
+    zobrist_array           - the same keys as an array
+"""
+
+_zobrist_tables = {}
+_zobrist_arrays = {}
+
+
+def zobrist_table(board_size: int):
+    """
+    Zobrist keys for a board size: keys[cell][value] for value 0 (empty) to 3 (obstacle), and the key xored in
+    when player 2 is to move. Seeded with the board size, so hashes are the same in every process.
+
+    Returns
+    -------
+    keys : list of list of int
+    side_key : int
+    """
+    if board_size not in _zobrist_tables:
+        rng = np.random.default_rng(board_size)
+        keys = rng.integers(0, 2**63, size=(board_size * board_size + 1, 4), dtype=np.int64)
+        # Python ints: xoring them is faster than NumPy scalars
+        _zobrist_tables[board_size] = (keys[:-1].tolist(), int(keys[-1, 0]))
+    return _zobrist_tables[board_size]
+
+
+def zobrist_array(board_size: int) -> np.ndarray:
+    """
+    The keys of zobrist_table as an int64 array of shape (board_size * board_size, 4), for vectorized hashing.
+    """
+    if board_size not in _zobrist_arrays:
+        _zobrist_arrays[board_size] = np.array(zobrist_table(board_size)[0], dtype=np.int64)
+    return _zobrist_arrays[board_size]
+
+
+class GameState:
+    """
+    A board with incrementally maintained disc counts, empty count, side to move, move number, pass flag and hash.
+
+    Parameters
+    ----------
+    chess_board : np.ndarray
+        The board, modified in place by apply() and undo()
+    to_move : int
+        The player to move (1 or 2)
+    move_number : int
+        Number of moves already played
+    """
+    def __init__(self, chess_board, to_move=1, move_number=0):
+        self.board = chess_board
+        self.size = chess_board.shape[0]
+        self.discs = [0, int(np.count_nonzero(chess_board == 1)), int(np.count_nonzero(chess_board == 2))]
+        self.empty = int(np.count_nonzero(chess_board == 0))
+        self.to_move = to_move
+        self.move_number = move_number
+        self.passed = False
+        self.keys, self.side_key = zobrist_table(self.size)
+        self.hash = self.compute_hash()
+        self.bits = BitBoard.from_array(chess_board) if self.size > MAX_BOARD_SIZE else None
+
+    def compute_hash(self) -> int:
+        """
+        Zobrist hash of the position from scratch (apply and undo maintain it incrementally).
+        """
+        value = 0
+        for cell, occupant in enumerate(self.board.ravel().tolist()):
+            value ^= self.keys[cell][occupant]
+        if self.to_move == 2:
+            value ^= self.side_key
+        return value
+
+    def copy(self, chess_board=None):
+        """
+        Independent copy, on a copy of the board unless one is given.
+        """
+        state = GameState.__new__(GameState)
+        state.__dict__.update(self.__dict__)
+        state.board = self.board.copy() if chess_board is None else chess_board
+        state.discs = list(self.discs)
+        if self.bits is not None:
+            state.bits = self.bits.copy()
+        return state
+
+    def move_codes(self, player=None):
+        """
+        Valid moves of player (default: the player to move) as move codes, as helpers.get_valid_move_codes.
+        """
+        player = self.to_move if player is None else player
+        if self.bits is not None:
+            return self.bits.move_codes(player)
+        return kernels.get_valid_move_codes(self.board, player)
+
+    def has_move(self, player=None) -> bool:
+        """
+        Whether player (default: the player to move) has a valid move.
+        """
+        player = self.to_move if player is None else player
+        if self.bits is not None:
+            return self.bits.has_move(player)
+        return kernels.mobility(self.board, player) > 0
+
+    def mobility(self, player=None) -> int:
+        """
+        Number of valid moves of player (default: the player to move).
+        """
+        player = self.to_move if player is None else player
+        if self.bits is not None:
+            return self.bits.mobility(player)
+        return kernels.mobility(self.board, player)
+
+    def child_hashes(self, codes) -> np.ndarray:
+        """
+        Hashes of the positions after each valid move code of the player to move, as apply() would leave
+        self.hash, computed at once without playing the moves.
+
+        Returns
+        -------
+        np.ndarray of int64, shape (len(codes),)
+        """
+        player = self.to_move
+        opponent = 3 - player
+        n = self.size
+        keys = zobrist_array(n)
+        cells = self.board.ravel()
+        r_src, c_src, r_dest, c_dest = decode_move_fields(codes)
+        dest = r_dest * n + c_dest
+        hashes = np.full(len(dest), self.hash ^ self.side_key, dtype=np.int64)
+        hashes ^= keys[dest, 0] ^ keys[dest, player]
+        for dr, dc in get_directions():
+            r, c = r_dest + dr, c_dest + dc
+            on_board = (r >= 0) & (r < n) & (c >= 0) & (c < n)
+            cell = np.where(on_board, r * n + c, 0)
+            flipped = on_board & (cells[cell] == opponent)
+            hashes ^= np.where(flipped, keys[cell, opponent] ^ keys[cell, player], 0)
+        # Jumps vacate their source
+        jump = (np.abs(r_dest - r_src) == 2) | (np.abs(c_dest - c_src) == 2)
+        src = r_src * n + c_src
+        hashes ^= np.where(jump, keys[src, player] ^ keys[src, 0], 0)
+        return hashes
+
+    def apply(self, code):
+        """
+        Play a valid move code (or PASS_MOVE_CODE) for the player to move.
+
+        Returns
+        -------
+        undo : tuple
+            What undo() needs to restore the state
+        """
+        player = self.to_move
+        opponent = 3 - player
+        undo = (code, None, self.passed, self.hash)
+        code = int(code)
+
+        if code == PASS_MOVE_CODE:
+            self.passed = True
+        else:
+            keys = self.keys
+            n = self.size
+            dest = ((code >> MOVE_FIELD_BITS) & MOVE_FIELD_MASK) * n + (code & MOVE_FIELD_MASK)
+            r_src = (code >> (3 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+            c_src = (code >> (2 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+            jump = abs(dest // n - r_src) == 2 or abs(dest % n - c_src) == 2
+
+            flipped = kernels.apply_move(self.board, code, player)
+            value = self.hash ^ keys[dest][0] ^ keys[dest][player]
+            for cell in flipped.tolist():
+                value ^= keys[cell][opponent] ^ keys[cell][player]
+            if jump:
+                src = r_src * n + c_src
+                value ^= keys[src][player] ^ keys[src][0]
+            if self.bits is not None:
+                self.bits.set_cell(dest, 0, player)
+                for cell in flipped.tolist():
+                    self.bits.set_cell(cell, opponent, player)
+                if jump:
+                    self.bits.set_cell(src, player, 0)
+            if not jump:
+                self.empty -= 1
+                self.discs[player] += 1
+            self.discs[player] += len(flipped)
+            self.discs[opponent] -= len(flipped)
+            self.hash = value
+            self.passed = False
+            undo = (code, flipped, undo[2], undo[3])
+
+        self.hash ^= self.side_key
+        self.to_move = opponent
+        self.move_number += 1
+        return undo
+
+    def undo(self, undo):
+        """
+        Take back the move that returned `undo` (moves must be undone in reverse order).
+        """
+        code, flipped, passed, previous_hash = undo
+        self.to_move = player = 3 - self.to_move
+        self.move_number -= 1
+        self.passed = passed
+        self.hash = previous_hash
+        if flipped is None:
+            return
+
+        kernels.undo_move(self.board, code, player, flipped)
+        n = self.size
+        r_dest, c_dest = (code >> MOVE_FIELD_BITS) & MOVE_FIELD_MASK, code & MOVE_FIELD_MASK
+        r_src = (code >> (3 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+        c_src = (code >> (2 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+        jump = abs(r_dest - r_src) == 2 or abs(c_dest - c_src) == 2
+        if self.bits is not None:
+            self.bits.set_cell(r_dest * n + c_dest, player, 0)
+            for cell in flipped.tolist():
+                self.bits.set_cell(cell, player, 3 - player)
+            if jump:
+                self.bits.set_cell(r_src * n + c_src, 0, player)
+        if not jump:
+            self.empty += 1
+            self.discs[player] -= 1
+        self.discs[player] -= len(flipped)
+        self.discs[3 - player] += len(flipped)
+
+    def check_endgame(self):
+        """
+        Same result as helpers.check_endgame(self.board), in O(1).
+
+        Returns
+        -------
+        is_endgame : bool
+        player_1_score : int
+        player_2_score : int
+        """
+        p0_score, p1_score = self.discs[1], self.discs[2]
+        if p0_score == 0:
+            return True, 0, self.size * self.size
+        if p1_score == 0:
+            return True, self.size * self.size, 0
+        return self.empty == 0, p0_score, p1_score
@@ -1,5 +1,8 @@
 
 import numpy as np
+from time import perf_counter
+from telemetry import TELEMETRY
+from constants import MAX_BOARD_SIZE
 
 """
 Helpers.py is a collection of functions that primarily make up the Ataxx game logic.
@@ -17,7 +20,14 @@ Functions:
     execute_move            - update the chess_board by simulating a move
     check_endgame           - check for termination, who's won but also helpful to score non-terminated games
     get_valid_moves         - use this to get the children in your tree
+    get_valid_move_codes    - the same moves as an array of encode_move ints, without allocating a MoveCoordinates per move
+    array_move_codes        - get_valid_move_codes with array operations over the whole board
+    array_mobility          - number of valid moves with array operations, without building them
     random_move             - basis of the random agent and can be used to simulate play
+    encode_move             - pack a MoveCoordinates (or a pass) into a single int
+    decode_move             - unpack an int from encode_move back into MoveCoordinates (None for a pass)
+    decode_move_fields      - unpack an array of move codes into (row_src, col_src, row_dest, col_dest) arrays
+    position_key            - hashable key of a position (board and side to move), e.g. to detect repetitions
 
     For all, the chess_board is an np array of integers, size nxn and integer values indicating square occupancies.
     The current player is (1: Blue, 2: Brown), 0's in the board mean empty squares. 3's in the board mean obstacles.
@@ -30,6 +40,8 @@ class MoveCoordinates:
     """
     MoveCoordinates is a simple helper to store (row, column) tuples for both the source and the destination of a move.
     """
+    __slots__ = ("row_src", "col_src", "row_dest", "col_dest")
+
     def __init__(self, src: tuple[int,int], dest: tuple[int, int]):
         self.row_src = src[0]
         self.col_src = src[1]
@@ -49,6 +61,20 @@ class MoveCoordinates:
         return (self.row_dest, self.col_dest)
 
 
+# Moves are packed as four 6-bit fields (row_src, col_src, row_dest, col_dest), which covers boards up to 64x64.
+# 0 would be a move from (0,0) onto itself, which is never valid, so it encodes a pass.
+MOVE_FIELD_BITS = 6
+MOVE_FIELD_MASK = (1 << MOVE_FIELD_BITS) - 1
+PASS_MOVE_CODE = 0
+MOVE_CODE_DTYPE = np.uint32
+# The 24 move offsets in the order get_valid_moves tries them
+MOVE_OFFSETS = np.array(
+    [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1),
+     (-2, 0), (2, 0), (0, -2), (0, 2), (-2, 1), (2, 1), (1, -2), (1, 2),
+     (-2, -1), (2, -1), (-1, -2), (-1, 2), (-2, -2), (-2, 2), (2, -2), (2, 2)]
+)
+
+
 
 def get_directions() -> list[tuple]:
     """
@@ -126,6 +152,9 @@ def count_disc_count_change(chess_board, move_coords: MoveCoordinates, player: i
     """
     opponent_map = {1: 2, 2: 1} # This lets us quickly access the value corresponding to the opponent on the board based on current player number
 
+    if TELEMETRY.enabled:
+        TELEMETRY.count("count_disc_count_change")
+
     r_dest, c_dest = move_coords.get_dest()
 
     if not check_move_validity(chess_board, move_coords, player):
@@ -160,6 +189,9 @@ def execute_move(chess_board, move_coords: MoveCoordinates, player: int):
     """
     opponent_map = {1: 2, 2: 1} # This lets us quickly access the value corresponding to the opponent on the board based on current player number
 
+    if TELEMETRY.enabled:
+        TELEMETRY.count("execute_move")
+
     if not check_move_validity(chess_board, move_coords, player): # Throw an exception instead of executing an invalid move. This exception should be handled in the simulator logic
         raise Exception(f"Executing an invalid move! Player {player} is moving from ({move_coords.row_src},{move_coords.col_src}) to ({move_coords.row_dest},{move_coords.col_dest})")
 
@@ -200,6 +232,9 @@ def check_endgame(chess_board):
         The score of player 2.
     """
 
+    if TELEMETRY.enabled:
+        TELEMETRY.count("check_endgame")
+
     is_endgame = False
 
     if np.sum(chess_board == 0) == 0:
@@ -229,42 +264,153 @@ def get_valid_moves(chess_board,player:int) -> list[MoveCoordinates]:
 
     """
 
-    board_size = chess_board.shape[0]
-    valid_moves = []
-    for r in range(board_size):
-        for c in range(board_size):
-            # Check square has a player's disc
-            if chess_board[r, c] == player:
-                src = (r,c)
-                # loop over all possible moves
-                candidate_move_list = get_directions()
-                candidate_move_list.extend(get_two_tile_directions())
+    if TELEMETRY.enabled:
+        start = perf_counter()
 
-                for dir in candidate_move_list:
-                    dest_tile = (r + dir[0], c + dir[1])
-                    valid_move = MoveCoordinates(src=(r,c), dest=dest_tile)
-                    if check_move_validity(chess_board, valid_move, player):
-                        valid_moves.append(valid_move)
+    # Only the valid moves are materialized, see get_valid_move_codes
+    valid_moves = [decode_move(code) for code in get_valid_move_codes(chess_board, player).tolist()]
+
+    if TELEMETRY.enabled:
+        TELEMETRY.count("get_valid_moves")
+        TELEMETRY.add_time("get_valid_moves", perf_counter() - start)
 
     return valid_moves
 
+def get_valid_move_codes(chess_board, player: int) -> np.ndarray:
+    """
+    All valid moves of player as encode_move codes, in the same order as get_valid_moves
+    (source cells row by row, then the 24 offsets of get_directions + get_two_tile_directions).
+
+    No Python object is created per candidate. Boards up to MAX_BOARD_SIZE are scanned with array operations
+    (array_move_codes). Larger boards are packed into a bitboard (see bitboard.py) and the moves enumerated
+    from its frontier: the packing still reads all n * n cells on every call. A search that plays moves on a
+    GameState should use GameState.move_codes instead, which keeps the bitboard up to date move by move.
+    Use decode_move to turn a code back into MoveCoordinates (at the Agent.step boundary),
+    or decode_move_fields to work on the whole array.
+
+    Returns
+    -------
+    codes : np.ndarray of MOVE_CODE_DTYPE, shape (num_moves,)
+    """
+    if TELEMETRY.enabled:
+        TELEMETRY.count("get_valid_move_codes")
+
+    if chess_board.shape[0] > MAX_BOARD_SIZE:
+        # Imported here: bitboard.py builds on this module
+        from bitboard import BitBoard
+        return BitBoard.from_array(chess_board).move_codes(player)
+    return array_move_codes(chess_board, player)
+
+def array_move_codes(chess_board, player: int) -> np.ndarray:
+    """
+    get_valid_move_codes with array operations: every (cell, offset) candidate is tested at once.
+    """
+    n = chess_board.shape[0]
+    # Pad with a non-empty value so that off-board destinations are never empty
+    padded = np.pad(chess_board == 0, 2, constant_values=False)
+    own = chess_board == player
+    # valid[r, c, k]: moving from (r, c) by MOVE_OFFSETS[k] lands on an empty cell
+    valid = np.empty((n, n, len(MOVE_OFFSETS)), dtype=bool)
+    for k, (dr, dc) in enumerate(MOVE_OFFSETS):
+        valid[:, :, k] = padded[2 + dr:2 + dr + n, 2 + dc:2 + dc + n]
+    valid &= own[:, :, None]
+
+    rows, cols, offsets = np.nonzero(valid)
+    codes = rows.astype(MOVE_CODE_DTYPE)
+    codes = (codes << MOVE_FIELD_BITS) | cols
+    codes = (codes << MOVE_FIELD_BITS) | (rows + MOVE_OFFSETS[offsets, 0])
+    codes = (codes << MOVE_FIELD_BITS) | (cols + MOVE_OFFSETS[offsets, 1])
+    return codes.astype(MOVE_CODE_DTYPE)
+
+def array_mobility(chess_board, player: int) -> int:
+    """
+    Number of valid moves of player, len(get_valid_move_codes(chess_board, player)), with array operations.
+
+    The 24 move offsets are the 5x5 window around a cell without its center, so every empty cell is the
+    destination of as many moves as there are discs of player in its window: window sums of an integral image.
+    """
+    n = chess_board.shape[0]
+    # Integral image of the player's discs, with a zero row and column before the board and two of padding around it
+    window = np.zeros((n + 5, n + 5), dtype=np.int32)
+    window[3:n + 3, 3:n + 3] = chess_board == player
+    window = window.cumsum(axis=0).cumsum(axis=1)
+    counts = window[5:, 5:] - window[:-5, 5:] - window[5:, :-5] + window[:-5, :-5]
+    return int(counts[chess_board == 0].sum())
+
 def random_move(chess_board, player: int) -> MoveCoordinates:
     """
     random move from the list of valid moves.
+    For many random moves (playouts), see rollout.py.
 
     Returns
 
     ------
     MoveCoordinates
-
+        None if player has no valid move
 
     """
 
-    valid_moves = get_valid_moves(chess_board, player)
+    valid_moves = get_valid_move_codes(chess_board, player)
 
     if len(valid_moves) == 0:
-        # If no valid moves are available, return None
-        print(f"No valid moves left for player {player}.")
         return None
-    
-    return valid_moves[np.random.randint(len(valid_moves))]
+
+    # Only the chosen move is decoded
+    return decode_move(valid_moves[np.random.randint(len(valid_moves))])
+
+def encode_move(move_coords: MoveCoordinates) -> int:
+    """
+    Pack a move into a single int. None (a pass) is encoded as PASS_MOVE_CODE.
+
+    Returns
+    -------
+    int
+        (row_src, col_src, row_dest, col_dest) as 6-bit fields, row_src in the highest bits.
+    """
+    if move_coords is None:
+        return PASS_MOVE_CODE
+    code = move_coords.row_src
+    code = (code << MOVE_FIELD_BITS) | move_coords.col_src
+    code = (code << MOVE_FIELD_BITS) | move_coords.row_dest
+    code = (code << MOVE_FIELD_BITS) | move_coords.col_dest
+    return code
+
+def decode_move(code: int) -> MoveCoordinates:
+    """
+    Unpack a move encoded by encode_move.
+
+    Returns
+    -------
+    MoveCoordinates
+        The move, or None if code is a pass.
+    """
+    code = int(code)
+    if code == PASS_MOVE_CODE:
+        return None
+    col_dest = code & MOVE_FIELD_MASK
+    row_dest = (code >> MOVE_FIELD_BITS) & MOVE_FIELD_MASK
+    col_src = (code >> (2 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+    row_src = (code >> (3 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+    return MoveCoordinates((row_src, col_src), (row_dest, col_dest))
+
+def decode_move_fields(codes: np.ndarray):
+    """
+    Unpack an array of move codes (no passes) without creating MoveCoordinates.
+
+    Returns
+    -------
+    row_src, col_src, row_dest, col_dest : np.ndarray of int
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    col_dest = codes & MOVE_FIELD_MASK
+    row_dest = (codes >> MOVE_FIELD_BITS) & MOVE_FIELD_MASK
+    col_src = (codes >> (2 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+    row_src = (codes >> (3 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+    return row_src, col_src, row_dest, col_dest
+
+def position_key(chess_board, player: int) -> bytes:
+    """
+    Hashable key of the position: the board packed as int8 bytes followed by the player to move.
+    Two keys are equal only for identical positions.
+    """
+    return chess_board.astype(np.int8).tobytes() + bytes((player,))
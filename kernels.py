@@ -0,0 +1,262 @@
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from helpers import (
+    MOVE_CODE_DTYPE,
+    MOVE_FIELD_BITS,
+    MOVE_FIELD_MASK,
+    MOVE_OFFSETS,
+    array_mobility,
+    check_move_validity,
+    decode_move,
+    execute_move,
+    get_valid_move_codes as numpy_valid_move_codes,
+    get_valid_moves,
+)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Without Numba the kernels below run as plain Python
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+"""
+Kernels.py is an optional accelerated layer for the inner loops of the rules engine.
+
+The kernels are plain integer loops over the board, compiled with Numba when it is installed (requirements.txt).
+Without Numba, get_valid_move_codes and mobility fall back to the array implementations of helpers.py
+(get_valid_move_codes, array_mobility). apply_move and undo_move only touch the 3x3 block around the destination,
+so they run their kernels as plain Python: about as fast as a board copy plus helpers.execute_move. Results are
+identical either way; only the speed changes. Compilation is cached on disk, and warm_up() compiles everything up
+front. Agents call it from __init__, so the JIT never runs inside a timed turn.
+
+Moves are the packed ints of helpers.encode_move. apply_move changes the board in place and returns what undo_move
+needs to restore it, so a search can walk the tree on a single board instead of copying it at every node.
+
+    python kernels.py                 # cross-check against helpers.py on random boards, then benchmark
+
+Functions:
+    get_valid_move_codes    - valid moves as move codes, same order as helpers.get_valid_moves
+    mobility                - number of valid moves, len(get_valid_moves) without building them
+    apply_move              - play a move code in place, returns the undo information
+    undo_move               - revert apply_move
+    warm_up                 - compile (or load from cache) every kernel before the first timed turn
+"""
+
+_OFFSETS = MOVE_OFFSETS.astype(np.int64)
+# Most cells a move can flip: the 8 neighbours of the destination
+MAX_FLIPS = 8
+_code_buffers = {}
+
+
+@njit(cache=True)
+def _move_codes(board, player, offsets, out):
+    n = board.shape[0]
+    count = 0
+    for r in range(n):
+        for c in range(n):
+            if board[r, c] != player:
+                continue
+            for k in range(offsets.shape[0]):
+                r_dest = r + offsets[k, 0]
+                c_dest = c + offsets[k, 1]
+                if 0 <= r_dest < n and 0 <= c_dest < n and board[r_dest, c_dest] == 0:
+                    code = (r << MOVE_FIELD_BITS) | c
+                    code = (code << MOVE_FIELD_BITS) | r_dest
+                    out[count] = (code << MOVE_FIELD_BITS) | c_dest
+                    count += 1
+    return count
+
+
+@njit(cache=True)
+def _mobility(board, player, offsets):
+    n = board.shape[0]
+    count = 0
+    for r in range(n):
+        for c in range(n):
+            if board[r, c] != player:
+                continue
+            for k in range(offsets.shape[0]):
+                r_dest = r + offsets[k, 0]
+                c_dest = c + offsets[k, 1]
+                if 0 <= r_dest < n and 0 <= c_dest < n and board[r_dest, c_dest] == 0:
+                    count += 1
+    return count
+
+
+@njit(cache=True)
+def _apply_move(board, code, player, flipped):
+    n = board.shape[0]
+    opponent = 3 - player
+    c_dest = code & MOVE_FIELD_MASK
+    r_dest = (code >> MOVE_FIELD_BITS) & MOVE_FIELD_MASK
+    c_src = (code >> (2 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+    r_src = (code >> (3 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+
+    board[r_dest, c_dest] = player
+    count = 0
+    for r in range(max(r_dest - 1, 0), min(r_dest + 2, n)):
+        for c in range(max(c_dest - 1, 0), min(c_dest + 2, n)):
+            if board[r, c] == opponent:
+                board[r, c] = player
+                flipped[count] = r * n + c
+                count += 1
+    if abs(r_dest - r_src) == 2 or abs(c_dest - c_src) == 2:
+        board[r_src, c_src] = 0
+    return count
+
+
+@njit(cache=True)
+def _undo_move(board, code, player, flipped):
+    n = board.shape[0]
+    opponent = 3 - player
+    c_dest = code & MOVE_FIELD_MASK
+    r_dest = (code >> MOVE_FIELD_BITS) & MOVE_FIELD_MASK
+    c_src = (code >> (2 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+    r_src = (code >> (3 * MOVE_FIELD_BITS)) & MOVE_FIELD_MASK
+
+    for i in range(flipped.shape[0]):
+        board[flipped[i] // n, flipped[i] % n] = opponent
+    board[r_dest, c_dest] = 0
+    if abs(r_dest - r_src) == 2 or abs(c_dest - c_src) == 2:
+        board[r_src, c_src] = player
+
+
+def get_valid_move_codes(chess_board, player: int) -> np.ndarray:
+    """
+    Same as helpers.get_valid_move_codes, with the Numba kernel when available.
+    """
+    if not NUMBA_AVAILABLE:
+        return numpy_valid_move_codes(chess_board, player)
+    size = chess_board.size * len(_OFFSETS)
+    if size not in _code_buffers:
+        _code_buffers[size] = np.empty(size, dtype=np.int64)
+    out = _code_buffers[size]
+    count = _move_codes(chess_board, player, _OFFSETS, out)
+    return out[:count].astype(MOVE_CODE_DTYPE)
+
+
+def mobility(chess_board, player: int) -> int:
+    """
+    Number of valid moves of player, len(helpers.get_valid_moves(chess_board, player)).
+    """
+    if not NUMBA_AVAILABLE:
+        return array_mobility(chess_board, player)
+    return int(_mobility(chess_board, player, _OFFSETS))
+
+
+def apply_move(chess_board, code, player: int) -> np.ndarray:
+    """
+    Play a valid move code in place, like helpers.execute_move (without the validity check).
+
+    Returns
+    -------
+    flipped : np.ndarray
+        Flat indices of the captured discs, to pass to undo_move.
+    """
+    flipped = np.empty(MAX_FLIPS, dtype=np.int64)
+    count = _apply_move(chess_board, int(code), player, flipped)
+    return flipped[:count]
+
+
+def undo_move(chess_board, code, player: int, flipped: np.ndarray):
+    """
+    Restore the board as it was before apply_move(chess_board, code, player) returned flipped.
+    """
+    _undo_move(chess_board, int(code), player, flipped)
+
+
+def warm_up():
+    """
+    Compile every kernel (or load it from the on-disk cache) for the board dtype World uses.
+    A no-op without Numba.
+    """
+    if not NUMBA_AVAILABLE:
+        return
+    board = np.zeros((6, 6), dtype=int)
+    board[0, 0], board[0, 1] = 1, 2
+    code = get_valid_move_codes(board, 1)[0]
+    mobility(board, 1)
+    undo_move(board, code, 1, apply_move(board, code, 1))
+
+
+def random_board(rng, board_size):
+    return rng.choice(4, size=(board_size, board_size), p=[0.4, 0.25, 0.25, 0.1])
+
+
+def cross_check(boards=300, seed=0):
+    """
+    Compare every kernel with the reference functions of helpers.py on random boards. Raises AssertionError on a mismatch.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(boards):
+        board = random_board(rng, int(rng.integers(6, 13)))
+        for player in (1, 2):
+            expected = [decode_move(code) for code in numpy_valid_move_codes(board, player)]
+            reference = get_valid_moves(board, player)
+            codes = get_valid_move_codes(board, player)
+            assert [(m.get_src(), m.get_dest()) for m in reference] == [(m.get_src(), m.get_dest()) for m in expected]
+            assert np.array_equal(codes, numpy_valid_move_codes(board, player))
+            assert mobility(board, player) == len(reference)
+
+            for code in codes[:: max(1, len(codes) // 8)]:
+                move_coords = decode_move(code)
+                assert check_move_validity(board, move_coords, player)
+                executed = board.copy()
+                execute_move(executed, move_coords, player)
+                applied = board.copy()
+                flipped = apply_move(applied, code, player)
+                assert np.array_equal(applied, executed)
+                undo_move(applied, code, player, flipped)
+                assert np.array_equal(applied, board)
+
+
+def benchmark(board_size=12, repeats=2000, seed=0):
+    """
+    Average time per call (microseconds) of the kernels and of the helpers.py functions they replace.
+    """
+    board = random_board(np.random.default_rng(seed), board_size)
+    code = get_valid_move_codes(board, 1)[0]
+    move_coords = decode_move(code)
+
+    def timed(function):
+        start = perf_counter()
+        for _ in range(repeats):
+            function()
+        return (perf_counter() - start) / repeats * 1e6
+
+    def apply_undo():
+        undo_move(board, code, 1, apply_move(board, code, 1))
+
+    return {
+        "helpers.get_valid_moves": timed(lambda: get_valid_moves(board, 1)),
+        "helpers.get_valid_move_codes": timed(lambda: numpy_valid_move_codes(board, 1)),
+        "kernels.get_valid_move_codes": timed(lambda: get_valid_move_codes(board, 1)),
+        "kernels.mobility": timed(lambda: mobility(board, 1)),
+        "copy + helpers.execute_move": timed(lambda: execute_move(board.copy(), move_coords, 1)),
+        "kernels.apply_move + undo_move": timed(apply_undo),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boards", type=int, default=300, help="Random boards to cross-check")
+    parser.add_argument("--board_size", type=int, default=12, help="Board size of the benchmark")
+    parser.add_argument("--repeats", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = perf_counter()
+    warm_up()
+    print(f"Numba available: {NUMBA_AVAILABLE}, warm-up took {perf_counter() - start:.3f}s")
+    cross_check(args.boards)
+    print(f"Cross-check passed on {args.boards} random boards")
+    for name, micros in benchmark(args.board_size, args.repeats).items():
+        print(f"{name:32s} {micros:9.1f} us")
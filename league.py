@@ -0,0 +1,305 @@
+import itertools
+import logging
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from results import ResultsStore, agent_scores
+from store import AGENT_REGISTRY
+from utils import all_logging_disabled
+from world import World
+from constants import AGENT_NOT_FOUND_MSG
+
+"""
+League.py plays a round-robin league between registered agents over a pool of worker processes.
+
+Every pairing plays every board with both color assignments, for up to `rounds` rounds. After each game
+the pairing is checked with a sequential probability ratio test (SPRT): once one agent is clearly
+stronger, the pairing stops scheduling games. At the end, Bradley-Terry ratings are fit on the Elo scale
+with bootstrap confidence intervals.
+
+Functions:
+    play_game               - play one game from a task, runs inside a worker process
+    sprt_llr                - log-likelihood ratio of "a is E Elo stronger" vs "b is E Elo stronger"
+    bradley_terry           - maximum likelihood ratings (Elo scale) from game records
+    rating_intervals        - bootstrap confidence intervals of the ratings
+    run_league              - schedule, play and rate a league
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def play_game(task: dict) -> dict:
+    """
+    Play a single game described by task (player_1, player_2, board, seed, ...) and return its results record,
+    in the same format as the autoplay results store. If task["record"] is set, the record also holds the
+    game's moves as a records.py line under "game_record". task["player_1_params"] and task["player_2_params"]
+    optionally override the agents' params (see StudentAgent.DEFAULT_PARAMS).
+    """
+    np.random.seed(task["seed"])
+    random.seed(task["seed"])
+    with all_logging_disabled():
+        world = World(
+            player_1=task["player_1"],
+            player_2=task["player_2"],
+            board_fpath=task["board"],
+            autoplay=True,
+            log_events=False,
+        )
+        # Parameter overrides, e.g. from tuner.py, for agents that expose a params dict
+        if task.get("player_1_params"):
+            world.p0.params.update(task["player_1_params"])
+        if task.get("player_2_params"):
+            world.p1.params.update(task["player_2_params"])
+        is_end, p0_score, p1_score = world.step()
+        while not is_end:
+            is_end, p0_score, p1_score = world.step()
+
+    record = dict(task)
+    record.update(
+        {
+            "p0_score": int(p0_score),
+            "p1_score": int(p1_score),
+            "moves": world.move_count,
+            "end_reason": world.end_reason,
+            "p0_times": world.p0_time,
+            "p1_times": world.p1_time,
+        }
+    )
+    if task.get("record"):
+        # Packed moves of the game (records.py format), e.g. to extract training positions
+        record["game_record"] = world.game_record().to_line()
+    return record
+
+
+def elo_to_score(elo: float) -> float:
+    """
+    Expected score of a player rated `elo` points above its opponent.
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_llr(scores: list[float], elo: float) -> float:
+    """
+    Log-likelihood ratio of H1: "a is `elo` points stronger" against H0: "b is `elo` points stronger",
+    from the scores of a (1 win, 0.5 tie, 0 loss). Uses the normal approximation of the game score.
+    """
+    if len(scores) < 2:
+        return 0.0
+    # One virtual win and one virtual loss keep the variance positive when every game had the same result
+    scores = list(scores) + [0.0, 1.0]
+    n = len(scores)
+    mean = np.mean(scores)
+    var = np.var(scores)
+    s0, s1 = elo_to_score(-elo), elo_to_score(elo)
+    return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * var)
+
+
+def sprt_bounds(alpha: float, beta: float) -> tuple[float, float]:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def bradley_terry(records: list[dict], agents: list[str], iterations=200) -> dict:
+    """
+    Fit Bradley-Terry strengths with the minorization-maximization algorithm and return them on the Elo
+    scale, centered on 0. Ties count as half a win for each side.
+    """
+    index = {agent: i for i, agent in enumerate(agents)}
+    k = len(agents)
+    wins = np.zeros(k)
+    games = np.zeros((k, k))
+    for record in records:
+        scores = agent_scores(record)
+        if len(scores) < 2:
+            continue
+        a, b = index[record["player_1"]], index[record["player_2"]]
+        wins[a] += scores[record["player_1"]]
+        wins[b] += scores[record["player_2"]]
+        games[a, b] += 1
+        games[b, a] += 1
+
+    # Add one virtual tie against every opponent so that undefeated (or winless) agents stay finite
+    wins = wins + 0.5 * (games.sum(axis=1) > 0) * (k - 1)
+    games = games + (1 - np.eye(k))
+
+    strength = np.ones(k)
+    for _ in range(iterations):
+        denominator = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        strength = wins / denominator
+        strength /= np.exp(np.mean(np.log(strength)))
+
+    elo = 400 * np.log10(strength)
+    return {agent: float(elo[index[agent]]) for agent in agents}
+
+
+def rating_intervals(records: list[dict], agents: list[str], confidence=0.95, samples=200, seed=0) -> dict:
+    """
+    Bootstrap confidence interval of every agent's rating: map agent -> (low, high).
+    """
+    rng = np.random.default_rng(seed)
+    bootstrap = {agent: [] for agent in agents}
+    for _ in range(samples):
+        resample = [records[i] for i in rng.integers(len(records), size=len(records))]
+        for agent, elo in bradley_terry(resample, agents).items():
+            bootstrap[agent].append(elo)
+    tail = 100 * (1 - confidence) / 2
+    return {
+        agent: (float(np.percentile(elos, tail)), float(np.percentile(elos, 100 - tail)))
+        for agent, elos in bootstrap.items()
+    }
+
+
+def schedule(agents: list[str], boards: list[str], rounds: int, base_seed: int):
+    """
+    All tasks of a league, grouped per pairing: map (a, b) -> list of tasks.
+    Each pairing plays every board with both color assignments, `rounds` times.
+    """
+    tasks = {}
+    game = 0
+    for a, b in itertools.combinations(agents, 2):
+        pairing_tasks = []
+        for round_number in range(rounds):
+            for board in boards:
+                for player_1, player_2 in ((a, b), (b, a)):
+                    pairing_tasks.append(
+                        {
+                            "game": game,
+                            "pairing": f"{a}|{b}",
+                            "round": round_number,
+                            "player_1": player_1,
+                            "player_2": player_2,
+                            "board": board,
+                            "seed": base_seed + game,
+                        }
+                    )
+                    game += 1
+        tasks[(a, b)] = pairing_tasks
+    return tasks
+
+
+def run_league(
+    agents,
+    boards,
+    rounds=10,
+    workers=None,
+    base_seed=0,
+    sprt_elo=50.0,
+    sprt_alpha=0.05,
+    sprt_beta=0.05,
+    results_path=None,
+    resume=False,
+    agent_params=None,
+):
+    """
+    Play a league between agents and log the ratings table.
+
+    Parameters
+    ----------
+    agents : list of str
+        Names of registered agents
+    boards : list of str
+        Board files every pairing plays on
+    rounds : int
+        Maximum number of times a pairing plays every board with both colors
+    workers : int
+        Number of worker processes (default: one per CPU)
+    base_seed : int
+        Game i of the league is played with seed base_seed + i
+    sprt_elo : float
+        A pairing stops once SPRT decides one agent is sprt_elo points stronger than the other
+    sprt_alpha, sprt_beta : float
+        SPRT error rates
+    results_path : str
+        Optional results store where every game is appended
+    resume : bool
+        Skip the games of this league already in results_path
+    agent_params : dict
+        Optional map agent -> params overrides of all its games, e.g.
+        {"student_agent": StudentAgent.load_params("tuning/spsa_params.json")}
+
+    Returns
+    -------
+    ratings : dict
+        Map agent -> (elo, (low, high))
+    """
+    for agent in agents:
+        if agent not in AGENT_REGISTRY:
+            raise ValueError(f"Agent '{agent}' is not registered. {AGENT_NOT_FOUND_MSG}")
+    if len(agents) < 2:
+        raise ValueError("A league needs at least two agents.")
+
+    run_id = f"league_{'_'.join(agents)}_seed{base_seed}"
+    store = ResultsStore(results_path) if results_path else None
+    completed = store.completed_games(run_id) if store is not None and resume else {}
+
+    tasks = schedule(agents, boards, rounds, base_seed)
+    pending = {pairing: [t for t in pairing_tasks if t["game"] not in completed] for pairing, pairing_tasks in tasks.items()}
+    scores = {pairing: [] for pairing in tasks}
+    records = []
+    decided = {}
+    lower, upper = sprt_bounds(sprt_alpha, sprt_beta)
+
+    def add_result(record):
+        a, b = tuple(record["pairing"].split("|"))
+        records.append(record)
+        scores[(a, b)].append(agent_scores(record)[a])
+        llr = sprt_llr(scores[(a, b)], sprt_elo)
+        if (a, b) not in decided and (llr >= upper or llr <= lower):
+            decided[(a, b)] = a if llr >= upper else b
+            logger.info(f"SPRT: {decided[(a, b)]} is stronger in {a} vs {b} after {len(scores[(a, b)])} games")
+
+    for record in sorted(completed.values(), key=lambda r: r["game"]):
+        add_result(record)
+
+    pairings = list(pending)
+    cursor = 0
+
+    def next_task():
+        # Round-robin over undecided pairings, so every matchup progresses at the same pace
+        nonlocal cursor
+        for _ in range(len(pairings)):
+            pairing = pairings[cursor]
+            cursor = (cursor + 1) % len(pairings)
+            if pending[pairing] and pairing not in decided:
+                return pending[pairing].pop(0)
+        return None
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        # Keep a small queue per worker, so that games of decided pairings are not already scheduled
+        max_in_flight = 2 * workers
+        while True:
+            while len(in_flight) < max_in_flight:
+                task = next_task()
+                if task is None:
+                    break
+                task["run_id"] = run_id
+                for player in ("player_1", "player_2"):
+                    if agent_params and task[player] in agent_params:
+                        task[f"{player}_params"] = agent_params[task[player]]
+                in_flight.add(executor.submit(play_game, task))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                if store is not None:
+                    store.append(record)
+                add_result(record)
+
+    elo = bradley_terry(records, agents)
+    intervals = rating_intervals(records, agents)
+    ratings = {agent: (elo[agent], intervals[agent]) for agent in agents}
+
+    lines = [f"League finished after {len(records)} games. Ratings (Elo, 95% CI):"]
+    for agent, (rating, (low, high)) in sorted(ratings.items(), key=lambda x: -x[1][0]):
+        lines.append(f"  {agent:>24}: {rating:8.1f}  [{low:8.1f}, {high:8.1f}]")
+    for (a, b), pairing_scores in scores.items():
+        status = f"decided for {decided[(a, b)]}" if (a, b) in decided else "undecided"
+        lines.append(f"  {a} vs {b}: {a} scored {np.mean(pairing_scores) if pairing_scores else float('nan'):.3f} over {len(pairing_scores)} games, {status}")
+    logger.info("\n".join(lines))
+    return ratings
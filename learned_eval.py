@@ -0,0 +1,127 @@
+from pathlib import Path
+
+import numpy as np
+
+from evaluation import count_discs, mobility, central_control, center_weights, corner_count, game_progress
+
+"""
+Learned_eval.py is a small learned evaluation function with NumPy-only inference.
+
+Positions are described by a handful of board-size independent features (disc, mobility, center, corner and edge
+differences, game progress...), computed for a whole stack of boards at once with evaluation.py. A one hidden layer
+MLP maps them to the expected game result in [-1, 1] from the point of view of `player`. No GPU or deep learning
+library is needed, and the weights load from a small .npz file. Train a model with train_eval.py.
+
+Classes:
+    ValueModel              - the MLP: predict() for stacks of boards, save() / load() to .npz
+
+Functions:
+    board_features          - feature matrix (K, NUM_FEATURES) of a stack of boards
+"""
+
+DEFAULT_MODEL_PATH = Path(__file__).parent / "models" / "eval_model.npz"
+FEATURE_NAMES = [
+    "disc_diff",
+    "own_discs",
+    "opponent_discs",
+    "mobility_diff",
+    "center_diff",
+    "corner_diff",
+    "edge_diff",
+    "progress",
+    "progress_x_disc_diff",
+]
+NUM_FEATURES = len(FEATURE_NAMES)
+
+
+def edge_count(boards: np.ndarray, player: int) -> np.ndarray:
+    edges = np.zeros(boards.shape[1:], dtype=bool)
+    edges[[0, -1], :] = True
+    edges[:, [0, -1]] = True
+    return np.count_nonzero((boards == player) & edges, axis=(1, 2))
+
+
+def board_features(boards: np.ndarray, player: int) -> np.ndarray:
+    """
+    Features of every board from the point of view of player, normalized so that they do not depend on the board size.
+
+    Returns
+    -------
+    features : np.ndarray of shape (K, NUM_FEATURES)
+    """
+    opponent = 3 - player
+    n = boards.shape[1]
+    cells = n * n
+    own = count_discs(boards, player)
+    other = count_discs(boards, opponent)
+    own_moves = mobility(boards, player)
+    other_moves = mobility(boards, opponent)
+    progress = game_progress(boards)
+
+    disc_diff = (own - other) / cells
+    features = np.stack(
+        [
+            disc_diff,
+            own / cells,
+            other / cells,
+            (own_moves - other_moves) / (own_moves + other_moves + 1),
+            central_control(boards, player, opponent) / np.sum(center_weights(n)),
+            (corner_count(boards, player) - corner_count(boards, opponent)) / 4,
+            (edge_count(boards, player) - edge_count(boards, opponent)) / (4 * n - 4),
+            progress,
+            progress * disc_diff,
+        ],
+        axis=1,
+    )
+    return features.astype(np.float32)
+
+
+class ValueModel:
+    """
+    features -> tanh hidden layer -> tanh output, the expected result in [-1, 1] (1: player wins).
+    Features are standardized with the mean and std of the training set, stored with the weights.
+    """
+    def __init__(self, w1, b1, w2, b2, mean=None, std=None):
+        self.w1 = np.asarray(w1, dtype=np.float32)
+        self.b1 = np.asarray(b1, dtype=np.float32)
+        self.w2 = np.asarray(w2, dtype=np.float32)
+        self.b2 = np.asarray(b2, dtype=np.float32)
+        self.mean = np.zeros(self.w1.shape[0], dtype=np.float32) if mean is None else np.asarray(mean, dtype=np.float32)
+        self.std = np.ones(self.w1.shape[0], dtype=np.float32) if std is None else np.asarray(std, dtype=np.float32)
+
+    @classmethod
+    def random(cls, hidden=16, seed=0):
+        rng = np.random.default_rng(seed)
+        return cls(
+            rng.normal(0, 1 / np.sqrt(NUM_FEATURES), (NUM_FEATURES, hidden)),
+            np.zeros(hidden),
+            rng.normal(0, 1 / np.sqrt(hidden), (hidden,)),
+            np.zeros(()),
+        )
+
+    def forward(self, features: np.ndarray):
+        """
+        Returns (hidden activations, predictions) for a (K, NUM_FEATURES) feature matrix.
+        """
+        hidden = np.tanh(((features - self.mean) / self.std) @ self.w1 + self.b1)
+        return hidden, np.tanh(hidden @ self.w2 + self.b2)
+
+    def predict(self, boards: np.ndarray, player: int, to_move=None) -> np.ndarray:
+        """
+        Expected result of every board of a (K, n, n) stack for player, with to_move to move (default: player).
+        The model only learns positions from the side to move (see train_eval.label_positions), so the
+        boards are scored for to_move and the prediction negated if that is the other player.
+        """
+        to_move = player if to_move is None else to_move
+        prediction = self.forward(board_features(boards, to_move))[1]
+        return prediction if to_move == player else -prediction
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, w1=self.w1, b1=self.b1, w2=self.w2, b2=self.b2, mean=self.mean, std=self.std)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        with np.load(path) as data:
+            return cls(data["w1"], data["b1"], data["w2"], data["b2"], data["mean"], data["std"])
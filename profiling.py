@@ -0,0 +1,323 @@
+import cProfile
+import io
+import os
+import pstats
+import signal
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from utils import rss_mb
+
+"""
+Profiling.py runs autoplay games under a profiler and merges the results across games: every game runs in the
+same profiler's profiling() context, which accumulates its samples or statistics.
+
+Two profilers share the same interface (profiling() context manager, write(), summary()):
+    SamplingProfiler        - low-overhead statistical profiler driven by SIGPROF. Produces a
+                              flamegraph-compatible collapsed-stack file ("a;b;c <count>" per line).
+    CProfileProfiler        - deterministic cProfile, merged with pstats. Produces a .prof file that
+                              can be opened with snakeviz, gprof2dot, etc.
+
+Both split time into the agents' step functions ("agent:<module>") and engine time spent directly in
+World.step ("engine:<callee>", e.g. engine:deepcopy, engine:check_endgame), so optimization work can
+target the real hot spots.
+
+Memory is accounted separately, turn by turn, by a MemoryTracker:
+    MemoryTracker           - tracemalloc peak allocation and process RSS around every agent step. In "sites" mode,
+                              it also attributes the memory each step leaves allocated (search tables, caches) to
+                              the source lines that allocated it.
+"""
+
+AGENTS_DIR = os.sep + "agents" + os.sep
+REPO_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def frame_label(code) -> str:
+    """
+    Label a code object as "<module>.<function>", e.g. "student_agent.minimax" or "world.step".
+    """
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{Path(code.co_filename).stem}.{name}"
+
+
+def is_agent_step(code) -> bool:
+    return code.co_name == "step" and AGENTS_DIR in code.co_filename
+
+
+def categorize(stack: list) -> str:
+    """
+    Attribute a stack (list of code objects, outermost first) to an agent's step, a phase of the
+    engine's World.step or "other" (setup, board loading, ...).
+    """
+    for code in stack:
+        if is_agent_step(code):
+            return f"agent:{Path(code.co_filename).stem}"
+    for i, code in enumerate(stack):
+        if code.co_name == "step" and Path(code.co_filename).stem == "world":
+            if i + 1 < len(stack):
+                return f"engine:{stack[i + 1].co_name}"
+            return "engine:step"
+    return "other"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that records the full Python stack every `interval` seconds of CPU time.
+    Only works on the main thread of a Unix process (it relies on signal.setitimer).
+    """
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        # Drop the profiler's own frames
+        stack = [code for code in stack if code.co_filename != __file__]
+        self.stacks[";".join(frame_label(code) for code in stack)] += 1
+        self.categories[categorize(stack)] += 1
+
+    @contextmanager
+    def profiling(self):
+        previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            yield self
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, previous_handler)
+
+    def write(self, path_prefix):
+        """
+        Write the collapsed stacks to <path_prefix>.collapsed, ready for flamegraph.pl or speedscope.
+        """
+        path = Path(f"{path_prefix}.collapsed")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as fo:
+            for stack, count in self.stacks.most_common():
+                fo.write(f"{stack} {count}\n")
+        return path
+
+    def summary(self, top_n=20) -> str:
+        total = sum(self.stacks.values())
+        if total == 0:
+            return "No samples collected."
+
+        self_samples = Counter()
+        inclusive_samples = Counter()
+        for stack, count in self.stacks.items():
+            labels = stack.split(";")
+            self_samples[labels[-1]] += count
+            for label in set(labels):
+                inclusive_samples[label] += count
+
+        lines = [f"{total} samples ({total * self.interval:.2f}s CPU at {self.interval * 1000:g}ms interval)", ""]
+        lines.append("Time by category:")
+        for category, count in self.categories.most_common():
+            lines.append(f"  {100 * count / total:6.2f}%  {category}")
+        lines.append("")
+        lines.append(f"Top {top_n} functions by self time:")
+        for label, count in self_samples.most_common(top_n):
+            lines.append(f"  {100 * count / total:6.2f}%  {100 * inclusive_samples[label] / total:6.2f}% incl  {label}")
+        return "\n".join(lines)
+
+
+class CProfileProfiler:
+    """
+    Deterministic profiler built on cProfile. Higher overhead than sampling, but exact call counts.
+    """
+    def __init__(self):
+        self.stats = None
+
+    @contextmanager
+    def profiling(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield self
+        finally:
+            profiler.disable()
+            self._add(pstats.Stats(profiler))
+
+    def _add(self, stats):
+        if self.stats is None:
+            self.stats = stats
+        else:
+            self.stats.add(stats)
+
+    def write(self, path_prefix):
+        """
+        Dump the merged statistics to <path_prefix>.prof
+        """
+        path = Path(f"{path_prefix}.prof")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.stats is not None:
+            self.stats.dump_stats(str(path))
+        return path
+
+    def category_times(self) -> dict:
+        """
+        Cumulative time spent in each agent's step function, and in World.step excluding agents.
+        """
+        times = Counter()
+        world_step = 0.0
+        for (filename, _, funcname), (_, _, _, cumtime, _) in self.stats.stats.items():
+            if funcname == "step" and AGENTS_DIR in filename:
+                times[f"agent:{Path(filename).stem}"] += cumtime
+            elif funcname == "step" and Path(filename).stem == "world":
+                world_step += cumtime
+        times["engine"] = world_step - sum(times.values())
+        return times
+
+    def summary(self, top_n=20) -> str:
+        if self.stats is None:
+            return "No profile collected."
+
+        lines = ["Time by category:"]
+        for category, seconds in sorted(self.category_times().items(), key=lambda x: -x[1]):
+            lines.append(f"  {seconds:10.3f}s  {category}")
+        lines.append("")
+
+        stream = io.StringIO()
+        self.stats.stream = stream
+        self.stats.sort_stats("tottime").print_stats(top_n)
+        lines.append(stream.getvalue())
+        return "\n".join(lines)
+
+
+class MemoryTracker:
+    """
+    Per-turn memory accounting of the agents' step functions, with tracemalloc.
+
+    World calls start_turn() right before an agent's step and end_turn() right after it returns. Every turn
+    gives the peak memory allocated during the step (above what was allocated before it, NumPy arrays included)
+    and the RSS of the process after it.
+
+    With sites=True, the allocations still alive at the end of the step (what the agent keeps between turns:
+    transposition tables, evaluation caches, ...) are also grouped by the source line that made them, the
+    innermost line of this repository in the allocation's traceback (so np.pad called from evaluation.mobility
+    counts for evaluation.py, not NumPy). Short-lived allocations, e.g. board copies freed before the step
+    returns, only show in the peak. Snapshots make this mode noticeably slower.
+
+    tracemalloc slows every allocation down, so turn times are inflated while tracking.
+
+    Parameters
+    ----------
+    sites : bool
+        Whether to attribute the memory kept by each step to its allocation sites
+    frames : int
+        Depth of the tracebacks stored by tracemalloc with sites=True, deep enough to get out of library code
+    """
+    def __init__(self, sites=False, frames=8):
+        self.sites = sites
+        self.frames = frames if sites else 1
+        self._start_traced = 0
+        self._start_snapshot = None
+        # Site ("file:line") -> agent -> [largest growth in one turn, total growth], in bytes
+        self.site_growth = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def start_turn(self):
+        self.start()
+        if self.sites:
+            self._start_snapshot = self._snapshot()
+        tracemalloc.reset_peak()
+        self._start_traced = tracemalloc.get_traced_memory()[0]
+
+    def end_turn(self, agent: str):
+        """
+        Close the turn started by start_turn.
+
+        Returns
+        -------
+        peak_mb : float
+            Peak memory allocated during the turn, in MB
+        rss_mb : float
+            RSS of the process after the turn, in MB
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        peak_mb = max(peak - self._start_traced, 0) / 2**20
+        if self.sites and self._start_snapshot is not None:
+            turn_growth = Counter()
+            for diff in self._snapshot().compare_to(self._start_snapshot, "traceback"):
+                if diff.size_diff > 0:
+                    turn_growth[allocation_site(diff.traceback)] += diff.size_diff
+            for site, size in turn_growth.items():
+                growth = self.site_growth[site][agent]
+                growth[0] = max(growth[0], size)
+                growth[1] += size
+            self._start_snapshot = None
+        return peak_mb, rss_mb(os.getpid())
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            )
+        )
+
+    def sites_summary(self, top_n=10) -> str:
+        """
+        The top_n allocation sites by total memory kept across turns, per agent.
+        """
+        rows = [
+            (total, largest, site, agent)
+            for site, agents in self.site_growth.items()
+            for agent, (largest, total) in agents.items()
+        ]
+        if not rows:
+            return "No allocation sites recorded."
+        lines = [f"Top {top_n} allocation sites by memory kept after the step (total over all turns, largest turn):"]
+        for total, largest, site, agent in sorted(rows, reverse=True)[:top_n]:
+            lines.append(f"  {total / 2**20:10.3f} MB  {largest / 2**20:10.3f} MB  {agent:20s} {site}")
+        return "\n".join(lines)
+
+
+def allocation_site(traceback) -> str:
+    """
+    "file:line" of the innermost frame of a tracemalloc traceback that belongs to this repository
+    (the innermost frame if none does).
+    """
+    for frame in reversed(traceback):
+        if frame.filename.startswith(REPO_DIR):
+            break
+    else:
+        frame = traceback[-1]
+    return f"{Path(frame.filename).name}:{frame.lineno}"
+
+
+def memory_percentiles(values) -> str:
+    """
+    "p50 / p90 / p99 / max" of per-turn memory values, in MB.
+    """
+    if len(values) == 0:
+        return "no turns"
+    p50, p90, p99, top = np.percentile(values, [50, 90, 99, 100])
+    return f"p50 {p50:.2f} / p90 {p90:.2f} / p99 {p99:.2f} / max {top:.2f} MB"
+
+
+def make_profiler(kind: str):
+    """
+    Build a profiler from its command line name ("sample" or "cprofile").
+    """
+    if kind == "sample":
+        return SamplingProfiler()
+    if kind == "cprofile":
+        return CProfileProfiler()
+    raise ValueError(f"Unknown profiler '{kind}'. Use 'sample' or 'cprofile'.")
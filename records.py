@@ -0,0 +1,238 @@
+import argparse
+import base64
+from pathlib import Path
+
+import numpy as np
+
+from helpers import decode_move, execute_move
+
+"""
+Records.py stores finished games as compact one-line records and replays them.
+
+A record line is tab separated:
+    board  player_1  player_2  p0_score  p1_score  moves
+where moves is the base64 of the little-endian uint32 move codes from helpers.encode_move (4 bytes per move,
+PASS_MOVE_CODE for a pass). Blue (player 1) always moves first and turns alternate, passes included.
+
+Replaying a record rebuilds any position without re-running the agents, so a reported loss can be inspected
+or rendered offline:
+    python records.py games.rec --game 3                      # summary of game 3
+    python records.py games.rec --game 3 --ply 40             # print the board after 40 moves
+    python records.py games.rec --game 3 --display            # step through the game in the UI
+    python records.py games.rec --game 3 --frames 0,20,40 --save_dir plots/  # export selected frames
+    python records.py games.rec --game 3 --export plots/game3.gif            # whole game as GIF/MP4/PDF
+
+Classes:
+    GameRecord              - one game: board file, agents, scores and packed moves
+    Replay                  - positions of a GameRecord, rebuilt once and indexed by ply
+"""
+
+MOVE_DTYPE = np.dtype("<u4")
+
+
+class GameRecord:
+    """
+    A finished game, as stored on one line of a records file.
+    """
+    def __init__(self, board, player_1, player_2, moves, p0_score=None, p1_score=None):
+        self.board = board
+        self.player_1 = player_1
+        self.player_2 = player_2
+        self.moves = np.asarray(moves, dtype=MOVE_DTYPE)
+        self.p0_score = p0_score
+        self.p1_score = p1_score
+
+    def to_line(self) -> str:
+        packed = base64.b64encode(self.moves.tobytes()).decode("ascii")
+        return "\t".join(
+            [self.board, self.player_1, self.player_2, str(self.p0_score), str(self.p1_score), packed]
+        )
+
+    @classmethod
+    def from_line(cls, line: str):
+        board, player_1, player_2, p0_score, p1_score, packed = line.rstrip("\n").split("\t")
+        moves = np.frombuffer(base64.b64decode(packed), dtype=MOVE_DTYPE)
+        return cls(
+            board,
+            player_1,
+            player_2,
+            moves,
+            p0_score=None if p0_score == "None" else int(p0_score),
+            p1_score=None if p1_score == "None" else int(p1_score),
+        )
+
+
+def append_record(path, record: GameRecord):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as fo:
+        fo.write(record.to_line() + "\n")
+
+
+def load_records(path) -> list[GameRecord]:
+    with open(path) as fo:
+        return [GameRecord.from_line(line) for line in fo if line.strip()]
+
+
+class Replay:
+    """
+    Rebuild the positions of a recorded game.
+
+    The whole game is replayed once, on first access, into a (num_moves + 1, n, n) array,
+    after which any position is a simple index.
+    """
+    def __init__(self, record: GameRecord, chess_board=None):
+        self.record = record
+        if chess_board is None:
+            chess_board = np.loadtxt(record.board, dtype=int, delimiter=",")
+        self.initial_board = chess_board
+        self._positions = None
+
+    def __len__(self):
+        return len(self.record.moves)
+
+    def player_at(self, ply: int) -> int:
+        """
+        The player (1 or 2) to move after `ply` moves.
+        """
+        return 1 if ply % 2 == 0 else 2
+
+    def move_at(self, ply: int):
+        """
+        The move played at `ply` (MoveCoordinates), None for a pass.
+        """
+        return decode_move(self.record.moves[ply])
+
+    @property
+    def positions(self) -> np.ndarray:
+        if self._positions is None:
+            positions = np.empty((len(self) + 1,) + self.initial_board.shape, dtype=np.int8)
+            chess_board = self.initial_board.copy()
+            positions[0] = chess_board
+            for ply in range(len(self)):
+                move_coords = self.move_at(ply)
+                if move_coords is not None:
+                    execute_move(chess_board, move_coords, self.player_at(ply))
+                positions[ply + 1] = chess_board
+            self._positions = positions
+        return self._positions
+
+    def board_at(self, ply: int) -> np.ndarray:
+        """
+        The board after `ply` moves (ply 0 is the initial board), as the int array World uses.
+        """
+        return self.positions[ply].astype(int)
+
+
+class ReplayView:
+    """
+    Stand-in for World that exposes what UIEngine reads, so a replay can be rendered without agents.
+    """
+    def __init__(self, replay: Replay, display_save=False, display_save_path=None):
+        self.replay = replay
+        self.p0 = replay.record.player_1
+        self.p1 = replay.record.player_2
+        self.player_1_name = replay.record.player_1
+        self.player_2_name = replay.record.player_2
+        self.display_save = display_save
+        self.display_save_path = display_save_path
+        self.turn = 0
+        self.results_cache = ()
+
+    def seek(self, ply: int):
+        """
+        Move the view to the position after `ply` moves and return that board.
+        """
+        # UIEngine shows the player who just moved in bold, like World after a step
+        self.turn = ply % 2
+        is_end = ply == len(self.replay) and self.replay.record.p0_score is not None
+        if is_end:
+            self.results_cache = (True, self.replay.record.p0_score, self.replay.record.p1_score)
+        else:
+            board = self.replay.positions[ply]
+            self.results_cache = (False, int(np.sum(board == 1)), int(np.sum(board == 2)))
+        return self.replay.board_at(ply)
+
+    def frames(self, plies=None):
+        """
+        Yield (chess_board, turn, results) for every ply (or the selected ones), as ui.export_game expects.
+        """
+        for ply in plies if plies is not None else range(len(self.replay) + 1):
+            chess_board = self.seek(ply)
+            yield chess_board, 1 - self.turn, self.results_cache
+
+
+def export_replay(replay: Replay, path, frames=None, fps=2):
+    """
+    Export a replay (or selected frames of it) in one pass to a GIF, MP4 or multi-page PDF, see ui.export_game.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from ui import export_game
+
+    view = ReplayView(replay)
+    return export_game(
+        view.frames(frames),
+        path,
+        replay.initial_board.shape[0],
+        player_1_name=replay.record.player_1,
+        player_2_name=replay.record.player_2,
+        fps=fps,
+    )
+
+
+def render_replay(replay: Replay, frames=None, save_dir=None, display_delay=0.4):
+    """
+    Render a replay with the UI, either interactively or, with save_dir, only saving the selected frames.
+
+    Parameters
+    ----------
+    replay : Replay
+    frames : list of int
+        Plies to render (default: every position)
+    save_dir : str
+        If set, save each frame there instead of displaying it
+    display_delay : float
+        Delay between frames when displaying
+    """
+    import matplotlib
+    if save_dir is not None:
+        matplotlib.use("Agg")
+    from time import sleep
+    from ui import UIEngine
+
+    view = ReplayView(replay, display_save=save_dir is not None, display_save_path=save_dir)
+    engine = UIEngine(replay.initial_board.shape[0], view)
+    for ply in frames if frames is not None else range(len(replay) + 1):
+        engine.step_number = ply
+        engine.render(view.seek(ply))
+        if save_dir is None:
+            sleep(display_delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=str)
+    parser.add_argument("--game", type=int, default=0, help="Index of the game (line) in the records file")
+    parser.add_argument("--ply", type=int, default=None, help="Print the board after this many moves")
+    parser.add_argument("--display", action="store_true", default=False)
+    parser.add_argument("--display_delay", type=float, default=0.4)
+    parser.add_argument("--frames", type=str, default=None, help="Comma separated plies to render")
+    parser.add_argument("--save_dir", type=str, default=None)
+    parser.add_argument("--export", type=str, default=None, help="Export the game to a .gif, .mp4 or .pdf file")
+    parser.add_argument("--fps", type=int, default=2)
+    args = parser.parse_args()
+
+    record = load_records(args.path)[args.game]
+    replay = Replay(record)
+    print(
+        f"Game {args.game} on {record.board}: {record.player_1} (Blue) {record.p0_score} - "
+        f"{record.p1_score} {record.player_2} (Brown), {len(replay)} moves"
+    )
+    if args.ply is not None:
+        print(replay.board_at(args.ply))
+    frames = [int(f) for f in args.frames.split(",")] if args.frames else None
+    if args.export is not None:
+        print(f"Exported to {export_replay(replay, args.export, frames=frames, fps=args.fps)}")
+    if args.display or args.save_dir is not None:
+        render_replay(replay, frames=frames, save_dir=args.save_dir, display_delay=args.display_delay)
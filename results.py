@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+"""
+Results.py is an append-only store of game results, one JSON record per line.
+
+Records are streamed game by game during autoplay, so an interrupted run keeps every finished game and
+can be resumed with --resume. Each record holds:
+    run_id, game            - the run the game belongs to and its index within the run
+    player_1, player_2      - the agents seated as Blue (player 1) and Brown (player 2) in this game
+    board, seed             - the board file and the seed the game was played with
+    p0_score, p1_score      - final scores of Blue and Brown
+    moves                   - number of moves played
+    end_reason              - why the game ended (elimination, board_full, no_moves, move_limit, repetition), see World.get_end_reason
+    p0_times, p1_times      - per-turn times of Blue and Brown (in seconds)
+
+Aggregations (win rate per board, turn time percentiles) are computed from the records, without replaying games:
+    python results.py results/results.jsonl
+"""
+
+
+class ResultsStore:
+    """
+    Append-only JSONL file of game records.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def append(self, record: dict):
+        """
+        Append a record and flush it to disk right away, so it survives an interrupted run.
+        If a killed run left a truncated last line, the record starts on a new line so that it is not lost
+        with the truncated one.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a+b") as fo:
+            if fo.tell() > 0:
+                fo.seek(-1, os.SEEK_END)
+                if fo.read(1) != b"\n":
+                    fo.write(b"\n")
+            fo.write((json.dumps(record) + "\n").encode())
+            fo.flush()
+            os.fsync(fo.fileno())
+
+    def records(self, run_id=None) -> list[dict]:
+        """
+        Load all records (of a given run, if run_id is set). A truncated last line, left by a run
+        killed mid-write, is ignored.
+        """
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path) as fo:
+            for line in fo:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if run_id is None or record.get("run_id") == run_id:
+                    records.append(record)
+        return records
+
+    def completed_games(self, run_id) -> dict:
+        """
+        Map game index -> record for every finished game of a run.
+        """
+        return {record["game"]: record for record in self.records(run_id)}
+
+    def last_seed(self, player_1, player_2):
+        """
+        Base seed of the most recent run between these two agents, used to resume a run without --seed.
+        """
+        for record in reversed(self.records()):
+            if record.get("run_player_1") == player_1 and record.get("run_player_2") == player_2:
+                return record.get("run_seed")
+        return None
+
+
+def agent_scores(record: dict) -> dict:
+    """
+    Map agent name -> score of a record. Win = 1, tie = 0.5, loss = 0. Self-play counts as a tie.
+    """
+    if record["player_1"] == record["player_2"]:
+        return {record["player_1"]: 0.5}
+    if record["p0_score"] > record["p1_score"]:
+        return {record["player_1"]: 1.0, record["player_2"]: 0.0}
+    if record["p0_score"] < record["p1_score"]:
+        return {record["player_1"]: 0.0, record["player_2"]: 1.0}
+    return {record["player_1"]: 0.5, record["player_2"]: 0.5}
+
+
+def win_rates(records: list[dict]) -> dict:
+    """
+    Win rate of every agent over all records.
+    """
+    totals = defaultdict(list)
+    for record in records:
+        for agent, score in agent_scores(record).items():
+            totals[agent].append(score)
+    return {agent: float(np.mean(scores)) for agent, scores in totals.items()}
+
+
+def win_rates_by_board(records: list[dict]) -> dict:
+    """
+    Map board -> {agent: win rate} over all records.
+    """
+    by_board = defaultdict(list)
+    for record in records:
+        by_board[record["board"]].append(record)
+    return {board: win_rates(board_records) for board, board_records in sorted(by_board.items())}
+
+
+def turn_times(records: list[dict]) -> dict:
+    """
+    Map agent name -> list of all its turn times.
+    """
+    times = defaultdict(list)
+    for record in records:
+        times[record["player_1"]].extend(record["p0_times"])
+        times[record["player_2"]].extend(record["p1_times"])
+    return times
+
+
+def time_percentiles(records: list[dict], percentiles=(50, 90, 99, 100)) -> dict:
+    """
+    Map agent name -> {percentile: turn time in seconds}.
+    """
+    return {
+        agent: {p: float(np.percentile(times, p)) for p in percentiles}
+        for agent, times in turn_times(records).items()
+        if len(times) > 0
+    }
+
+
+def end_reasons(records: list[dict]) -> dict:
+    """
+    Number of games per end reason (records from before end reasons were stored count as "unknown").
+    """
+    counts = defaultdict(int)
+    for record in records:
+        counts[record.get("end_reason") or "unknown"] += 1
+    return dict(counts)
+
+
+def summarize(records: list[dict]) -> str:
+    lines = [f"{len(records)} games"]
+    for agent, rate in sorted(win_rates(records).items()):
+        lines.append(f"  {agent}: win rate {rate:.3f}")
+    lines.append("Win rate per board:")
+    for board, rates in win_rates_by_board(records).items():
+        rates_text = ", ".join(f"{agent} {rate:.3f}" for agent, rate in sorted(rates.items()))
+        lines.append(f"  {board}: {rates_text}")
+    reasons_text = ", ".join(f"{reason} {count}" for reason, count in sorted(end_reasons(records).items()))
+    lines.append(f"End reasons: {reasons_text}")
+    lines.append("Turn time percentiles (seconds):")
+    for agent, percentiles in sorted(time_percentiles(records).items()):
+        percentiles_text = ", ".join(f"p{p}={t:.5f}" for p, t in percentiles.items())
+        lines.append(f"  {agent}: {percentiles_text}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", type=str)
+    parser.add_argument("--run_id", type=str, default=None)
+    args = parser.parse_args()
+    print(summarize(ResultsStore(args.path).records(args.run_id)))
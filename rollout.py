@@ -0,0 +1,488 @@
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from helpers import MOVE_FIELD_BITS, PASS_MOVE_CODE, get_directions, get_two_tile_directions
+from kernels import NUMBA_AVAILABLE, njit
+
+"""
+Rollout.py is a library of fast playout policies for simulation-based agents (Monte Carlo, MCTS, ...).
+
+Moves are sampled without building the list of valid moves. For every cell, the kernels keep the number of
+discs of each player one tile away (near) and two tiles away (far), from precomputed neighbour tables. near and
+far are updated incrementally as discs are placed, captured or moved. An empty cell is the destination of
+near[player] duplications and far[player] jumps, and a move there captures near[opponent] discs. A policy
+weights every empty cell from these counts, draws one by its cumulative weight, then picks a source among the
+discs around it.
+
+Policies:
+    uniform                 - every valid move with the same probability (like helpers.random_move)
+    capture_greedy          - uniformly among the moves that gain the most discs (count_disc_count_change)
+    epsilon_greedy          - uniform with probability epsilon, capture_greedy otherwise
+    gain_weighted           - every valid move with probability proportional to exp(gain / temperature)
+
+Randomness comes from a np.random.Generator, drawn in one block per call, so a seeded generator gives the same
+moves and playouts with or without Numba. The kernels are compiled with Numba when it is installed (see
+kernels.py). Without it, sample_move and playout use NumPy versions that compute the weights of all the cells at
+once and recount near and far after every move: results are identical, playouts slower.
+
+    python rollout.py                 # check the policies against helpers.py, then measure playouts per second
+
+Functions:
+    neighbour_tables        - flat indices of the cells one and two tiles away from every cell, per board size
+    sample_move             - one move code drawn by a policy (PASS_MOVE_CODE when there is none)
+    playout                 - play a game to its end with a policy, returns the final scores
+    warm_up                 - compile (or load from cache) the kernels before the first timed turn
+"""
+
+UNIFORM = 0
+CAPTURE_GREEDY = 1
+EPSILON_GREEDY = 2
+GAIN_WEIGHTED = 3
+POLICIES = {
+    "uniform": UNIFORM,
+    "capture_greedy": CAPTURE_GREEDY,
+    "epsilon_greedy": EPSILON_GREEDY,
+    "gain_weighted": GAIN_WEIGHTED,
+}
+# Uniform draws per move: epsilon test, destination, duplication or jump, source
+DRAWS_PER_MOVE = 4
+_neighbour_tables = {}
+
+
+def neighbour_tables(board_size: int):
+    """
+    Flat indices of the neighbours of every cell, padded with -1 off the board.
+
+    Returns
+    -------
+    ring1 : np.ndarray of shape (n*n, 8)
+        Cells one tile away (get_directions)
+    ring2 : np.ndarray of shape (n*n, 16)
+        Cells two tiles away (get_two_tile_directions)
+    """
+    if board_size not in _neighbour_tables:
+        tables = []
+        for directions in (get_directions(), get_two_tile_directions()):
+            table = np.full((board_size * board_size, len(directions)), -1, dtype=np.int64)
+            for r in range(board_size):
+                for c in range(board_size):
+                    for k, (dr, dc) in enumerate(directions):
+                        if 0 <= r + dr < board_size and 0 <= c + dc < board_size:
+                            table[r * board_size + c, k] = (r + dr) * board_size + c + dc
+            tables.append(table)
+        _neighbour_tables[board_size] = tuple(tables)
+    return _neighbour_tables[board_size]
+
+
+@njit(cache=True)
+def _count_neighbours(cells, ring1, ring2, near, far):
+    near[:] = 0
+    far[:] = 0
+    for cell in range(cells.shape[0]):
+        occupant = cells[cell]
+        if occupant != 1 and occupant != 2:
+            continue
+        for k in range(ring1.shape[1]):
+            if ring1[cell, k] >= 0:
+                near[occupant, ring1[cell, k]] += 1
+        for k in range(ring2.shape[1]):
+            if ring2[cell, k] >= 0:
+                far[occupant, ring2[cell, k]] += 1
+
+
+@njit(cache=True)
+def _set_cell(cells, cell, value, ring1, ring2, near, far):
+    # Change one cell and keep near/far up to date
+    old = cells[cell]
+    for occupant, delta in ((old, -1), (value, 1)):
+        if occupant != 1 and occupant != 2:
+            continue
+        for k in range(ring1.shape[1]):
+            if ring1[cell, k] >= 0:
+                near[occupant, ring1[cell, k]] += delta
+        for k in range(ring2.shape[1]):
+            if ring2[cell, k] >= 0:
+                far[occupant, ring2[cell, k]] += delta
+    cells[cell] = value
+
+
+@njit(cache=True)
+def _sample(cells, player, policy, epsilon, temperature, ring1, ring2, near, far, draws, weights1, weights2, cumulative):
+    # One move code drawn by the policy, -1 if player has no valid move
+    opponent = 3 - player
+    mode = policy
+    if policy == EPSILON_GREEDY:
+        mode = UNIFORM if draws[0] < epsilon else CAPTURE_GREEDY
+
+    best = -1
+    if mode == CAPTURE_GREEDY:
+        for cell in range(cells.shape[0]):
+            if cells[cell] != 0:
+                continue
+            if near[player, cell] > 0:
+                best = max(best, near[opponent, cell] + 1)
+            elif far[player, cell] > 0:
+                best = max(best, near[opponent, cell])
+
+    total = 0.0
+    for cell in range(cells.shape[0]):
+        w1 = 0.0
+        w2 = 0.0
+        if cells[cell] == 0:
+            n1 = near[player, cell]
+            n2 = far[player, cell]
+            captures = near[opponent, cell]
+            if mode == UNIFORM:
+                w1 = n1
+                w2 = n2
+            elif mode == CAPTURE_GREEDY:
+                # A duplication always gains one more disc than a jump to the same cell
+                if n1 > 0:
+                    if captures + 1 == best:
+                        w1 = n1
+                elif n2 > 0 and captures == best:
+                    w2 = n2
+            else:
+                w1 = n1 * np.exp((captures + 1) / temperature)
+                w2 = n2 * np.exp(captures / temperature)
+        weights1[cell] = w1
+        weights2[cell] = w2
+        total += w1 + w2
+        cumulative[cell] = total
+    return _choose(cells, player, ring1, ring2, near, far, draws, weights1, weights2, cumulative)
+
+
+@njit(cache=True)
+def _choose(cells, player, ring1, ring2, near, far, draws, weights1, weights2, cumulative):
+    # The move drawn from the weights of every destination (duplications in weights1, jumps in weights2) and
+    # their running total: destination, then duplication or jump, then source. -1 if every weight is 0.
+    total = cumulative[-1]
+    if total == 0.0:
+        return -1
+
+    dest = min(np.searchsorted(cumulative, draws[1] * total, side="right"), cells.shape[0] - 1)
+    while weights1[dest] + weights2[dest] == 0.0:
+        dest -= 1
+    duplication = draws[2] * (weights1[dest] + weights2[dest]) < weights1[dest]
+    if duplication:
+        ring = ring1
+        sources = near[player, dest]
+    else:
+        ring = ring2
+        sources = far[player, dest]
+
+    pick = min(int(draws[3] * sources), sources - 1)
+    src = -1
+    for k in range(ring.shape[1]):
+        other = ring[dest, k]
+        if other >= 0 and cells[other] == player:
+            if pick == 0:
+                src = other
+                break
+            pick -= 1
+
+    n = int(np.sqrt(cells.shape[0]) + 0.5)
+    code = src // n
+    code = (code << MOVE_FIELD_BITS) | (src % n)
+    code = (code << MOVE_FIELD_BITS) | (dest // n)
+    return (code << MOVE_FIELD_BITS) | (dest % n)
+
+
+@njit(cache=True)
+def _sample_move(cells, player, policy, epsilon, temperature, ring1, ring2, draws):
+    near = np.zeros((3, cells.shape[0]), dtype=np.int64)
+    far = np.zeros((3, cells.shape[0]), dtype=np.int64)
+    _count_neighbours(cells, ring1, ring2, near, far)
+    weights1 = np.empty(cells.shape[0])
+    weights2 = np.empty(cells.shape[0])
+    cumulative = np.empty(cells.shape[0])
+    return _sample(cells, player, policy, epsilon, temperature, ring1, ring2, near, far, draws, weights1, weights2, cumulative)
+
+
+@njit(cache=True)
+def _playout(cells, player, policy, epsilon, temperature, ring1, ring2, draws):
+    size = cells.shape[0]
+    n = int(np.sqrt(size) + 0.5)
+    near = np.zeros((3, size), dtype=np.int64)
+    far = np.zeros((3, size), dtype=np.int64)
+    _count_neighbours(cells, ring1, ring2, near, far)
+    weights1 = np.empty(size)
+    weights2 = np.empty(size)
+    cumulative = np.empty(size)
+    discs = np.zeros(3, dtype=np.int64)
+    empty = 0
+    for cell in range(size):
+        if cells[cell] == 0:
+            empty += 1
+        elif cells[cell] == 1 or cells[cell] == 2:
+            discs[cells[cell]] += 1
+
+    moves = 0
+    passed = False
+    while moves < draws.shape[0] and discs[1] > 0 and discs[2] > 0 and empty > 0:
+        opponent = 3 - player
+        code = _sample(
+            cells, player, policy, epsilon, temperature, ring1, ring2, near, far, draws[moves],
+            weights1, weights2, cumulative,
+        )
+        if code < 0:
+            if passed:
+                # Neither player can move
+                break
+            passed = True
+        else:
+            passed = False
+            dest = ((code >> MOVE_FIELD_BITS) & 63) * n + (code & 63)
+            src = ((code >> (3 * MOVE_FIELD_BITS)) & 63) * n + ((code >> (2 * MOVE_FIELD_BITS)) & 63)
+            _set_cell(cells, dest, player, ring1, ring2, near, far)
+            for k in range(ring1.shape[1]):
+                other = ring1[dest, k]
+                if other >= 0 and cells[other] == opponent:
+                    _set_cell(cells, other, player, ring1, ring2, near, far)
+                    discs[player] += 1
+                    discs[opponent] -= 1
+            if abs(dest // n - src // n) == 2 or abs(dest % n - src % n) == 2:
+                _set_cell(cells, src, 0, ring1, ring2, near, far)
+            else:
+                discs[player] += 1
+                empty -= 1
+        player = opponent
+        moves += 1
+    return discs[1], discs[2], moves
+
+
+def _count_neighbours_numpy(cells, ring1, ring2):
+    # near and far of _count_neighbours, with one bincount per ring (of occupant * size + neighbour) instead of a
+    # loop over the cells
+    size = cells.shape[0]
+    discs = np.flatnonzero((cells == 1) | (cells == 2))
+    rows = (cells[discs] * size)[:, None]
+    counts = []
+    for ring in (ring1, ring2):
+        targets = ring[discs]
+        counts.append(np.bincount((rows + targets)[targets >= 0], minlength=3 * size).reshape(3, size))
+    return counts[0], counts[1]
+
+
+def _sample_numpy(cells, player, policy, epsilon, temperature, ring1, ring2, near, far, draws):
+    # _sample with the weights of all the cells computed at once: the same weights and running total (np.cumsum
+    # adds in the same order), so the same move is drawn
+    opponent = 3 - player
+    mode = policy
+    if policy == EPSILON_GREEDY:
+        mode = UNIFORM if draws[0] < epsilon else CAPTURE_GREEDY
+
+    empty = cells == 0
+    n1 = np.where(empty, near[player], 0)
+    n2 = np.where(empty, far[player], 0)
+    captures = near[opponent]
+    if mode == UNIFORM:
+        weights1, weights2 = n1.astype(np.float64), n2.astype(np.float64)
+    elif mode == CAPTURE_GREEDY:
+        # A duplication always gains one more disc than a jump to the same cell
+        gains = np.where(n1 > 0, captures + 1, np.where(n2 > 0, captures, -1))
+        best = gains.max()
+        weights1 = np.where((n1 > 0) & (gains == best), n1, 0).astype(np.float64)
+        weights2 = np.where((n1 == 0) & (n2 > 0) & (gains == best), n2, 0).astype(np.float64)
+    else:
+        weights1 = n1 * np.exp((captures + 1) / temperature)
+        weights2 = n2 * np.exp(captures / temperature)
+    cumulative = np.cumsum(weights1 + weights2)
+    return _choose(cells, player, ring1, ring2, near, far, draws, weights1, weights2, cumulative)
+
+
+def _playout_numpy(cells, player, policy, epsilon, temperature, ring1, ring2, draws):
+    # _playout without Numba: every move is applied with array indexing and near/far are counted again
+    size = cells.shape[0]
+    n = int(np.sqrt(size) + 0.5)
+    moves = 0
+    passed = False
+    while moves < draws.shape[0]:
+        discs = np.bincount(cells[cells < 3], minlength=3)
+        if discs[1] == 0 or discs[2] == 0 or discs[0] == 0:
+            break
+        near, far = _count_neighbours_numpy(cells, ring1, ring2)
+        code = _sample_numpy(cells, player, policy, epsilon, temperature, ring1, ring2, near, far, draws[moves])
+        if code < 0:
+            if passed:
+                # Neither player can move
+                break
+            passed = True
+        else:
+            passed = False
+            dest = ((code >> MOVE_FIELD_BITS) & 63) * n + (code & 63)
+            src = ((code >> (3 * MOVE_FIELD_BITS)) & 63) * n + ((code >> (2 * MOVE_FIELD_BITS)) & 63)
+            neighbours = ring1[dest][ring1[dest] >= 0]
+            cells[neighbours[cells[neighbours] == 3 - player]] = player
+            cells[dest] = player
+            if abs(dest // n - src // n) == 2 or abs(dest % n - src % n) == 2:
+                cells[src] = 0
+        player = 3 - player
+        moves += 1
+    discs = np.bincount(cells[cells < 3], minlength=3)
+    return discs[1], discs[2], moves
+
+
+def _policy_id(policy) -> int:
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown rollout policy '{policy}'. Use one of {', '.join(POLICIES)}.")
+    return POLICIES[policy]
+
+
+def sample_move(chess_board, player: int, policy="uniform", rng=None, epsilon=0.1, temperature=1.0) -> int:
+    """
+    Draw one valid move of player with a rollout policy.
+
+    Parameters
+    ----------
+    chess_board : np.ndarray
+        The board (not modified)
+    player : int
+        The player to move
+    policy : str
+        One of POLICIES
+    rng : np.random.Generator
+        Source of randomness, a fresh unseeded generator if None
+    epsilon : float
+        Probability of a uniform move of epsilon_greedy
+    temperature : float
+        Temperature of gain_weighted: lower favours captures more
+
+    Returns
+    -------
+    int
+        The move as an encode_move code, PASS_MOVE_CODE if player has no valid move
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    ring1, ring2 = neighbour_tables(chess_board.shape[0])
+    cells = chess_board.ravel().astype(np.int64)
+    draws = rng.random(DRAWS_PER_MOVE)
+    if NUMBA_AVAILABLE:
+        code = _sample_move(cells, player, _policy_id(policy), epsilon, temperature, ring1, ring2, draws)
+    else:
+        near, far = _count_neighbours_numpy(cells, ring1, ring2)
+        code = _sample_numpy(cells, player, _policy_id(policy), epsilon, temperature, ring1, ring2, near, far, draws)
+    return PASS_MOVE_CODE if code < 0 else int(code)
+
+
+def playout(chess_board, player: int, policy="uniform", rng=None, max_moves=None, epsilon=0.1, temperature=1.0):
+    """
+    Play the game from chess_board to its end, both players using the rollout policy.
+
+    The playout stops when check_endgame would (a player eliminated or the board full), when neither player
+    can move, or after max_moves moves (passes included), by default World's move limit of 3 * n * n.
+
+    Parameters
+    ----------
+    chess_board : np.ndarray
+        The starting position (not modified)
+    player : int
+        The player to move first
+    policy, rng, epsilon, temperature
+        As in sample_move
+
+    Returns
+    -------
+    player_1_score : int
+    player_2_score : int
+        Final scores, as check_endgame counts them (all squares to the survivor of an elimination)
+    moves : int
+        Number of moves played, passes included
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    n = chess_board.shape[0]
+    max_moves = 3 * n * n if max_moves is None else max_moves
+    ring1, ring2 = neighbour_tables(n)
+    p0_score, p1_score, moves = (_playout if NUMBA_AVAILABLE else _playout_numpy)(
+        chess_board.ravel().astype(np.int64),
+        player,
+        _policy_id(policy),
+        epsilon,
+        temperature,
+        ring1,
+        ring2,
+        rng.random((max_moves, DRAWS_PER_MOVE)),
+    )
+    if p0_score == 0:
+        return 0, n * n, int(moves)
+    if p1_score == 0:
+        return n * n, 0, int(moves)
+    return int(p0_score), int(p1_score), int(moves)
+
+
+def warm_up():
+    """
+    Compile every rollout kernel (or load it from the on-disk cache). A no-op without Numba.
+    """
+    if not NUMBA_AVAILABLE:
+        return
+    board = np.zeros((6, 6), dtype=int)
+    board[0, 0], board[5, 5] = 1, 2
+    for policy in POLICIES:
+        sample_move(board, 1, policy, np.random.default_rng(0))
+        playout(board, 1, policy, np.random.default_rng(0), max_moves=4)
+
+
+def cross_check(boards=200, seed=0):
+    """
+    Check the policies against helpers.py on random boards: sampled moves are valid, capture_greedy moves gain
+    the most discs, and uniform draws cover every valid move. Raises AssertionError on a mismatch.
+    """
+    # Imported here: only the check needs the reference implementation
+    from evaluation import disc_gains
+    from helpers import get_valid_move_codes
+    from kernels import random_board
+
+    rng = np.random.default_rng(seed)
+    for _ in range(boards):
+        board = random_board(rng, int(rng.integers(6, 13)))
+        for player in (1, 2):
+            codes = get_valid_move_codes(board, player)
+            if len(codes) == 0:
+                assert all(sample_move(board, player, policy, rng) == PASS_MOVE_CODE for policy in POLICIES)
+                continue
+            gains = dict(zip(codes.tolist(), disc_gains(board, codes, player).tolist()))
+            for policy in POLICIES:
+                assert sample_move(board, player, policy, rng) in gains
+            for _ in range(5):
+                assert gains[sample_move(board, player, "capture_greedy", rng)] == max(gains.values())
+        if len(codes) <= 6:
+            drawn = {sample_move(board, 2, "uniform", rng) for _ in range(200)}
+            assert drawn == set(codes.tolist())
+
+        start = rng.integers(1, 3)
+        p0_score, p1_score, moves = playout(board, int(start), "epsilon_greedy", rng)
+        assert 0 <= p0_score + p1_score <= board.size and moves <= 3 * board.size
+
+
+def benchmark(board_path="boards/empty_7x7.csv", playouts=1000, seed=0):
+    """
+    Playouts per second of every policy from the board at board_path.
+    """
+    board = np.loadtxt(board_path, dtype=int, delimiter=",")
+    rates = {}
+    for policy in POLICIES:
+        rng = np.random.default_rng(seed)
+        start = perf_counter()
+        for _ in range(playouts):
+            playout(board, 1, policy, rng)
+        rates[policy] = playouts / (perf_counter() - start)
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boards", type=int, default=200, help="Random boards to cross-check")
+    parser.add_argument("--board_path", type=str, default="boards/empty_7x7.csv", help="Board of the benchmark")
+    parser.add_argument("--playouts", type=int, default=1000, help="Playouts per policy in the benchmark")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    warm_up()
+    print(f"Numba available: {NUMBA_AVAILABLE}, warm-up took {perf_counter() - start:.3f}s")
+    cross_check(args.boards)
+    print(f"Cross-check passed on {args.boards} random boards")
+    for policy, rate in benchmark(args.board_path, args.playouts).items():
+        print(f"{policy:16s} {rate:10.0f} playouts/s")
@@ -0,0 +1,227 @@
+import argparse
+import csv
+import logging
+import os
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+import kernels
+from board_generator import generate_board, save_board
+from constants import MIN_BOARD_SIZE, MAX_BOARD_SIZE
+from helpers import get_valid_moves
+from telemetry import TELEMETRY
+from utils import all_logging_disabled
+from world import World
+
+"""
+Scaling.py measures how the engine and StudentAgent scale with the board size and the obstacle density, on boards
+from board_generator.py, so performance cliffs show up before a tournament board hits them.
+
+For every (board size, density), on a few generated boards:
+    movegen_per_sec         - helpers.get_valid_moves calls per second, on the positions of the engine games
+    kernel_movegen_per_sec  - the same with kernels.get_valid_move_codes
+    engine_moves_per_sec    - World.step calls per second in random_agent self-play (rules engine and random moves)
+    student_nodes_per_sec   - StudentAgent search nodes per second (telemetry "nodes")
+    student_turn_p50/p90/p99/max - StudentAgent turn times, in seconds, at a fixed search depth
+Results are written to CSV and plotted against the board size, one line per density.
+
+    python scaling.py --sizes 6,8,10,12 --densities 0,0.15 --student_depth 3 --output plots/scaling
+
+Functions:
+    measure                 - the metrics of one (board size, density)
+    plot                    - nodes/s, moves/s and turn time percentiles against board size
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def play(board_path, player_1, player_2, max_moves=None, student_params=None, telemetry=False):
+    """
+    Play a game (or its first max_moves moves), with telemetry records if telemetry is set.
+
+    Returns
+    -------
+    world : World
+    step_times : list of float
+        Wall time of every World.step
+    positions : list of (board, player)
+        The position before every step
+    """
+    with all_logging_disabled():
+        world = World(player_1=player_1, player_2=player_2, board_fpath=board_path, autoplay=True, log_events=False)
+    for agent in (world.p0, world.p1):
+        if student_params and hasattr(agent, "params"):
+            agent.params.update(student_params)
+    if telemetry:
+        # World only turns telemetry on to export it, the per-turn records are enough here
+        TELEMETRY.enable()
+    step_times, positions = [], []
+    is_end = False
+    while not is_end and (max_moves is None or world.move_count < max_moves):
+        positions.append((world.chess_board.copy(), world.get_current_player()))
+        start = perf_counter()
+        is_end, _, _ = world.step()
+        step_times.append(perf_counter() - start)
+    TELEMETRY.disable()
+    return world, step_times, positions
+
+
+def calls_per_second(function, positions, repeats=3):
+    start = perf_counter()
+    for _ in range(repeats):
+        for board, player in positions:
+            function(board, player)
+    return repeats * len(positions) / (perf_counter() - start)
+
+
+def measure(board_size, density, boards=3, games=2, student_depth=3, student_moves=20, time_limit=10.0, seed=0):
+    """
+    Metrics of one board size and obstacle density, over `boards` generated boards.
+
+    Parameters
+    ----------
+    games : int
+        random_agent self-play games per board for the engine metrics
+    student_depth : int
+        Fixed search depth of StudentAgent (its time limit is raised to time_limit so that it completes)
+    student_moves : int
+        Moves of the student_agent vs random_agent game played on each board, half of them by StudentAgent
+    """
+    rng = np.random.default_rng(seed)
+    np.random.seed(seed)
+    step_times, positions, turn_times = [], [], []
+    nodes = 0
+    search_time = 0.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i in range(boards):
+            path = os.path.join(tmp_dir, f"board_{i}.csv")
+            save_board(generate_board(board_size, density, rng), path)
+            for _ in range(games):
+                _, times, game_positions = play(path, "random_agent", "random_agent")
+                step_times += times
+                positions += game_positions
+
+            world, _, _ = play(
+                path,
+                "student_agent",
+                "random_agent",
+                max_moves=student_moves,
+                student_params={"max_depth": student_depth, "time_limit": time_limit},
+                telemetry=True,
+            )
+            for record in world.telemetry_records:
+                if record["agent"] == "student_agent" and record["time"] is not None:
+                    turn_times.append(record["time"])
+                    nodes += record["counters"].get("nodes", 0)
+                    search_time += record["time"]
+
+    p50, p90, p99, top = np.percentile(turn_times, [50, 90, 99, 100]) if turn_times else [np.nan] * 4
+    return {
+        "board_size": board_size,
+        "density": density,
+        "movegen_per_sec": calls_per_second(get_valid_moves, positions),
+        "kernel_movegen_per_sec": calls_per_second(kernels.get_valid_move_codes, positions),
+        "engine_moves_per_sec": len(step_times) / sum(step_times),
+        "student_nodes_per_sec": nodes / search_time if search_time else np.nan,
+        "student_turn_p50": p50,
+        "student_turn_p90": p90,
+        "student_turn_p99": p99,
+        "student_turn_max": top,
+    }
+
+
+def plot(results, path):
+    """
+    Plot the results against board size (one line per density) into a PNG.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 3, figsize=(16, 4.5))
+    densities = sorted({result["density"] for result in results})
+    panels = [
+        (axes[0], "Search nodes / s", [("student_nodes_per_sec", "StudentAgent")]),
+        (
+            axes[1],
+            "Calls / s",
+            [
+                ("movegen_per_sec", "get_valid_moves"),
+                ("kernel_movegen_per_sec", "kernels move codes"),
+                ("engine_moves_per_sec", "World.step"),
+            ],
+        ),
+        (
+            axes[2],
+            "StudentAgent turn time (s)",
+            [("student_turn_p50", "p50"), ("student_turn_p90", "p90"), ("student_turn_p99", "p99")],
+        ),
+    ]
+    for ax, ylabel, series in panels:
+        for density in densities:
+            rows = sorted((r for r in results if r["density"] == density), key=lambda r: r["board_size"])
+            sizes = [r["board_size"] for r in rows]
+            for key, label in series:
+                ax.plot(sizes, [r[key] for r in rows], marker="o", label=f"{label}, density {density:g}")
+        ax.set_xlabel("Board size")
+        ax.set_ylabel(ylabel)
+        ax.set_yscale("log")
+        ax.grid(True, which="both", alpha=0.3)
+        ax.legend(fontsize="small")
+    fig.tight_layout()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default=",".join(str(size) for size in range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1)),
+        help="Comma separated board sizes",
+    )
+    parser.add_argument("--densities", type=str, default="0,0.15", help="Comma separated obstacle densities")
+    parser.add_argument("--boards", type=int, default=3, help="Generated boards per size and density")
+    parser.add_argument("--games", type=int, default=2, help="random_agent games per board for the engine metrics")
+    parser.add_argument("--student_depth", type=int, default=3)
+    parser.add_argument("--student_moves", type=int, default=20, help="Moves of the StudentAgent game per board")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="plots/scaling", help="Output prefix (.csv and .png)")
+    args = parser.parse_args()
+
+    kernels.warm_up()
+    results = []
+    for density in (float(density) for density in args.densities.split(",")):
+        for board_size in (int(size) for size in args.sizes.split(",")):
+            result = measure(
+                board_size,
+                density,
+                boards=args.boards,
+                games=args.games,
+                student_depth=args.student_depth,
+                student_moves=args.student_moves,
+                seed=args.seed,
+            )
+            results.append(result)
+            logger.info(
+                f"{board_size}x{board_size}, density {density:g}: "
+                f"get_valid_moves {result['movegen_per_sec']:.0f}/s, World.step {result['engine_moves_per_sec']:.0f}/s, "
+                f"StudentAgent {result['student_nodes_per_sec']:.0f} nodes/s, "
+                f"turn p50 {result['student_turn_p50']:.3f}s p99 {result['student_turn_p99']:.3f}s"
+            )
+
+    csv_path = Path(f"{args.output}.csv")
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(csv_path, "w", newline="") as fo:
+        writer = csv.DictWriter(fo, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    logger.info(f"Results written to {csv_path}, plot to {plot(results, f'{args.output}.png')}")
@@ -1,10 +1,18 @@
 from world import World, PLAYER_1_NAME, PLAYER_2_NAME
 import argparse
-from utils import all_logging_disabled
+from utils import all_logging_disabled, EventLog
 import logging
 import numpy as np
 import datetime
 import os
+import random
+from contextlib import nullcontext
+from profiling import make_profiler, MemoryTracker, memory_percentiles
+from results import ResultsStore
+from league import run_league
+from records import append_record
+from agent_process import AgentWorker
+from agents.student_agent import StudentAgent
 
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
@@ -26,8 +34,125 @@ def get_args():
     parser.add_argument("--display_delay", type=float, default=0.4)
     parser.add_argument("--display_save", action="store_true", default=False)
     parser.add_argument("--display_save_path", type=str, default="plots/")
+    parser.add_argument(
+        "--display_fast",
+        action="store_true",
+        default=False,
+        help="Only redraw the cells that changed. With --display_save, save the game as a single PDF",
+    )
+    parser.add_argument(
+        "--display_async",
+        action="store_true",
+        default=False,
+        help="Render in a separate process so that the game loop does not wait on drawing",
+    )
     parser.add_argument("--autoplay", action="store_true", default=False)
     parser.add_argument("--autoplay_runs", type=int, default=100)
+    parser.add_argument(
+        "--log_every",
+        type=int,
+        default=0,
+        help="In autoplay mode, log the events (moves, passes, results) of every Nth game. 0 disables logging",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Base seed of an autoplay run, game i is played with seed + i",
+    )
+    parser.add_argument(
+        "--results_path",
+        type=str,
+        default=None,
+        help="In autoplay mode, append one JSON record per finished game to this file",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Skip the games of this run already stored in --results_path",
+    )
+    parser.add_argument(
+        "--record_path",
+        type=str,
+        default=None,
+        help="Append a compact record of every game (board and packed moves) to this file, see records.py",
+    )
+    parser.add_argument(
+        "--league",
+        type=str,
+        default=None,
+        help="Comma separated list of registered agents to play a round-robin league between",
+    )
+    parser.add_argument(
+        "--league_rounds",
+        type=int,
+        default=10,
+        help="Maximum number of times a league pairing plays every board with both colors",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    parser.add_argument(
+        "--sprt_elo",
+        type=float,
+        default=50.0,
+        help="A league pairing stops once one agent is decided to be this many Elo points stronger",
+    )
+    parser.add_argument(
+        "--tuned_params",
+        type=str,
+        default=None,
+        help="JSON params of student_agent written by tuner.py, used for its games in the league",
+    )
+    parser.add_argument("--sprt_alpha", type=float, default=0.05)
+    parser.add_argument("--sprt_beta", type=float, default=0.05)
+    parser.add_argument(
+        "--telemetry_dir",
+        type=str,
+        default=None,
+        help="If set, export per-turn telemetry (nodes, depth, phase timings) for every game to this directory",
+    )
+    parser.add_argument("--telemetry_format", type=str, default="jsonl", choices=["jsonl", "csv"])
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="sample",
+        default=None,
+        choices=["sample", "cprofile"],
+        help="Profile every game and merge the results (default profiler: sample)",
+    )
+    parser.add_argument(
+        "--profile_path",
+        type=str,
+        default="profiles/profile",
+        help="Output prefix for the profile (.collapsed for sample, .prof for cprofile)",
+    )
+    parser.add_argument("--profile_top", type=int, default=20, help="Number of functions in the profile summary")
+    parser.add_argument(
+        "--track_memory",
+        type=str,
+        nargs="?",
+        const="peak",
+        default=None,
+        choices=["peak", "sites"],
+        help="Measure the peak allocation and RSS of every agent turn (slows allocations down). "
+        "sites also reports the source lines that allocate the memory agents keep between turns",
+    )
+    parser.add_argument("--memory_top", type=int, default=10, help="Number of allocation sites in the memory summary")
+    parser.add_argument(
+        "--agent_processes",
+        action="store_true",
+        default=False,
+        help="Run each agent in its own long-lived process (see agent_process.py)",
+    )
+    parser.add_argument("--agent_memory_mb", type=float, default=None, help="Memory cap of each agent process")
+    parser.add_argument("--agent_cpu_seconds", type=float, default=None, help="Total CPU time cap of each agent process")
+    parser.add_argument(
+        "--repetition_limit",
+        type=int,
+        default=3,
+        help="End a game when a position occurs this many times (0 to disable)",
+    )
     args = parser.parse_args()
     return args
 
@@ -43,22 +168,40 @@ class Simulator:
 
     def __init__(self, args):
         self.args = args
+        # Number of games started, used to name per-game output files
+        self.game_count = 0
+        # Profiler shared by every game, results are merged across games
+        self.profiler = make_profiler(args.profile) if getattr(args, "profile", None) else None
+        # Per-turn memory accounting shared by every game
+        self.memory_tracker = None
+        if getattr(args, "track_memory", None):
+            self.memory_tracker = MemoryTracker(sites=args.track_memory == "sites")
+            if getattr(args, "agent_processes", False):
+                logger.warning("--track_memory only measures this process, agents in their own processes are not tracked")
+        # With --agent_processes, one worker process per seat of the command line, kept for the whole series
+        self.agent_workers = None
+        if getattr(args, "agent_processes", False):
+            self.agent_workers = {
+                player: AgentWorker(agent, max_memory_mb=args.agent_memory_mb, max_cpu_seconds=args.agent_cpu_seconds)
+                for player, agent in (("player_1", args.player_1), ("player_2", args.player_2))
+            }
 
         # if board_roster_dir was passed, add all file paths inside it to a list and save here
         if hasattr(self.args, "board_roster_dir") and self.args.board_roster_dir:
             roster_dir = self.args.board_roster_dir
             if isinstance(roster_dir, str) and os.path.isdir(roster_dir):
-                self.board_options = [
+                # Sorted so that a seed always maps to the same board
+                self.board_options = sorted(
                     os.path.join(roster_dir, fname)
                     for fname in os.listdir(roster_dir)
                     if fname.endswith(".csv") or fname.endswith(".board")
-                ]
+                )
             else:
                 self.board_options = [] # TODO: Or should these be None?
         else:
             self.board_options = []
 
-    def reset(self, swap_players=False, board_fpath=None):
+    def reset(self, swap_players=False, board_fpath=None, log_events=True):
         """
         Reset the game
 
@@ -68,13 +211,29 @@ class Simulator:
             if True, swap the players
         board_fpath : str
             if not None, set the board to the layout in the file stored at board_fpath
+        log_events : bool
+            whether to log the events of this game
         """
+        self.events = EventLog(logger, enabled=log_events)
         if board_fpath is None:
             board_fpath = self.args.board_path
         if swap_players:
             player_1, player_2 = self.args.player_2, self.args.player_1
         else:
             player_1, player_2 = self.args.player_1, self.args.player_2
+        agent_workers = None
+        if self.agent_workers is not None:
+            agent_workers = (self.agent_workers["player_1"], self.agent_workers["player_2"])
+            if swap_players:
+                agent_workers = agent_workers[::-1]
+
+        telemetry_path = None
+        if getattr(self.args, "telemetry_dir", None):
+            telemetry_path = os.path.join(
+                self.args.telemetry_dir,
+                f"game_{self.game_count:05d}_{player_1}_vs_{player_2}.{self.args.telemetry_format}",
+            )
+        self.game_count += 1
 
         self.world = World(
             player_1=player_1,
@@ -84,19 +243,120 @@ class Simulator:
             display_delay=self.args.display_delay,
             display_save=self.args.display_save,
             display_save_path=self.args.display_save_path,
+            display_fast=getattr(self.args, "display_fast", False),
+            display_async=getattr(self.args, "display_async", False),
             autoplay=self.args.autoplay,
+            telemetry_path=telemetry_path,
+            log_events=log_events,
+            repetition_limit=getattr(self.args, "repetition_limit", 3),
+            agent_workers=agent_workers,
+            memory_tracker=self.memory_tracker,
         )
 
-    def run(self, swap_players=False, board_fpath=None):
-        self.reset(swap_players=swap_players, board_fpath=board_fpath)
-        is_end, p0_score, p1_score = self.world.step()
-        while not is_end:
+    def run(self, swap_players=False, board_fpath=None, log_events=True):
+        with self.profiler.profiling() if self.profiler is not None else nullcontext():
+            self.reset(swap_players=swap_players, board_fpath=board_fpath, log_events=log_events)
             is_end, p0_score, p1_score = self.world.step()
-        logger.info(
-            f"Run finished. {PLAYER_1_NAME} player, agent {self.args.player_1}: {p0_score}. {PLAYER_2_NAME}, agent {self.args.player_2}: {p1_score}"
+            while not is_end:
+                is_end, p0_score, p1_score = self.world.step()
+        if getattr(self.args, "record_path", None):
+            append_record(self.args.record_path, self.world.game_record())
+        self.events.emit(
+            "result",
+            "Run finished. %(player_1_name)s player, agent %(player_1)s: %(p0_score)s. %(player_2_name)s, agent %(player_2)s: %(p1_score)s",
+            player_1_name=PLAYER_1_NAME,
+            player_1=self.args.player_1,
+            p0_score=p0_score,
+            player_2_name=PLAYER_2_NAME,
+            player_2=self.args.player_2,
+            p1_score=p1_score,
         )
         return p0_score, p1_score, self.world.p0_time, self.world.p1_time
 
+    def close(self):
+        """
+        Stop the agent processes and log their pipe overhead and memory
+        """
+        if self.agent_workers is None:
+            return
+        for player, worker in self.agent_workers.items():
+            if worker.overheads:
+                logger.info(
+                    f"Agent process of {player} ({worker.agent_name}): pipe overhead per move "
+                    f"p50 {np.median(worker.overheads) * 1000:.3f} ms, max {np.max(worker.overheads) * 1000:.3f} ms, "
+                    f"max RSS {np.max(worker.rss):.1f} MB"
+                )
+            worker.close()
+
+    def report_memory(self):
+        """
+        Log the top allocation sites of --track_memory sites, and stop tracking
+        """
+        if self.memory_tracker is None:
+            return
+        if self.memory_tracker.sites:
+            logger.info(self.memory_tracker.sites_summary(self.args.memory_top))
+        self.memory_tracker.stop()
+
+    def report_profile(self):
+        """
+        Write the merged profile and log its top-N summary
+        """
+        if self.profiler is None:
+            return
+        path = self.profiler.write(self.args.profile_path)
+        logger.info(f"Profile written to {path}\n{self.profiler.summary(self.args.profile_top)}")
+
+    def play_game(self, game, base_seed, run_id):
+        """
+        Play game number `game` of an autoplay run and return its results record
+
+        Parameters
+        ----------
+        game : int
+            Index of the game in the run. Players are swapped on even games.
+        base_seed : int
+            Base seed of the run. The game is seeded with base_seed + game, which picks the board
+            and seeds numpy/random for the agents.
+        run_id : str
+            Identifier of the run, stored in the record
+        """
+        seed = base_seed + game
+        swap_players = game % 2 == 0
+        board_fpath = self.board_options[np.random.RandomState(seed).randint(len(self.board_options))]
+        np.random.seed(seed)
+        random.seed(seed)
+
+        log_every = getattr(self.args, "log_every", 0)
+        sampled = log_every > 0 and game % log_every == 0
+        # Games that are not sampled are silenced entirely, agents' logging included
+        with nullcontext() if sampled else all_logging_disabled():
+            p0_score, p1_score, p0_time, p1_time = self.run(
+                swap_players=swap_players,
+                board_fpath=board_fpath,
+                log_events=sampled,
+            )
+        return {
+            "run_id": run_id,
+            "run_player_1": self.args.player_1,
+            "run_player_2": self.args.player_2,
+            "run_seed": base_seed,
+            "game": game,
+            "swapped": swap_players,
+            "player_1": self.world.player_1_name,
+            "player_2": self.world.player_2_name,
+            "board": board_fpath,
+            "seed": seed,
+            "p0_score": int(p0_score),
+            "p1_score": int(p1_score),
+            "moves": self.world.move_count,
+            "end_reason": self.world.end_reason,
+            "p0_times": p0_time,
+            "p1_times": p1_time,
+            "p0_memory": self.world.p0_memory,
+            "p1_memory": self.world.p1_memory,
+        }
+
     def autoplay(self):
         """
         Run multiple simulations of the gameplay and aggregate win %
@@ -105,32 +365,57 @@ class Simulator:
         p2_win_count = 0
         p1_times = []
         p2_times = []
+        # (peak allocation, RSS) in MB of every turn, with --track_memory
+        p1_memory = []
+        p2_memory = []
         if self.args.display:
             logger.warning("Since running autoplay mode, display will be disabled")
         self.args.display = False
-        with all_logging_disabled():
-            for i in range(self.args.autoplay_runs):
-                swap_players = i % 2 == 0
-                board_fpath = self.board_options[ np.random.randint(len(self.board_options)) ] 
-                p0_score, p1_score, p0_time, p1_time = self.run(
-                    swap_players=swap_players, board_fpath=board_fpath
+
+        store = ResultsStore(self.args.results_path) if self.args.results_path else None
+        base_seed = self.args.seed
+        if base_seed is None and store is not None and self.args.resume:
+            base_seed = store.last_seed(self.args.player_1, self.args.player_2)
+        if base_seed is None:
+            base_seed = int(np.random.randint(2**31 - self.args.autoplay_runs))
+        run_id = f"{self.args.player_1}_vs_{self.args.player_2}_seed{base_seed}"
+
+        completed = store.completed_games(run_id) if store is not None and self.args.resume else {}
+        if completed:
+            logger.info(f"Resuming run {run_id}, {len(completed)} games already played")
+
+        for i in range(self.args.autoplay_runs):
+            if i in completed:
+                record = completed[i]
+            else:
+                record = self.play_game(i, base_seed, run_id)
+                if store is not None:
+                    store.append(record)
+
+            p0_score, p1_score = record["p0_score"], record["p1_score"]
+            p0_time, p1_time = record["p0_times"], record["p1_times"]
+            # Records of games played without --track_memory have none
+            p0_mem, p1_mem = record.get("p0_memory", []), record.get("p1_memory", [])
+            if record["swapped"]:
+                p0_score, p1_score, p0_time, p1_time, p0_mem, p1_mem = (
+                    p1_score,
+                    p0_score,
+                    p1_time,
+                    p0_time,
+                    p1_mem,
+                    p0_mem,
                 )
-                if swap_players:
-                    p0_score, p1_score, p0_time, p1_time = (
-                        p1_score,
-                        p0_score,
-                        p1_time,
-                        p0_time,
-                    )
-                if p0_score > p1_score:
-                    p1_win_count += 1
-                elif p0_score < p1_score:
-                    p2_win_count += 1
-                else:  # Tie
-                    p1_win_count += 0.5
-                    p2_win_count += 0.5
-                p1_times.extend(p0_time)
-                p2_times.extend(p1_time)
+            if p0_score > p1_score:
+                p1_win_count += 1
+            elif p0_score < p1_score:
+                p2_win_count += 1
+            else:  # Tie
+                p1_win_count += 0.5
+                p2_win_count += 0.5
+            p1_times.extend(p0_time)
+            p2_times.extend(p1_time)
+            p1_memory.extend(p0_mem)
+            p2_memory.extend(p1_mem)
 
         logger.info(
             f"Player 1, agent {self.args.player_1}, win percentage: {p1_win_count / self.args.autoplay_runs}. Maximum turn time was {np.round(np.max(p1_times),5)} seconds."
@@ -138,6 +423,19 @@ class Simulator:
         logger.info(
             f"Player 2, agent {self.args.player_2}, win percentage: {p2_win_count / self.args.autoplay_runs}. Maximum turn time was {np.round(np.max(p2_times),5)} seconds."
         )
+        if self.memory_tracker is not None:
+            for player, agent, memory in (
+                ("Player 1", self.args.player_1, p1_memory),
+                ("Player 2", self.args.player_2, p2_memory),
+            ):
+                peaks = [peak for peak, _ in memory]
+                rss = [rss for _, rss in memory]
+                logger.info(
+                    f"{player}, agent {agent}, peak allocation per turn: {memory_percentiles(peaks)}. "
+                    f"RSS after the turn: {memory_percentiles(rss)}."
+                )
+        if store is not None:
+            logger.info(f"Results of run {run_id} stored in {store.path}")
 
         """
         The code in this comment will be part of the book-keeping that we use to score the end-of-term tournament. FYI. 
@@ -161,7 +459,24 @@ class Simulator:
 if __name__ == "__main__":
     args = get_args()
     simulator = Simulator(args)
-    if args.autoplay:
+    if args.league:
+        run_league(
+            agents=[agent.strip() for agent in args.league.split(",")],
+            boards=simulator.board_options,
+            rounds=args.league_rounds,
+            workers=args.workers,
+            base_seed=args.seed if args.seed is not None else 0,
+            sprt_elo=args.sprt_elo,
+            sprt_alpha=args.sprt_alpha,
+            sprt_beta=args.sprt_beta,
+            results_path=args.results_path,
+            resume=args.resume,
+            agent_params={"student_agent": StudentAgent.load_params(args.tuned_params)} if args.tuned_params else None,
+        )
+    elif args.autoplay:
         simulator.autoplay()
     else:
         simulator.run()
+    simulator.close()
+    simulator.report_profile()
+    simulator.report_memory()
@@ -0,0 +1,111 @@
+import csv
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+"""
+Telemetry.py is a lightweight instrumentation surface for profiling the game loop and agent search.
+
+Agents and helpers report counters and timers to the process-wide TELEMETRY instance. Every reporting
+site is guarded by `if TELEMETRY.enabled:` so the cost when telemetry is off is a single attribute lookup.
+World collects one record per turn (nodes, depth, TT hits, phase timings...) and exports a game as JSONL or CSV.
+
+Classes:
+    Telemetry               - counters, gauges and timers for the current turn
+
+Functions:
+    write_records           - export a list of per-turn records, format picked from the file extension
+"""
+
+
+class Telemetry:
+    """
+    Telemetry holds the counters and timers accumulated since the last reset().
+
+    - count(name, n)        : add n to a counter (e.g. "nodes", "tt_hits")
+    - set_max(name, value)  : keep the largest value seen (e.g. "depth")
+    - add_time(name, secs)  : accumulate time spent in a phase
+    - timer(name)           : context manager around add_time, for call sites that are not hot
+    """
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.timers = {}
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def disable(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_max(self, name: str, value):
+        if value > self.counters.get(name, value - 1):
+            self.counters[name] = value
+
+    def add_time(self, name: str, seconds: float):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """
+        Return a copy of the current counters and timers and reset them.
+        """
+        snap = {"counters": self.counters, "timers": self.timers}
+        self.reset()
+        return snap
+
+
+# Process-wide instance that agents, helpers and World report to.
+TELEMETRY = Telemetry()
+
+
+def write_records(path, records: list[dict]):
+    """
+    Export per-turn records to path. A ".csv" path writes one row per turn with counters and timers
+    flattened into columns (timers are suffixed with "_s"); anything else writes one JSON object per line.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.suffix == ".csv":
+        base_fields, counter_fields, timer_fields = [], set(), set()
+        for record in records:
+            for key in record:
+                if key not in ("counters", "timers") and key not in base_fields:
+                    base_fields.append(key)
+            counter_fields.update(record.get("counters", {}))
+            timer_fields.update(record.get("timers", {}))
+        fieldnames = base_fields + sorted(counter_fields) + [f"{name}_s" for name in sorted(timer_fields)]
+
+        with open(path, "w", newline="") as fo:
+            writer = csv.DictWriter(fo, fieldnames=fieldnames)
+            writer.writeheader()
+            for record in records:
+                row = {k: v for k, v in record.items() if k not in ("counters", "timers")}
+                row.update(record.get("counters", {}))
+                row.update({f"{k}_s": v for k, v in record.get("timers", {}).items()})
+                writer.writerow(row)
+    else:
+        with open(path, "w") as fo:
+            for record in records:
+                fo.write(json.dumps(record) + "\n")
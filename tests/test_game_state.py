@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import kernels
+from game_state import GameState
+
+"""
+GameState.child_hashes against the hashes apply() leaves, on random boards.
+"""
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_child_hashes_match_apply(seed):
+    rng = np.random.default_rng(seed)
+    state = GameState(kernels.random_board(rng, int(rng.integers(6, 20))), to_move=int(rng.integers(1, 3)))
+    codes = state.move_codes(state.to_move)
+    expected = []
+    for code in codes:
+        undo = state.apply(code)
+        expected.append(state.hash)
+        state.undo(undo)
+    assert state.child_hashes(codes).tolist() == expected
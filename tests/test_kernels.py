@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import kernels
+from helpers import (
+    array_mobility,
+    decode_move,
+    execute_move,
+    get_valid_move_codes,
+    get_valid_moves,
+)
+
+"""
+Kernels.py against the reference implementations of helpers.py, on random boards of every size up to
+MAX_BOARD_SIZE (and a few larger ones, which helpers.py plays on bitboards). The same tests run with or without
+Numba: without it, they check the NumPy fallbacks and the kernels running as plain Python.
+"""
+
+SEEDS = range(40)
+
+
+def random_board(seed, sizes=(6, 13)):
+    rng = np.random.default_rng(seed)
+    return kernels.random_board(rng, int(rng.integers(*sizes)))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("player", [1, 2])
+def test_move_codes_match_helpers(seed, player):
+    board = random_board(seed)
+    codes = kernels.get_valid_move_codes(board, player)
+    assert np.array_equal(codes, get_valid_move_codes(board, player))
+    reference = [(move.get_src(), move.get_dest()) for move in get_valid_moves(board, player)]
+    assert [(move.get_src(), move.get_dest()) for move in map(decode_move, codes)] == reference
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("player", [1, 2])
+def test_mobility_matches_helpers(seed, player):
+    board = random_board(seed, sizes=(6, 40))
+    expected = len(get_valid_move_codes(board, player))
+    assert kernels.mobility(board, player) == expected
+    assert array_mobility(board, player) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("player", [1, 2])
+def test_apply_undo_round_trip(seed, player):
+    board = random_board(seed)
+    for code in kernels.get_valid_move_codes(board, player):
+        executed = board.copy()
+        execute_move(executed, decode_move(code), player)
+        applied = board.copy()
+        flipped = kernels.apply_move(applied, code, player)
+        assert np.array_equal(applied, executed)
+        kernels.undo_move(applied, code, player, flipped)
+        assert np.array_equal(applied, board)
+
+
+def test_no_moves():
+    board = np.full((6, 6), 3)
+    board[0, 0] = 1
+    assert len(kernels.get_valid_move_codes(board, 1)) == 0
+    assert kernels.mobility(board, 1) == 0
+    assert array_mobility(board, 1) == 0
@@ -0,0 +1,151 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from league import play_game
+from learned_eval import DEFAULT_MODEL_PATH, ValueModel, board_features
+from records import GameRecord, Replay, load_records
+
+"""
+Train_eval.py is the training pipeline of the learned evaluation function (learned_eval.py).
+
+1. Generate: play self-play games between the given agents on every board, over a pool of workers,
+   or read games recorded with simulator.py --record_path.
+2. Label: replay every game and label each position with the final result from the side to move
+   (1 win, 0 tie, -1 loss).
+3. Fit: train the MLP with Adam on the mean squared error, holding out a validation split.
+4. Save: write the weights to a small .npz file, loaded by learned_agent at startup.
+
+    python train_eval.py --agents greedy_corners_agent,student_agent --games 400 --workers 4
+    python train_eval.py --records results/games.rec --output models/eval_model.npz
+"""
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+logger = logging.getLogger(__name__)
+
+
+def generate_games(agents, boards, games, workers=None, base_seed=0) -> list[GameRecord]:
+    """
+    Play `games` games between random pairs of agents (self-play included) on random boards.
+    """
+    rng = np.random.default_rng(base_seed)
+    tasks = [
+        {
+            "player_1": agents[rng.integers(len(agents))],
+            "player_2": agents[rng.integers(len(agents))],
+            "board": boards[rng.integers(len(boards))],
+            "seed": base_seed + i,
+            "record": True,
+        }
+        for i in range(games)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(play_game, tasks))
+    return [GameRecord.from_line(result["game_record"]) for result in results]
+
+
+def label_positions(records: list[GameRecord]):
+    """
+    Features and result labels of every position of every game, from the side to move.
+
+    Returns
+    -------
+    features : np.ndarray of shape (N, NUM_FEATURES)
+    labels : np.ndarray of shape (N,)
+    """
+    features, labels = [], []
+    for record in records:
+        replay = Replay(record)
+        positions = replay.positions[:-1].astype(int)
+        result = np.sign(record.p0_score - record.p1_score)
+        for player in (1, 2):
+            plies = np.arange(player - 1, len(positions), 2)
+            if len(plies) == 0:
+                continue
+            features.append(board_features(positions[plies], player))
+            labels.append(np.full(len(plies), result if player == 1 else -result, dtype=np.float32))
+    return np.concatenate(features), np.concatenate(labels)
+
+
+def fit(features, labels, hidden=16, epochs=200, batch_size=256, learning_rate=0.01, validation=0.1, seed=0):
+    """
+    Train a ValueModel with Adam on the mean squared error between its prediction and the labels.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(labels))
+    split = int(len(labels) * (1 - validation))
+    train, valid = order[:split], order[split:]
+
+    model = ValueModel.random(hidden=hidden, seed=seed)
+    model.mean = features[train].mean(axis=0)
+    model.std = features[train].std(axis=0) + 1e-6
+
+    params = [model.w1, model.b1, model.w2, model.b2]
+    moments = [np.zeros_like(p) for p in params]
+    velocities = [np.zeros_like(p) for p in params]
+    beta1, beta2, step = 0.9, 0.999, 0
+
+    for epoch in range(epochs):
+        rng.shuffle(train)
+        for start in range(0, len(train), batch_size):
+            batch = train[start:start + batch_size]
+            x, y = features[batch], labels[batch]
+            hidden_out, prediction = model.forward(x)
+
+            # Backpropagation of the mean squared error through both tanh layers
+            d_out = 2 * (prediction - y) * (1 - prediction ** 2) / len(batch)
+            d_hidden = np.outer(d_out, model.w2) * (1 - hidden_out ** 2)
+            x_normalized = (x - model.mean) / model.std
+            grads = [x_normalized.T @ d_hidden, d_hidden.sum(axis=0), hidden_out.T @ d_out, d_out.sum()]
+
+            step += 1
+            for param, grad, m, v in zip(params, grads, moments, velocities):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad ** 2
+                m_hat = m / (1 - beta1 ** step)
+                v_hat = v / (1 - beta2 ** step)
+                param -= learning_rate * m_hat / (np.sqrt(v_hat) + 1e-8)
+
+        if (epoch + 1) % max(1, epochs // 10) == 0 and len(valid) > 0:
+            _, prediction = model.forward(features[valid])
+            mse = np.mean((prediction - labels[valid]) ** 2)
+            decided = labels[valid] != 0
+            accuracy = np.mean(np.sign(prediction[decided]) == labels[valid][decided])
+            logger.info(f"Epoch {epoch + 1}: validation MSE {mse:.4f}, result accuracy {accuracy:.3f}")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=str, default="greedy_corners_agent,random_agent")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--board_roster_dir", type=str, default="boards/")
+    parser.add_argument("--records", type=str, default=None, help="Train on a records file instead of generating games")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hidden", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--output", type=str, default=str(DEFAULT_MODEL_PATH))
+    args = parser.parse_args()
+
+    if args.records is not None:
+        records = load_records(args.records)
+    else:
+        boards = sorted(
+            os.path.join(args.board_roster_dir, fname)
+            for fname in os.listdir(args.board_roster_dir)
+            if fname.endswith(".csv")
+        )
+        records = generate_games(args.agents.split(","), boards, args.games, args.workers, args.seed)
+    features, labels = label_positions(records)
+    logger.info(f"{len(labels)} positions from {len(records)} games")
+
+    model = fit(features, labels, hidden=args.hidden, epochs=args.epochs, seed=args.seed)
+    model.save(args.output)
+    logger.info(f"Model saved to {args.output}")
@@ -0,0 +1,203 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from agents.student_agent import StudentAgent
+from league import play_game
+
+"""
+Tuner.py optimizes StudentAgent's parameters (evaluation weights, phase switch, search depth and move cutoff)
+with SPSA (simultaneous perturbation stochastic approximation) driven by parallel self-play.
+
+Every iteration perturbs all parameters at once in a random direction, plays a batch of short matches between the
+two perturbed agents (every board, both colors, over a pool of workers) and moves the parameters towards the side
+that scored better. The state is checkpointed to JSON after every iteration, and a run resumes from its checkpoint.
+The final params are written to their own JSON file, by default next to the checkpoint (tuning/spsa_params.json),
+which StudentAgent.load_params reads (e.g. for the league, with simulator.py --tuned_params).
+
+    python tuner.py --iterations 200 --games 32 --time_limit 0.1 --workers 8 --checkpoint tuning/spsa.json
+
+Parameters are searched in normalized units (value / scale), integer parameters are rounded when played.
+"""
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+logger = logging.getLogger(__name__)
+
+# name -> (scale, low, high, is_integer)
+TUNABLE_PARAMS = {
+    "max_depth": (1.0, 1, 12, True),
+    "move_cutoff": (2.0, 1, 20, True),
+    "phase_switch": (0.1, 0.05, 0.95, False),
+    "early_disc_weight": (2.0, 0, 50, False),
+    "early_center_weight": (2.0, 0, 50, False),
+    "early_mobility_weight": (2.0, 0, 50, False),
+    "late_disc_weight": (2.0, 0, 50, False),
+    "late_mobility_weight": (2.0, 0, 50, False),
+}
+
+
+def to_params(theta: np.ndarray) -> dict:
+    """
+    Map a normalized parameter vector to a StudentAgent params dict, clipped to bounds and rounded.
+    """
+    params = {}
+    for value, (name, (scale, low, high, is_integer)) in zip(theta, TUNABLE_PARAMS.items()):
+        value = float(np.clip(value * scale, low, high))
+        params[name] = int(round(value)) if is_integer else value
+    return params
+
+
+def from_params(params: dict) -> np.ndarray:
+    return np.array([params[name] / scale for name, (scale, _, _, _) in TUNABLE_PARAMS.items()])
+
+
+def match(params_plus, params_minus, boards, games, time_limit, base_seed, executor) -> float:
+    """
+    Play `games` games between the two parameter sets, alternating colors and cycling boards.
+
+    Returns
+    -------
+    float
+        Average score of params_plus minus average score of params_minus, in [-1, 1].
+    """
+    plus = dict(params_plus, time_limit=time_limit)
+    minus = dict(params_minus, time_limit=time_limit)
+    tasks = []
+    for i in range(games):
+        plus_is_blue = i % 2 == 0
+        tasks.append(
+            {
+                "player_1": "student_agent",
+                "player_2": "student_agent",
+                "player_1_params": plus if plus_is_blue else minus,
+                "player_2_params": minus if plus_is_blue else plus,
+                "board": boards[(i // 2) % len(boards)],
+                "seed": base_seed + i,
+            }
+        )
+    plus_score = 0.0
+    for i, record in enumerate(executor.map(play_game, tasks)):
+        # Both sides are student_agent, so score from the seat rather than the name
+        blue_score = 0.5 if record["p0_score"] == record["p1_score"] else float(record["p0_score"] > record["p1_score"])
+        plus_score += blue_score if i % 2 == 0 else 1 - blue_score
+    return 2 * plus_score / games - 1
+
+
+def load_checkpoint(path):
+    if path is not None and Path(path).exists():
+        with open(path) as fo:
+            return json.load(fo)
+    return None
+
+
+def save_checkpoint(path, state):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as fo:
+        json.dump(state, fo, indent=2)
+    os.replace(tmp_path, path)
+
+
+def params_path(checkpoint) -> Path:
+    """
+    Default file of the tuned params of a checkpoint: tuning/spsa.json -> tuning/spsa_params.json
+    """
+    checkpoint = Path(checkpoint)
+    return checkpoint.with_name(checkpoint.stem + "_params.json")
+
+
+def spsa(
+    boards,
+    iterations=100,
+    games=32,
+    time_limit=0.1,
+    workers=None,
+    checkpoint=None,
+    a=1.0,
+    c=1.0,
+    alpha=0.602,
+    gamma=0.101,
+    seed=0,
+):
+    """
+    Maximize the match score with SPSA. Returns the tuned params dict.
+
+    a, c, alpha, gamma are the usual SPSA gain sequences: step a_k = a / (k + 1 + A) ** alpha with A = iterations / 10,
+    perturbation c_k = c / (k + 1) ** gamma, both in normalized units.
+    """
+    state = load_checkpoint(checkpoint)
+    if state is None:
+        state = {"iteration": 0, "theta": from_params(StudentAgent.DEFAULT_PARAMS).tolist(), "history": []}
+    else:
+        logger.info(f"Resuming from {checkpoint} at iteration {state['iteration']}")
+
+    theta = np.array(state["theta"])
+    stability = iterations / 10
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for k in range(state["iteration"], iterations):
+            rng = np.random.default_rng(seed + k)
+            delta = rng.choice([-1.0, 1.0], size=len(theta))
+            a_k = a / (k + 1 + stability) ** alpha
+            c_k = c / (k + 1) ** gamma
+
+            result = match(
+                to_params(theta + c_k * delta),
+                to_params(theta - c_k * delta),
+                boards,
+                games,
+                time_limit,
+                base_seed=seed + k * games,
+                executor=executor,
+            )
+            theta = theta + a_k * result / (2 * c_k) * delta
+
+            state["iteration"] = k + 1
+            state["theta"] = theta.tolist()
+            state["history"].append({"iteration": k + 1, "result": result, "params": to_params(theta)})
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, state)
+            logger.info(f"Iteration {k + 1}: match result {result:+.3f}, params {to_params(theta)}")
+    return to_params(theta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--board_roster_dir", type=str, default="boards/")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--games", type=int, default=32, help="Games per iteration, half with each color")
+    parser.add_argument("--time_limit", type=float, default=0.1, help="Time limit of the agents during tuning matches")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", type=str, default="tuning/spsa.json")
+    parser.add_argument(
+        "--params_output",
+        type=str,
+        default=None,
+        help="JSON file of the tuned params, for StudentAgent.load_params (default: next to the checkpoint)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    boards = sorted(
+        os.path.join(args.board_roster_dir, fname)
+        for fname in os.listdir(args.board_roster_dir)
+        if fname.endswith(".csv")
+    )
+    params = spsa(
+        boards,
+        iterations=args.iterations,
+        games=args.games,
+        time_limit=args.time_limit,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+        seed=args.seed,
+    )
+    output = args.params_output or params_path(args.checkpoint or "tuning/spsa.json")
+    save_checkpoint(output, params)
+    logger.info(f"Tuned params written to {output}: {params}")
@@ -1,14 +1,183 @@
 ## UI Placeholder
+import multiprocessing
+from time import sleep
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import numpy as np
 from constants import *
 from pathlib import Path
 
+CELL_COLORS = {1: PLAYER_1_COLOR, 2: PLAYER_2_COLOR, 3: OBSTACLE_COLOR}
+
+
+class BoardArtist:
+    """
+    Draws a board on a figure with the same layout as UIEngine.plot_grid_with_board, but creates the
+    grid and the cell patches once. update() only recolors the cells that changed since the last call,
+    which makes redrawing a board much cheaper than clearing and plotting every box again.
+    """
+    def __init__(self, fig, board_size, player_1_name="", player_2_name=""):
+        self.fig = fig
+        self.board_size = board_size
+        self.player_1_name = player_1_name
+        self.player_2_name = player_2_name
+        self.last_board = None
+
+        fig.subplots_adjust(bottom=0.2)
+        self.ax = fig.add_subplot(111)
+        n = board_size
+
+        # Grid lines, as in plot_box: boxes of width 2 starting at x=1 and y=3
+        segments = []
+        for i in range(n + 1):
+            segments.append([(1 + 2 * i, 3), (1 + 2 * i, 3 + 2 * n)])
+            segments.append([(1, 3 + 2 * i), (1 + 2 * n, 3 + 2 * i)])
+        self.ax.add_collection(LineCollection(segments, colors="silver", linewidths=2))
+
+        # One disc per cell, hidden while the cell is empty. Row 0 is at the top.
+        self.discs = np.empty((n, n), dtype=object)
+        for row in range(n):
+            for col in range(n):
+                x = 1 + 2 * col
+                y = 3 + 2 * (n - 1 - row)
+                disc = plt.Circle((x + 1, y + 1), 2 / 2.5, visible=False)
+                self.ax.add_patch(disc)
+                self.discs[row, col] = disc
+
+        self.ax.set_xlim(0, 2 * n + 2)
+        self.ax.set_ylim(2, 2 * n + 4)
+        self.fix_axis()
+
+        self.agent_0_text = fig.text(0.15, 0.1, "", horizontalalignment="left", color=PLAYER_1_COLOR)
+        self.agent_1_text = fig.text(0.15, 0.05, "", horizontalalignment="left", color=PLAYER_2_COLOR)
+        self.score_text = fig.text(0.5, 0.1, "", horizontalalignment="left")
+        self.winner_text = fig.text(0.5, 0.05, "", horizontalalignment="left", fontweight="bold", color="green")
+
+    def fix_axis(self):
+        """
+        Same ticks and labels as UIEngine.fix_axis, on this artist's axes
+        """
+        n = self.board_size
+        # Label every cell up to MAX_BOARD_SIZE, and every few cells on larger boards
+        step = 1 if n <= MAX_BOARD_SIZE else -(-n // MAX_BOARD_SIZE)
+        cells = range(0, n, step)
+        self.ax.set_xticks([2 + 2 * i for i in cells])
+        self.ax.set_xticklabels(cells)
+        self.ax.set_yticks([4 + 2 * (n - 1 - i) for i in cells])
+        self.ax.set_yticklabels(cells)
+        self.ax.tick_params(bottom=False, labelbottom=False, top=True, labeltop=True)
+        self.ax.set_xlabel("Column")
+        self.ax.set_ylabel("Row", position="top")
+
+    def update(self, chess_board, turn=0, results=()):
+        """
+        Recolor the cells that changed and refresh the text information.
+
+        Parameters
+        ----------
+        chess_board : np.array of size (board_size, board_size)
+        turn : int
+            0 if Blue played last, 1 if Brown played last (shown in bold)
+        results : tuple
+            (is_endgame, player_1_score, player_2_score), or () before the first move
+        """
+        if self.last_board is None:
+            changed = zip(*np.indices(chess_board.shape).reshape(2, -1))
+        else:
+            changed = zip(*np.nonzero(chess_board != self.last_board))
+        for row, col in changed:
+            disc = self.discs[row, col]
+            value = chess_board[row, col]
+            if value in CELL_COLORS:
+                disc.set_color(CELL_COLORS[value])
+                disc.set_visible(True)
+            else:
+                disc.set_visible(False)
+        self.last_board = np.array(chess_board, copy=True)
+
+        self.agent_0_text.set_text(f"{PLAYER_1_NAME}: {self.player_1_name}")
+        self.agent_0_text.set_fontweight("bold" if turn == 0 else "normal")
+        self.agent_1_text.set_text(f"{PLAYER_2_NAME}: {self.player_2_name}")
+        self.agent_1_text.set_fontweight("bold" if turn == 1 else "normal")
+
+        self.score_text.set_text("")
+        self.winner_text.set_text("")
+        if len(results) > 0:
+            self.score_text.set_text(f"Scores: Blue: [{results[1]}], Brown: [{results[2]}]")
+            if results[0]:
+                if results[1] > results[2]:
+                    self.winner_text.set_text("Blue wins!")
+                elif results[1] < results[2]:
+                    self.winner_text.set_text("Brown wins!")
+                else:
+                    self.winner_text.set_text("It is a Tie!")
+
+
+def export_game(frames, path, board_size, player_1_name="", player_2_name="", fps=2):
+    """
+    Write a whole game in a single pass, without an interactive backend.
+
+    Parameters
+    ----------
+    frames : iterable of (chess_board, turn, results)
+        The positions to draw, see BoardArtist.update
+    path : str
+        Output file. ".pdf" writes one page per frame, ".gif" an animated GIF and ".mp4" a video (needs ffmpeg)
+    board_size : int
+    fps : int
+        Frames per second of the GIF/MP4
+    """
+    from matplotlib.animation import FFMpegWriter, PillowWriter
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    artist = BoardArtist(fig, board_size, player_1_name, player_2_name)
+
+    if path.suffix == ".pdf":
+        with PdfPages(path) as pdf:
+            for chess_board, turn, results in frames:
+                artist.update(chess_board, turn, results)
+                pdf.savefig(fig)
+        return path
+
+    if path.suffix == ".gif":
+        writer = PillowWriter(fps=fps)
+    elif path.suffix == ".mp4":
+        writer = FFMpegWriter(fps=fps)
+    else:
+        raise ValueError(f"Unsupported export format '{path.suffix}'. Use .pdf, .gif or .mp4")
+    with writer.saving(fig, str(path), dpi=100):
+        for chess_board, turn, results in frames:
+            artist.update(chess_board, turn, results)
+            writer.grab_frame()
+    return path
+
 
 class UIEngine:
-    def __init__(self, grid_width=5, world=None) -> None:
+    def __init__(self, grid_width=5, world=None, fast=False) -> None:
+        """
+        Parameters
+        ----------
+        grid_width : int
+            Size of the board
+        world : World
+            The world to display information (agents, turn, scores) from
+        fast : bool
+            If True, draw the board once and only recolor the cells that change (see BoardArtist).
+            With display_save, the whole game is then saved as a single multi-page PDF.
+            Always on for boards beyond MAX_BOARD_SIZE, which are too slow to redraw every turn.
+        """
         self.grid_size = (grid_width, grid_width)
         self.world = world
         self.step_number = 0
+        self.fast = fast or grid_width > MAX_BOARD_SIZE
+        self.board_artist = None
+        self.pdf_pages = None
         plt.figure()
         plt.ion()
 
@@ -189,6 +358,10 @@ class UIEngine:
         debug : bool
             if True, display the position of each piece for debugging
         """
+        if self.fast:
+            self.render_fast(chess_board)
+            return
+
         plt.clf()
         self.plot_grid_with_board(chess_board, debug=debug)
         self.fix_axis()
@@ -202,6 +375,93 @@ class UIEngine:
             )
         self.step_number += 1
 
+    def render_fast(self, chess_board):
+        """
+        Render by updating the artists of a BoardArtist in place instead of redrawing the figure
+        """
+        fig = plt.gcf()
+        if self.board_artist is None:
+            self.board_artist = BoardArtist(fig, self.grid_size[0], str(self.world.p0), str(self.world.p1))
+        self.board_artist.update(chess_board, 1 - self.world.turn, self.world.results_cache)
+        fig.canvas.draw_idle()
+        fig.canvas.flush_events()
+
+        if self.world.display_save:
+            if self.pdf_pages is None:
+                Path(self.world.display_save_path).mkdir(parents=True, exist_ok=True)
+                self.pdf_pages = PdfPages(
+                    f"{self.world.display_save_path}/{self.world.player_1_name}_{self.world.player_2_name}.pdf"
+                )
+            self.pdf_pages.savefig(fig)
+            if len(self.world.results_cache) > 0 and self.world.results_cache[0]:
+                self.pdf_pages.close()
+                self.pdf_pages = None
+        self.step_number += 1
+
+
+class RenderView:
+    """
+    Stand-in for World inside the render process: the fields UIEngine reads, updated from each snapshot.
+    """
+    def __init__(self, p0, p1, player_1_name, player_2_name, display_save=False, display_save_path=None):
+        self.p0 = p0
+        self.p1 = p1
+        self.player_1_name = player_1_name
+        self.player_2_name = player_2_name
+        self.display_save = display_save
+        self.display_save_path = display_save_path
+        self.turn = 0
+        self.results_cache = ()
+
+
+def render_loop(snapshots, board_size, view, fast, display_delay):
+    """
+    Body of the render process: draw (chess_board, turn, results_cache) snapshots until a None arrives.
+    """
+    engine = UIEngine(board_size, view, fast=fast)
+    while True:
+        snapshot = snapshots.get()
+        if snapshot is None:
+            break
+        chess_board, view.turn, view.results_cache = snapshot
+        engine.render(chess_board)
+        sleep(display_delay)
+
+
+class AsyncRenderer:
+    """
+    Renders in a separate process so that the game loop never waits on matplotlib.
+
+    World pushes board snapshots on a queue and keeps playing; the render process draws (and saves)
+    them at its own pace, display_delay apart. close() waits until every pushed frame is drawn.
+    """
+    def __init__(self, board_size, world, fast=False, display_delay=0.4):
+        view = RenderView(
+            str(world.p0),
+            str(world.p1),
+            world.player_1_name,
+            world.player_2_name,
+            display_save=world.display_save,
+            display_save_path=world.display_save_path,
+        )
+        # spawn, so the render process starts with a clean matplotlib state
+        context = multiprocessing.get_context("spawn")
+        self.snapshots = context.Queue()
+        self.process = context.Process(
+            target=render_loop,
+            args=(self.snapshots, board_size, view, fast, display_delay),
+            daemon=True,
+        )
+        self.process.start()
+
+    def render(self, chess_board, turn, results_cache):
+        self.snapshots.put((np.array(chess_board, copy=True), turn, results_cache))
+
+    def close(self):
+        if self.process.is_alive():
+            self.snapshots.put(None)
+            self.process.join()
+
 
 if __name__ == "__main__":
     engine = UIEngine((5, 5))
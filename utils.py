@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 import logging
+import os
 
 
 @contextmanager
@@ -24,3 +25,40 @@ def all_logging_disabled(highest_level=logging.CRITICAL):
         yield
     finally:
         logging.disable(previous_level)
+
+
+class EventLog:
+    """
+    Structured, level-gated log of game events.
+
+    `enabled` is resolved once, when the log is created, from the logger's level and the sampling decision
+    of the caller (e.g. only every Nth autoplay game). Hot call sites check it before building any field:
+
+        if self.events.enabled:
+            self.events.emit("move", "Player %(player)s places at %(dest)s", player=name, dest=move.get_dest())
+
+    Messages use %-style mapping keys and are only formatted if a handler actually emits them. The event name
+    and fields are also attached to the log record (record.event, record.fields) for structured handlers.
+    """
+    def __init__(self, logger, level=logging.INFO, enabled=True):
+        self.logger = logger
+        self.level = level
+        self.enabled = enabled and logger.isEnabledFor(level)
+
+    def emit(self, event, message, **fields):
+        if not self.enabled:
+            return
+        # logging only takes a lone dict argument as the mapping of the message when it is not empty
+        args = (fields,) if fields else ()
+        self.logger.log(self.level, message, *args, extra={"event": event, "fields": fields})
+
+
+def rss_mb(pid: int) -> float:
+    """
+    Resident set size of a process in MB, from /proc (0 where /proc is not available).
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as fo:
+            return int(fo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return 0.0
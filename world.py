@@ -2,14 +2,21 @@ import numpy as np
 from copy import deepcopy
 import traceback
 from agents import *
-from ui import UIEngine
+from ui import UIEngine, AsyncRenderer
 from time import sleep, time
 import click
 import logging
 from store import AGENT_REGISTRY
 from constants import *
 import sys
-from helpers import check_move_validity, execute_move, check_endgame, random_move, get_valid_moves, MoveCoordinates
+from collections import Counter
+from helpers import check_move_validity, random_move, MoveCoordinates, encode_move, PASS_MOVE_CODE
+from game_state import GameState
+from agent_process import RemoteAgent
+from functools import partial
+from records import GameRecord
+from telemetry import TELEMETRY, write_records
+from utils import EventLog
 
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
@@ -26,7 +33,14 @@ class World:
         display_delay=0.4,
         display_save=False,
         display_save_path=None,
+        display_fast=False,
+        display_async=False,
         autoplay=False,
+        telemetry_path=None,
+        log_events=True,
+        repetition_limit=3,
+        agent_workers=None,
+        memory_tracker=None,
     ):
         """
         Initialize the game world
@@ -47,11 +61,27 @@ class World:
             Whether to save an image of the game board
         display_save_path : str
             The path to save the image
+        display_fast : bool
+            Whether to render by updating the board in place (see ui.BoardArtist)
+        display_async : bool
+            Whether to render in a separate process, without blocking the game loop (see ui.AsyncRenderer)
         autoplay : bool
             Whether the game is played in autoplay mode
+        telemetry_path : str
+            If set, collect a per-turn telemetry record and export the game to this path
+            at the end (".csv" for CSV, anything else for JSONL)
+        log_events : bool
+            Whether to log the game's events (setup, moves, passes). Autoplay turns it on for sampled games only.
+        repetition_limit : int
+            End the game when a position (board and side to move) occurs this many times. 0 or None disables it.
+        agent_workers : tuple of agent_process.AgentWorker
+            If set, (player_1's, player_2's) worker processes: the agents run there instead of in this process
+        memory_tracker : profiling.MemoryTracker
+            If set, measure the peak allocation and RSS of every agent step (see p0_memory and p1_memory)
         """
+        self.events = EventLog(logger, enabled=log_events)
         # Two players
-        logger.info("Initialize the game world")
+        self.events.emit("init", "Initialize the game world")
         # Load agents as defined in decorators
         self.player_1_name = player_1
         self.player_2_name = player_2
@@ -66,9 +96,13 @@ class World:
 
         p0_agent = AGENT_REGISTRY[player_1]
         p1_agent = AGENT_REGISTRY[player_2]
-        logger.info(f"Registering p0 agent : {player_1}")
+        if agent_workers is not None:
+            # Proxies to the agents living in their own processes (see agent_process.py)
+            p0_agent = partial(RemoteAgent, agent_workers[0])
+            p1_agent = partial(RemoteAgent, agent_workers[1])
+        self.events.emit("register", "Registering p0 agent : %(agent)s", agent=player_1)
         self.p0 = p0_agent()
-        logger.info(f"Registering p1 agent : {player_2}")
+        self.events.emit("register", "Registering p1 agent : %(agent)s", agent=player_2)
         self.p1 = p1_agent()
 
         # check autoplay
@@ -83,22 +117,46 @@ class World:
         if board_fpath is None:
             # Default to empty board
             self.board_fpath = "boards/empty_7x7.csv"
-            logger.info(
-                f"No board path specified. Using empty board at {self.board_fpath}"
+            self.events.emit(
+                "board", "No board path specified. Using empty board at %(board)s", board=self.board_fpath
             )
         else:
             self.board_fpath = board_fpath
-            logger.info(f"Setting board path to {self.board_fpath}")
+            self.events.emit("board", "Setting board path to %(board)s", board=self.board_fpath)
 
         # Initialize the game board from file
-        self.chess_board = np.loadtxt(self.board_fpath, dtype=int, delimiter=',')
-        self.board_size = self.chess_board.shape[0] # We assume it is always square
+        self.chess_board = np.loadtxt(self.board_fpath, dtype=int, delimiter=',', ndmin=2)
+        self.board_size = self.chess_board.shape[0]
+        if self.chess_board.shape != (self.board_size, self.board_size) or not (
+            MIN_BOARD_SIZE <= self.board_size <= MAX_SUPPORTED_BOARD_SIZE
+        ):
+            raise ValueError(
+                f"Board {self.board_fpath} must be square, from {MIN_BOARD_SIZE}x{MIN_BOARD_SIZE} to "
+                f"{MAX_SUPPORTED_BOARD_SIZE}x{MAX_SUPPORTED_BOARD_SIZE}, got {self.chess_board.shape}"
+            )
+        # Counts, side to move and hash of the board, kept up to date move by move (see game_state.py)
+        self.state = GameState(self.chess_board)
 
         # Whose turn to step
         self.turn = 0
         
         # Move count to keep track of, as a limit
         self.move_count = 0
+        # Why the game ended (one of the END_* constants), None while it is running
+        self.end_reason = None
+
+        # Occurrences of every position since the last irreversible move. Only jumps keep the number of discs,
+        # so a position can never repeat one from before a duplication and the history restarts after each one.
+        self.repetition_limit = repetition_limit
+        self.position_history = Counter()
+        # Empty squares when the history last restarted
+        self.empty_count = self.state.empty
+        self.record_position()
+        self.p0.position_history = self.position_history
+        self.p1.position_history = self.position_history
+
+        self.p0.on_game_start(deepcopy(self.chess_board))
+        self.p1.on_game_start(deepcopy(self.chess_board))
         # we limit the number of moves to three times the board_size^2 (number of squares)
         self.MOVE_COUNT_LIMIT = 3 * (self.board_size ** 2)
 
@@ -106,20 +164,40 @@ class World:
         self.p0_time = []
         self.p1_time = []
 
+        # (peak allocation, RSS) in MB of each player's turns, with a memory_tracker
+        self.memory_tracker = memory_tracker
+        self.p0_memory = []
+        self.p1_memory = []
+
+        # Every executed move, packed with encode_move (passes included), to record and replay the game
+        self.move_history = []
+
         # Cache to store and use the data
         self.results_cache = ()
+
+        # Per-turn telemetry records, exported when the game ends
+        self.telemetry_path = telemetry_path
+        self.telemetry_records = []
+        if telemetry_path is not None:
+            TELEMETRY.enable()
+        else:
+            TELEMETRY.disable()
         # UI Engine
         self.display_ui = display_ui
         self.display_delay = display_delay
         self.display_save = display_save
         self.display_save_path = display_save_path
+        self.display_async = display_async
 
         if display_ui:
             # Initialize UI Engine
-            logger.info(
-                f"Initializing the UI Engine, with display_delay={display_delay} seconds"
+            self.events.emit(
+                "ui", "Initializing the UI Engine, with display_delay=%(delay)s seconds", delay=display_delay
             )
-            self.ui_engine = UIEngine(self.board_size, self)
+            if display_async:
+                self.ui_engine = AsyncRenderer(self.board_size, self, fast=display_fast, display_delay=display_delay)
+            else:
+                self.ui_engine = UIEngine(self.board_size, self, fast=display_fast)
             self.render()
 
     def get_current_player(self):
@@ -148,11 +226,57 @@ class World:
         else:
             self.p1_time.append(time_taken)
 
+    def update_player_memory(self, memory):
+        """
+        Update the memory used by the player
+
+        Parameters
+        ----------
+        memory : tuple
+            (peak allocation, RSS) in MB during the player's step
+        """
+        if not self.turn:
+            self.p0_memory.append(memory)
+        else:
+            self.p1_memory.append(memory)
+
+    def notify_move(self, move_coords, player):
+        """
+        Call Agent.on_move on both agents. An exception raised by an agent's hook is printed and ignored, like
+        the exceptions of step, and a hook slower than ON_MOVE_WARN_TIME is logged as a warning.
+
+        Parameters
+        ----------
+        move_coords : MoveCoordinates
+            The executed move, None for a pass
+        player : int
+            The player who moved
+        """
+        for agent, name in ((self.p0, self.player_1_name), (self.p1, self.player_2_name)):
+            start_time = time()
+            try:
+                agent.on_move(move_coords, player)
+            except BaseException as e:
+                ex_type = type(e).__name__
+                if (
+                    "SystemExit" in ex_type and isinstance(agent, HumanAgent)
+                ) or "KeyboardInterrupt" in ex_type:
+                    sys.exit(0)
+                print(
+                    "An exception raised in on_move of {}. The traceback is as follows:\n{}".format(
+                        name, traceback.format_exc()
+                    )
+                )
+            time_taken = time() - start_time
+            if time_taken > ON_MOVE_WARN_TIME:
+                logger.warning(f"on_move of {name} took {time_taken:.3f} seconds (not counted in its turn time)")
+
     def step(self): 
         """
         Take a step in the game world.
         Runs the agents' step function and updates the game board accordingly.
         If the agents' step function raises an exception, the step will be replaced by a Random Move.
+        Both agents are then notified of the executed move (or pass) through Agent.on_move (see notify_move).
 
         Returns
         -------
@@ -162,24 +286,46 @@ class World:
         cur_player = self.get_current_player()
         opponent = self.get_current_opponent()
 
-        valid_moves = get_valid_moves(self.chess_board, cur_player)
+        if TELEMETRY.enabled:
+            TELEMETRY.reset()
+
+        # Only whether the player can move is needed here (on large boards, a bitboard test of the frontier)
+        with TELEMETRY.timer("world.get_valid_moves"):
+            has_move = self.state.has_move(cur_player)
 
-        if not valid_moves:
-            logger.info(f"Player {self.player_names[self.turn]} must pass due to having no valid moves.")
+        time_taken = None
+        if not has_move:
+            if self.events.enabled:
+                self.events.emit(
+                    "pass",
+                    "Player %(player)s must pass due to having no valid moves.",
+                    player=self.player_names[self.turn],
+                )
+            self.move_history.append(PASS_MOVE_CODE)
+            self.state.apply(PASS_MOVE_CODE)
+            move_coords = None
         else:
-            time_taken = None
             try:
                 # Run the agent's step function
+                if self.memory_tracker is not None:
+                    self.memory_tracker.start_turn()
                 start_time = time()
+                with TELEMETRY.timer("world.deepcopy"):
+                    board_copy = deepcopy(self.chess_board)
                 move_coords = self.get_current_agent().step( # We expect this to return MoveCoordinates
-                    deepcopy(self.chess_board),
+                    board_copy,
                     cur_player,
                     opponent,
                 )
                 time_taken = time() - start_time
                 self.update_player_time(time_taken)
+                if self.memory_tracker is not None:
+                    agent_name = self.player_1_name if cur_player == 1 else self.player_2_name
+                    self.update_player_memory(self.memory_tracker.end_turn(agent_name))
 
-                if not check_move_validity(self.chess_board, move_coords, cur_player):
+                with TELEMETRY.timer("world.check_move_validity"):
+                    is_valid = check_move_validity(self.chess_board, move_coords, cur_player)
+                if not is_valid:
                     raise ValueError(f"Invalid move by player {cur_player}: SRC {move_coords.get_src()}, DEST {move_coords.get_dest()}")
 
             except BaseException as e:
@@ -197,10 +343,23 @@ class World:
                 move_coords = random_move(self.chess_board,cur_player)
 
             # Execute move
-            execute_move(self.chess_board,move_coords, cur_player)
-            logger.info(
-                f"Player {self.player_names[self.turn]} places at SRC {move_coords.get_src()}, DEST {move_coords.get_dest()}. Time taken this turn (in seconds): {time_taken}"
-            )
+            # The move is valid (checked above, or a random valid move)
+            with TELEMETRY.timer("world.execute_move"):
+                self.move_history.append(encode_move(move_coords))
+                self.state.apply(self.move_history[-1])
+            if self.events.enabled:
+                self.events.emit(
+                    "move",
+                    "Player %(player)s places at SRC %(src)s, DEST %(dest)s. Time taken this turn (in seconds): %(time)s",
+                    player=self.player_names[self.turn],
+                    src=move_coords.get_src(),
+                    dest=move_coords.get_dest(),
+                    time=time_taken,
+                )
+
+        # Notify both agents of the executed move (None for a pass)
+        with TELEMETRY.timer("world.on_move"):
+            self.notify_move(move_coords, cur_player)
 
         # Change turn
         self.turn = 1 - self.turn
@@ -208,12 +367,20 @@ class World:
         # check to see if it's over, then increment the move count
         self.move_count += 1
 
-        is_endgame, p0_score, p1_score = check_endgame(self.chess_board)
-        is_endgame = is_endgame or self.move_count >= self.MOVE_COUNT_LIMIT
+        with TELEMETRY.timer("world.check_endgame"):
+            is_endgame, p0_score, p1_score = self.state.check_endgame()
+            repetitions = self.record_position()
+            self.end_reason = self.get_end_reason(is_endgame, repetitions)
+        is_endgame = self.end_reason is not None
 
         results = (is_endgame, p0_score, p1_score)
         self.results_cache = results
 
+        if TELEMETRY.enabled:
+            self.record_telemetry(cur_player, time_taken, passed=not has_move)
+            if is_endgame and self.telemetry_path is not None:
+                write_records(self.telemetry_path, self.telemetry_records)
+
         # Render board and show results
         if self.display_ui:
             self.render()
@@ -223,9 +390,100 @@ class World:
                     _ = click.getchar()
                 except:
                     _ = input()
+                if self.display_async:
+                    self.ui_engine.close()
 
         return results
 
+    def record_position(self):
+        """
+        Count the current position (its GameState hash, side to move included) in position_history.
+
+        Returns
+        -------
+        int
+            How many times the position has occurred since the last irreversible move
+        """
+        if self.state.empty != self.empty_count:
+            self.position_history.clear()
+            self.empty_count = self.state.empty
+        self.position_history[self.state.hash] += 1
+        return self.position_history[self.state.hash]
+
+    def get_end_reason(self, is_endgame, repetitions=1):
+        """
+        Why the game is over after this step, or None if it goes on.
+
+        Besides check_endgame's conditions and the move limit, the game ends when a position occurs
+        repetition_limit times (jumps shuffling back and forth) and as soon as neither player can move
+        (e.g. both walled off from the remaining empty squares): they would only pass until the move limit.
+        In both cases the score is the current disc count.
+
+        Parameters
+        ----------
+        is_endgame : bool
+            Whether check_endgame found the game over
+        repetitions : int
+            Occurrences of the current position, from record_position
+
+        Returns
+        -------
+        str or None
+            One of END_ELIMINATION, END_BOARD_FULL, END_MOVE_LIMIT, END_REPETITION and END_NO_MOVES
+        """
+        if is_endgame:
+            if self.state.discs[1] == 0 or self.state.discs[2] == 0:
+                return END_ELIMINATION
+            return END_BOARD_FULL
+        if self.move_count >= self.MOVE_COUNT_LIMIT:
+            return END_MOVE_LIMIT
+        if self.repetition_limit and repetitions >= self.repetition_limit:
+            return END_REPETITION
+        next_player = self.get_current_player()
+        if not self.state.has_move(next_player) and not self.state.has_move(3 - next_player):
+            return END_NO_MOVES
+        return None
+
+    def record_telemetry(self, player, time_taken, passed):
+        """
+        Store the telemetry collected during this turn as one record.
+
+        Parameters
+        ----------
+        player : int
+            The player who moved this turn (1 or 2)
+        time_taken : float
+            Time spent in the agent's step function, None if it did not run
+        passed : bool
+            Whether the player had to pass
+        """
+        snapshot = TELEMETRY.snapshot()
+        self.telemetry_records.append(
+            {
+                "move": self.move_count,
+                "player": player,
+                "agent": self.player_1_name if player == 1 else self.player_2_name,
+                "time": time_taken,
+                "passed": passed,
+                "counters": snapshot["counters"],
+                "timers": snapshot["timers"],
+            }
+        )
+
+    def game_record(self):
+        """
+        Compact record of the game so far (board, agents, scores and packed moves), see records.py
+        """
+        _, p0_score, p1_score = self.results_cache if self.results_cache else (None, None, None)
+        return GameRecord(
+            self.board_fpath,
+            self.player_1_name,
+            self.player_2_name,
+            self.move_history,
+            p0_score=None if p0_score is None else int(p0_score),
+            p1_score=None if p1_score is None else int(p1_score),
+        )
+
     def get_current_agent(self):
         """
         Get the current player's agent
@@ -241,6 +499,10 @@ class World:
         """
         Render the game board using the UI Engine
         """
+        if self.display_async:
+            # Only queue a snapshot, the render process paces itself
+            self.ui_engine.render(self.chess_board, self.turn, self.results_cache)
+            return
         self.ui_engine.render(self.chess_board, debug=debug)
         sleep(self.display_delay)
 